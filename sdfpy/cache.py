@@ -0,0 +1,209 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import sdfpy.core as core
+import sdfpy.mcr as mcr
+import sdfpy.schedule as schedule
+import sdfpy.simulation as simulation
+from sdfpy.compact import CompactSDFGraph, CompactMarkedGraph
+
+""" Memoization of analysis results.
+
+Results are keyed on a structural fingerprint of the graph, so that an analysis of a graph that
+was analysed before (possibly loaded from another file, or constructed in another order) is
+answered without repeating the work. The cache keeps the most recently used results in memory
+and, optionally, stores all results in a directory, which may be shared between processes.
+
+Cached results are shared between callers, and must not be modified.
+"""
+
+def _vector( x ):
+    try:
+        return tuple( x )
+    except TypeError:
+        return (x,)
+
+def _canonical_items( g ):
+    """ Yields the canonical description of graph g: its sorted actors (or nodes), followed by its sorted channels (or edges).
+    Actors are described by their name and execution times, channels by their end points, key, rates, tokens and weight.
+    """
+    if isinstance( g, CompactSDFGraph ):
+        keys = [ repr( key ) for key in g.keys ]
+        nodes = [ (repr( v ), g.wcets( i )[ : int( g.phases[ i ] )]) for i, v in enumerate( g.actors ) ]
+        edges = [ (repr( g.actors[ g.src[ c ]] ), repr( g.actors[ g.dst[ c ]] ), keys[ c ],
+                   tuple( g.production( c )), tuple( g.consumption( c )), int( g.tokens[ c ] ), 0)
+                  for c in range( g.number_of_channels() ) ]
+    elif isinstance( g, CompactMarkedGraph ):
+        nodes = [ (repr( v ), ()) for v in g.nodes ]
+        edges = [ (repr( g.nodes[ v ] ), repr( g.nodes[ w ] ), repr( g.key( e ) if g.multigraph else None ), (), (), tokens, weight)
+                  for e, (v, w, tokens, weight) in enumerate( zip( g.source.tolist(), g.target.tolist(), g.tokens.tolist(), g.weight.tolist() )) ]
+    else:
+        nodes = []
+        for v, data in g.nodes( data = True ):
+            wcet = _vector( data.get( 'wcet', () ))
+            if 'phases' in data:
+                wcet = tuple( wcet[ k % len( wcet ) ] for k in range( data['phases'] ))
+            nodes.append( (repr( v ), wcet) )
+
+        if g.is_multigraph():
+            edge_iter = g.edges( keys = True, data = True )
+        else:
+            edge_iter = ( (v, w, None, data) for v, w, data in g.edges( data = True ))
+
+        edges = []
+        for v, w, key, data in edge_iter:
+            edges.append( (repr( v ), repr( w ), repr( key ),
+                _vector( data.get( 'production', () )), _vector( data.get( 'consumption', () )),
+                data.get( 'tokens', 0 ), data.get( 'weight', 0 )) )
+
+    yield len( nodes )
+    yield from sorted( nodes )
+    yield len( edges )
+    yield from sorted( edges )
+
+def fingerprint( g ):
+    """ Returns a canonical fingerprint (a hexadecimal SHA-256 digest) of the structure of graph g.
+
+    g is an SDF graph, a marked graph, or a compiled form of either. The fingerprint covers the names and
+    execution times of the actors, and the end points, keys, rates, tokens and weights of the channels.
+    It does not depend on the order in which the graph was constructed, and an SDF graph and its
+    compiled form (see compact.CompactSDFGraph) have the same fingerprint.
+    """
+    h = hashlib.sha256()
+    for item in _canonical_items( g ):
+        h.update( repr( item ).encode( 'utf-8' ))
+        h.update( b'\n' )
+    return h.hexdigest()
+
+class AnalysisCache( object ):
+    """ A bounded cache of analysis results, which evicts the least recently used result when it is full.
+
+    If a directory is given, results are also stored there as pickle files, which are consulted when
+    a result is not in memory. The directory is not bounded.
+    """
+    def __init__( self, maxsize = 128, directory = None ):
+        if maxsize < 1:
+            raise ValueError("Cache size must be positive")
+
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        if directory is not None:
+            os.makedirs( directory, exist_ok = True )
+
+    def __len__( self ):
+        return len( self.__entries )
+
+    def __contains__( self, key ):
+        return key in self.__entries or (self.directory is not None and os.path.exists( self.__path( key )))
+
+    def __path( self, key ):
+        digest = hashlib.sha256( repr( key ).encode( 'utf-8' )).hexdigest()
+        return os.path.join( self.directory, digest + '.pickle' )
+
+    def __store( self, key, value ):
+        self.__entries[ key ] = value
+        self.__entries.move_to_end( key )
+        while len( self.__entries ) > self.maxsize:
+            self.__entries.popitem( last = False )
+
+    def get( self, key, default = None ):
+        """ Returns the result stored under key, or default """
+        try:
+            value = self.__entries[ key ]
+            self.__entries.move_to_end( key )
+            return value
+        except KeyError:
+            pass
+
+        if self.directory is not None:
+            try:
+                with open( self.__path( key ), 'rb' ) as f:
+                    stored_key, value = pickle.load( f )
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return default
+
+            if stored_key == key:
+                self.__store( key, value )
+                return value
+
+        return default
+
+    def put( self, key, value ):
+        """ Stores a result under key """
+        self.__store( key, value )
+        if self.directory is not None:
+            # write to a temporary file first, so that concurrent readers never see a partial file
+            fd, tmp = tempfile.mkstemp( dir = self.directory, suffix = '.tmp' )
+            try:
+                with os.fdopen( fd, 'wb' ) as f:
+                    pickle.dump( (key, value), f, protocol = pickle.HIGHEST_PROTOCOL )
+                os.replace( tmp, self.__path( key ))
+            except BaseException:
+                os.unlink( tmp )
+                raise
+
+    def clear( self ):
+        """ Removes all results from memory (but not from disk) """
+        self.__entries.clear()
+        self.hits = self.misses = 0
+
+    def memoize( self, analysis, fun, g, *params ):
+        """ Returns fun( g ), computing it only if the result of the analysis with the given name and parameters
+        is not yet known for a graph with the same fingerprint as g. The parameters must have a deterministic repr.
+        """
+        key = (analysis, fingerprint( g ), repr( params ))
+        missing = object()
+        value = self.get( key, missing )
+        if value is not missing:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = fun( g )
+        self.put( key, value )
+        return value
+
+default_cache = AnalysisCache()
+
+def _sorted_items( d ):
+    return None if d is None else sorted( d.items(), key = repr )
+
+def repetition_vector( g, cache = None ):
+    """ Returns the repetition vector of g, which is either an SDF graph or a networkx graph that describes one """
+    if cache is None:
+        cache = default_cache
+    def analysis( g ):
+        if not hasattr( g, 'repetition_vector' ):
+            g = core.SDFGraph( g )
+        return g.repetition_vector()
+
+    return cache.memoize( 'repetition_vector', analysis, g )
+
+def max_cycle_ratio( g, estimate = None, engine = 'pivot', processes = 1, cache = None ):
+    """ Cached version of mcr.max_cycle_ratio. The number of processes does not change the result, so it is not
+    part of the key. """
+    if cache is None:
+        cache = default_cache
+    return cache.memoize( 'max_cycle_ratio', lambda g: mcr.max_cycle_ratio( g, estimate, engine, processes ),
+        g, estimate, engine )
+
+def strictly_periodic_schedule( g, admissible = True, cache = None ):
+    """ Cached version of schedule.strictly_periodic_schedule """
+    if cache is None:
+        cache = default_cache
+    return cache.memoize( 'strictly_periodic_schedule', lambda g: schedule.strictly_periodic_schedule( g, admissible ), g, admissible )
+
+def find_throughput( g, ref_actor = None, initial_marking = None, initial_firings = None, bounded_memory = False, cache = None ):
+    """ Cached version of simulation.find_throughput. Both recurrence detection strategies give the same
+    result, so bounded_memory is not part of the key. """
+    if cache is None:
+        cache = default_cache
+    return cache.memoize( 'find_throughput',
+        lambda g: simulation.find_throughput( g, ref_actor, initial_marking, initial_firings, bounded_memory ),
+        g, ref_actor, _sorted_items( initial_marking ), _sorted_items( initial_firings ))
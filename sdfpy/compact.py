@@ -0,0 +1,592 @@
+import numpy as np
+import networkx as nx
+import ast
+import json
+import os
+
+from fractions import Fraction
+from math import gcd
+from sdfpy.cyclic import Cyclic
+from sdfpy.integers import lcm
+
+""" Compiled, array-backed representations of dataflow graphs.
+
+The analyses in sdfpy are formulated on top of networkx graphs, which store the rates,
+tokens and execution times of a graph in per-node and per-edge attribute dictionaries.
+Looking these up dominates the running time of the analyses on larger graphs.
+
+The classes in this module compile a graph into a frozen, integer-indexed form:
+actors (or nodes) are numbered 0..N-1, channels (or edges) 0..M-1, adjacency is stored
+in compressed sparse row (CSR) form and all vectors are packed into flat arrays.
+The networkx graphs remain the user-facing API; a compiled graph is built from one
+and maps its results back onto the original node names.
+"""
+
+def _frozen( values, dtype = np.int64 ):
+    # memory-mapped arrays are kept as they are, rather than viewed as plain arrays
+    if isinstance( values, np.memmap ) and values.dtype == dtype:
+        array = values
+    else:
+        array = np.asarray( values, dtype = dtype )
+    array.flags.writeable = False
+    return array
+
+def _encode_name( v ):
+    return v if type( v ) in (str, int) else [ repr( v ) ]
+
+def _decode_name( v ):
+    return ast.literal_eval( v[0] ) if type( v ) is list else v
+
+def _pack( vectors ):
+    """ Packs a list of vectors into a flat array of values, plus an array of offsets.
+    The entries of vector i are at positions offsets[i], ..., offsets[i + 1] - 1.
+    """
+    offsets = [0]
+    values = []
+    for vector in vectors:
+        values.extend( vector )
+        offsets.append( len( values ))
+
+    return _frozen( offsets ), _frozen( values )
+
+def _prefix_sums( offsets, values ):
+    """ Computes the prefix sums of packed vectors.
+    The prefix sums of vector i (including a leading zero) are at positions offsets[i] + i, ..., offsets[i + 1] + i.
+    """
+    sums = []
+    for i in range( len( offsets ) - 1 ):
+        total = 0
+        sums.append( total )
+        for value in values[ offsets[ i ] : offsets[ i + 1 ]].tolist():
+            total += value
+            sums.append( total )
+
+    return _frozen( sums )
+
+def _csr( num_nodes, heads ):
+    """ Groups edge indices by their head node.
+    Returns (offsets, edges) such that the edges of node v are edges[offsets[v]:offsets[v + 1]].
+    """
+    heads = np.asarray( heads, dtype = np.int64 )
+    order = np.argsort( heads, kind = 'stable' )
+    counts = np.bincount( heads, minlength = num_nodes )
+    offsets = np.zeros( num_nodes + 1, dtype = np.int64 )
+    np.cumsum( counts, out = offsets[ 1: ] )
+    return _frozen( offsets ), _frozen( order )
+
+def _consistency( n, phases, src, dst, productions, consumptions ):
+    """ Computes the repetition vector, the normalisation vector (per channel) and the modulus of the graph with
+    n actors and the given channels, as SDFGraph does. Raises an exception if the graph is inconsistent.
+    """
+    node_lcm_rates = [ 1 ] * n
+    adjacency = [ [] for _ in range( n ) ]
+    for v, w, production, consumption in zip( src, dst, productions, consumptions ):
+        psum, csum = sum( production ), sum( consumption )
+        plen, clen = len( production ), len( consumption )
+        node_lcm_rates[ v ] = lcm( lcm( node_lcm_rates[ v ], psum ), plen // gcd( psum, plen ))
+        node_lcm_rates[ w ] = lcm( lcm( node_lcm_rates[ w ], csum ), clen // gcd( csum, clen ))
+
+        # the numbers of tokens produced (consumed) per period of the producer (consumer)
+        produced, consumed = psum * phases[ v ] // plen, csum * phases[ w ] // clen
+        adjacency[ v ].append( (w, produced, consumed) )
+        adjacency[ w ].append( (v, consumed, produced) )
+
+    # the fractional repetition vector, in periods, is normalised to one at the first actor of every component
+    fractional_q = [ None ] * n
+    for root in range( n ):
+        if fractional_q[ root ] is not None:
+            continue
+
+        fractional_q[ root ] = Fraction( 1 )
+        stack = [ root ]
+        while stack:
+            v = stack.pop()
+            f_v = fractional_q[ v ]
+            for w, produced, consumed in adjacency[ v ]:
+                f_w = fractional_q[ w ]
+                if f_w is None:
+                    fractional_q[ w ] = f_v * Fraction( produced, consumed )
+                    stack.append( w )
+                elif f_w.numerator * f_v.denominator * consumed != f_v.numerator * f_w.denominator * produced:
+                    raise Exception("Inconsistent edge: ({},{})".format( v, w ))
+
+    m = 1
+    for f in fractional_q:
+        m = lcm( m, f.denominator )
+
+    q = [ int( f * m * phases[ v ] ) for v, f in enumerate( fractional_q ) ]
+    tpi = 1
+    for v, f in enumerate( fractional_q ):
+        tpi = lcm( tpi, (node_lcm_rates[ v ] * f * m).numerator )
+
+    # as in SDFGraph, parallel channels share the entry of the last one
+    s = dict()
+    for v, w, production in zip( src, dst, productions ):
+        s[ (v, w) ] = (tpi * len( production )) // (q[ v ] * sum( production ))
+
+    return q, tuple( s[ (v, w) ] for v, w in zip( src, dst )), tpi
+
+class CompactSDFGraph( object ):
+    """ A frozen, integer-indexed compilation of an SDFGraph.
+
+    Actors are numbered 0..N-1 in the iteration order of the SDF graph, channels 0..M-1 in its edge order.
+    Attributes (all arrays are read-only numpy int64 arrays):
+        actors              tuple of actor names, indexed by actor id
+        index               dictionary that maps an actor name onto its id
+        phases              number of phases of every actor
+        wcet, wcet_ptr      execution time vectors, packed per actor
+        src, dst, tokens    source actor, destination actor and initial tokens of every channel
+        keys                tuple of the channels' edge keys in the SDF graph
+        prod, prod_ptr      production rate vectors, packed per channel
+        cons, cons_ptr      consumption rate vectors, packed per channel
+        prod_psum, cons_psum
+                            prefix sums of the rate vectors, see rate_sum()
+        out_ptr, out_channels
+        in_ptr, in_channels CSR adjacency: the outgoing channels of actor v are out_channels[out_ptr[v]:out_ptr[v + 1]]
+        q                   the repetition vector
+        s                   tuple with the normalisation vector entry of every channel
+        tpi                 the modulus of the graph
+
+    The entries of the normalisation vector and the modulus may exceed 64 bits and are therefore kept as Python integers.
+    """
+
+    __slots__ = ( 'actors', 'index', 'phases', 'wcet', 'wcet_ptr',
+                  'src', 'dst', 'tokens', 'keys',
+                  'prod', 'prod_ptr', 'prod_psum', 'cons', 'cons_ptr', 'cons_psum',
+                  'out_ptr', 'out_channels', 'in_ptr', 'in_channels',
+                  'q', 's', 'tpi' )
+
+    def __init__( self, sdfg ):
+        actors = tuple( sdfg.nodes() )
+        index = { v : i for i, v in enumerate( actors ) }
+
+        wcets = []
+        phases = []
+        for v, data in sdfg.nodes( data = True ):
+            wcets.append( data.get( 'wcet' ))
+            phases.append( data.get( 'phases', len( data.get( 'wcet' ))))
+
+        src, dst, tokens, keys = [], [], [], []
+        productions, consumptions = [], []
+        for v, w, key, data in sdfg.edges( keys = True, data = True ):
+            src.append( index[ v ] )
+            dst.append( index[ w ] )
+            tokens.append( data.get( 'tokens', 0 ))
+            keys.append( key )
+            productions.append( data.get( 'production' ))
+            consumptions.append( data.get( 'consumption' ))
+
+        q = sdfg.repetition_vector()
+        s = sdfg.normalisation_vector()
+
+        wcet_ptr, wcet = _pack( wcets )
+        prod_ptr, prod = _pack( productions )
+        cons_ptr, cons = _pack( consumptions )
+        out_ptr, out_channels = _csr( len( actors ), src )
+        in_ptr, in_channels = _csr( len( actors ), dst )
+
+        self._init( actors = actors, index = index,
+            phases = _frozen( phases ), wcet = wcet, wcet_ptr = wcet_ptr,
+            src = _frozen( src ), dst = _frozen( dst ), tokens = _frozen( tokens ), keys = tuple( keys ),
+            prod = prod, prod_ptr = prod_ptr, prod_psum = _prefix_sums( prod_ptr, prod ),
+            cons = cons, cons_ptr = cons_ptr, cons_psum = _prefix_sums( cons_ptr, cons ),
+            out_ptr = out_ptr, out_channels = out_channels, in_ptr = in_ptr, in_channels = in_channels,
+            q = _frozen([ q[ v ] for v in actors ]),
+            s = tuple( s[ (actors[ v ], actors[ w ]) ] for v, w in zip( src, dst )),
+            tpi = sdfg.modulus() )
+
+    @classmethod
+    def from_fields( cls, **fields ):
+        """ Assembles a compiled graph from previously computed fields (see the class attributes),
+        without validating them. Used to load compiled graphs from disk, see core.load_sdf_binary.
+        """
+        missing = set( cls.__slots__ ).difference( fields )
+        if missing:
+            raise ValueError( "Missing fields: {}".format( ", ".join( sorted( missing ))))
+
+        cg = cls.__new__( cls )
+        cg._init( **fields )
+        return cg
+
+    @classmethod
+    def from_channels( cls, actors, wcets, channels ):
+        """ Compiles a graph that is given by the names and execution time vectors of its actors, and the
+        (source id, destination id, production, consumption, tokens) tuples of its channels, in edge order.
+        The result is that of compiling the SDFGraph with these actors and channels, which is not built.
+        The repetition vector, normalisation vector and modulus are computed as in SDFGraph; unlike SDFGraph,
+        every connected component of the graph is normalised separately.
+        """
+        n = len( actors )
+        phases = [ len( wcet ) for wcet in wcets ]
+        src, dst, tokens, keys, productions, consumptions = [], [], [], [], [], []
+        parallel = dict()
+        for v, w, production, consumption, t in channels:
+            phases[ v ] = lcm( phases[ v ], len( production ))
+            phases[ w ] = lcm( phases[ w ], len( consumption ))
+            keys.append( parallel.get( (v, w), 0 ))
+            parallel[ (v, w) ] = keys[ -1 ] + 1
+            src.append( v )
+            dst.append( w )
+            tokens.append( t )
+            productions.append( production )
+            consumptions.append( consumption )
+
+        q, s, tpi = _consistency( n, phases, src, dst, productions, consumptions )
+
+        wcet_ptr, wcet = _pack( wcets )
+        prod_ptr, prod = _pack( productions )
+        cons_ptr, cons = _pack( consumptions )
+        out_ptr, out_channels = _csr( n, src )
+        in_ptr, in_channels = _csr( n, dst )
+
+        cg = cls.__new__( cls )
+        cg._init( actors = tuple( actors ), index = { v : i for i, v in enumerate( actors ) },
+            phases = _frozen( phases ), wcet = wcet, wcet_ptr = wcet_ptr,
+            src = _frozen( src ), dst = _frozen( dst ), tokens = _frozen( tokens ), keys = tuple( keys ),
+            prod = prod, prod_ptr = prod_ptr, prod_psum = _prefix_sums( prod_ptr, prod ),
+            cons = cons, cons_ptr = cons_ptr, cons_psum = _prefix_sums( cons_ptr, cons ),
+            out_ptr = out_ptr, out_channels = out_channels, in_ptr = in_ptr, in_channels = in_channels,
+            q = _frozen( q ), s = s, tpi = tpi )
+        return cg
+
+    def _init( self, **fields ):
+        for name, value in fields.items():
+            object.__setattr__( self, name, value )
+
+    def __setattr__( self, name, value ):
+        raise AttributeError( "CompactSDFGraph is immutable" )
+
+    def __delattr__( self, name ):
+        raise AttributeError( "CompactSDFGraph is immutable" )
+
+    def __getstate__( self ):
+        return { name : getattr( self, name ) for name in self.__slots__ }
+
+    def __setstate__( self, state ):
+        self._init( **state )
+
+    def number_of_actors( self ):
+        return len( self.actors )
+
+    def number_of_channels( self ):
+        return len( self.src )
+
+    def repetition_vector( self ):
+        return dict( zip( self.actors, self.q.tolist() ))
+
+    def normalisation_vector( self ):
+        return { (self.actors[ v ], self.actors[ w ]) : s for v, w, s in zip( self.src.tolist(), self.dst.tolist(), self.s ) }
+
+    def modulus( self ):
+        return self.tpi
+
+    def wcets( self, v ):
+        """ Returns the execution time vector of actor v """
+        return Cyclic( self.wcet[ self.wcet_ptr[ v ] : self.wcet_ptr[ v + 1 ]].tolist() )
+
+    def production( self, c ):
+        """ Returns the production rate vector of channel c """
+        return Cyclic( self.prod[ self.prod_ptr[ c ] : self.prod_ptr[ c + 1 ]].tolist() )
+
+    def consumption( self, c ):
+        """ Returns the consumption rate vector of channel c """
+        return Cyclic( self.cons[ self.cons_ptr[ c ] : self.cons_ptr[ c + 1 ]].tolist() )
+
+    def out_edges( self, v ):
+        """ Returns the indices of the outgoing channels of actor v """
+        return self.out_channels[ self.out_ptr[ v ] : self.out_ptr[ v + 1 ]]
+
+    def in_edges( self, v ):
+        """ Returns the indices of the incoming channels of actor v """
+        return self.in_channels[ self.in_ptr[ v ] : self.in_ptr[ v + 1 ]]
+
+    def channel( self, c ):
+        """ Returns the (source name, destination name, key) triple of channel c """
+        return self.actors[ self.src[ c ]], self.actors[ self.dst[ c ]], self.keys[ c ]
+
+    def rate_sum( self, c, k, production = True ):
+        """ Returns the number of tokens produced onto (or consumed from) channel c by the first k firings
+        of its producer (or consumer). k may be negative, in which case the sum is negated and taken
+        over the k firings that precede the first one.
+        """
+        ptr, psum = (self.prod_ptr, self.prod_psum) if production else (self.cons_ptr, self.cons_psum)
+        n = int( ptr[ c + 1 ] - ptr[ c ] )
+        start = int( ptr[ c ] ) + c
+        return (k // n) * int( psum[ start + n ] ) + int( psum[ start + k % n ] )
+
+    def predecessor( self, c, k ):
+        """ Computes the last producing firing that enables the k-th consuming firing on channel c.
+        See core.predecessor.
+        """
+        plen = int( self.prod_ptr[ c + 1 ] - self.prod_ptr[ c ] )
+        clen = int( self.cons_ptr[ c + 1 ] - self.cons_ptr[ c ] )
+        psum = self.rate_sum( c, plen )
+        csum = self.rate_sum( c, clen, False )
+
+        numerator = (k // clen) * csum + self.rate_sum( c, k % clen, False ) - int( self.tokens[ c ] ) - 1
+        maxval = None
+        for i in range( plen ):
+            val_i = ((numerator - self.rate_sum( c, i )) // psum) * plen + i + 1
+            if maxval is None or val_i > maxval:
+                maxval = val_i
+
+        return maxval
+
+    def predecessors( self, c, ks ):
+        """ Vectorized version of predecessor: computes predecessor(c, k) for every k in the integer array ks.
+        See core.predecessors.
+        """
+        p0, p1 = int( self.prod_ptr[ c ] ) + c, int( self.prod_ptr[ c + 1 ] ) + c
+        c0, c1 = int( self.cons_ptr[ c ] ) + c, int( self.cons_ptr[ c + 1 ] ) + c
+        plen, clen = p1 - p0, c1 - c0
+        pprefix = self.prod_psum[ p0 : p1 ]
+        cprefix = self.cons_psum[ c0 : c1 + 1 ]
+        psum, csum = int( self.prod_psum[ p1 ] ), int( cprefix[ clen ] )
+
+        ks = np.asarray( ks, dtype = np.int64 )
+        numerator = (ks // clen) * csum + cprefix[ ks % clen ] - int( self.tokens[ c ] ) - 1
+        periods = numerator // psum
+        phase = np.searchsorted( pprefix, numerator - periods * psum, side = 'right' ) - 1
+        return periods * plen + phase + 1
+
+class Firings( object ):
+    """ The nodes of a single-rate equivalent: the sequence of firings (v, i) of every actor v, with i = 1..q[v].
+    Firing (v, i) has id offsets[k] + i - 1, where k is the id of actor v. The names are computed on access,
+    rather than stored, which keeps the nodes of large single-rate equivalents compact.
+    """
+
+    __slots__ = ( 'actors', 'offsets', '_index' )
+
+    def __init__( self, actors, q ):
+        self.actors = tuple( actors )
+        self.offsets = np.zeros( len( self.actors ) + 1, dtype = np.int64 )
+        np.cumsum( q, out = self.offsets[ 1: ] )
+        self._index = None
+
+    def __len__( self ):
+        return int( self.offsets[ -1 ] )
+
+    def __getitem__( self, v ):
+        v = int( v )
+        if v < 0:
+            v += len( self )
+        if not 0 <= v < len( self ):
+            raise IndexError( "Firing index out of range" )
+
+        k = int( np.searchsorted( self.offsets, v, side = 'right' )) - 1
+        return self.actors[ k ], v - int( self.offsets[ k ] ) + 1
+
+    def __iter__( self ):
+        for k, actor in enumerate( self.actors ):
+            for i in range( int( self.offsets[ k + 1 ] - self.offsets[ k ] )):
+                yield actor, i + 1
+
+    def __eq__( self, other ):
+        return isinstance( other, Firings ) and self.actors == other.actors and np.array_equal( self.offsets, other.offsets )
+
+    def __getstate__( self ):
+        return self.actors, self.offsets
+
+    def __setstate__( self, state ):
+        self.actors, self.offsets = state
+        self._index = None
+
+    def index( self, firing ):
+        """ Returns the id of firing (v, i) """
+        if self._index is None:
+            self._index = { actor : k for k, actor in enumerate( self.actors ) }
+        v, i = firing
+        k = self._index[ v ]
+        if not 1 <= i <= self.offsets[ k + 1 ] - self.offsets[ k ]:
+            raise KeyError( firing )
+        return int( self.offsets[ k ] ) + i - 1
+
+# A marked graph on disk is a directory with an .npy file per array, and a JSON header with its nodes (or the actors
+# and firing offsets of its Firings), its keys and whether it is a multigraph. Names are encoded as in core.write_sdf_binary.
+MARKED_GRAPH_ARRAYS = ( 'offsets', 'source', 'target', 'weight', 'tokens' )
+MARKED_GRAPH_HEADER = 'graph.json'
+
+def write_marked_graph_header( directory, nodes, keys = None, multigraph = True ):
+    """ Writes the header of a marked graph on disk (see CompactMarkedGraph.save) """
+    if isinstance( nodes, Firings ):
+        header = dict( firings = dict( actors = [ _encode_name( v ) for v in nodes.actors ], offsets = nodes.offsets.tolist() ))
+    else:
+        header = dict( nodes = [ _encode_name( v ) for v in nodes ] )
+    header.update( keys = None if keys is None else [ _encode_name( key ) for key in keys ], multigraph = multigraph )
+
+    with open( os.path.join( directory, MARKED_GRAPH_HEADER ), 'w' ) as outfile:
+        json.dump( header, outfile )
+
+class CompactMarkedGraph( object ):
+    """ A frozen marked graph in compressed sparse row form.
+    Each edge (u, v) carries a weight and a number of tokens, which impose the constraint
+        t(v, k) >= t(u, k - tokens) + weight
+    (see transform.single_rate_as_marked_graph).
+
+    Attributes:
+        nodes                       sequence of node names, indexed by node id
+        offsets                     the outgoing edges of node v are offsets[v], ..., offsets[v + 1] - 1
+        source, target              source and target node id of every edge
+        weight, tokens              weight and tokens of every edge
+        keys                        tuple of the edges' keys in the original graph, or None if the edge index is the key
+        multigraph                  whether edges are reported as (v, w, key) triples or as (v, w) pairs
+    """
+
+    __slots__ = ( 'nodes', 'index', 'offsets', 'source', 'target', 'weight', 'tokens', 'keys', 'multigraph', '_in' )
+
+    def __init__( self, nodes, source, target, weight, tokens, keys = None, multigraph = True ):
+        """ Builds a marked graph from parallel edge arrays, which need not be sorted by source.
+        The nodes are a sequence of names, or the Firings of a single-rate equivalent. """
+        if not isinstance( nodes, Firings ):
+            nodes = tuple( nodes )
+        source = np.asarray( source, dtype = np.int64 )
+        offsets, order = _csr( len( nodes ), source )
+        if keys is not None:
+            keys = tuple( keys[ e ] for e in order.tolist() )
+
+        self._init( nodes = nodes, index = None, offsets = offsets,
+            source = _frozen( source[ order ] ),
+            target = _frozen( np.asarray( target, dtype = np.int64 )[ order ] ),
+            weight = _frozen( np.asarray( weight, dtype = np.int64 )[ order ] ),
+            tokens = _frozen( np.asarray( tokens, dtype = np.int64 )[ order ] ),
+            keys = keys, multigraph = multigraph, _in = None )
+
+    @classmethod
+    def from_graph( cls, g, weight_attr = 'weight', tokens_attr = 'tokens' ):
+        """ Compiles a networkx marked graph, such as the result of transform.single_rate_as_marked_graph """
+        nodes = list( g.nodes() )
+        index = { v : i for i, v in enumerate( nodes ) }
+        source, target, weight, tokens, keys = [], [], [], [], []
+        if g.is_multigraph():
+            edges = g.edges( keys = True, data = True )
+        else:
+            edges = ( (v, w, None, data) for v, w, data in g.edges( data = True ))
+
+        for v, w, key, data in edges:
+            source.append( index[ v ] )
+            target.append( index[ w ] )
+            weight.append( data.get( weight_attr, 0 ))
+            tokens.append( data.get( tokens_attr, 0 ))
+            keys.append( key )
+
+        return cls( nodes, source, target, weight, tokens, keys if g.is_multigraph() else None, g.is_multigraph() )
+
+    @classmethod
+    def from_csr( cls, nodes, offsets, source, target, weight, tokens, keys = None, multigraph = True ):
+        """ Builds a marked graph from edge arrays that are already sorted by source, such that the outgoing edges of
+        node v are offsets[v], ..., offsets[v + 1] - 1. Numpy arrays, including memory-mapped ones, are not copied.
+        """
+        if not isinstance( nodes, Firings ):
+            nodes = tuple( nodes )
+
+        g = cls.__new__( cls )
+        g._init( nodes = nodes, index = None, offsets = _frozen( offsets ),
+            source = _frozen( source ), target = _frozen( target ), weight = _frozen( weight ), tokens = _frozen( tokens ),
+            keys = None if keys is None else tuple( keys ), multigraph = multigraph, _in = None )
+        return g
+
+    def save( self, directory ):
+        """ Writes the marked graph to a directory, which is created if needed. The graph is loaded with load. """
+        os.makedirs( directory, exist_ok = True )
+        for name in MARKED_GRAPH_ARRAYS:
+            np.save( os.path.join( directory, name + '.npy' ), getattr( self, name ))
+        write_marked_graph_header( directory, self.nodes, self.keys, self.multigraph )
+
+    @classmethod
+    def load( cls, directory, mmap_mode = 'r' ):
+        """ Loads a marked graph that was written by save (or by transform.compact_single_rate_marked_graph).
+        By default, its arrays are memory-mapped read-only with numpy.memmap, so that they are read from disk
+        as they are accessed, rather than loaded into memory. Set mmap_mode to None to load them.
+        """
+        with open( os.path.join( directory, MARKED_GRAPH_HEADER ), 'r' ) as infile:
+            header = json.load( infile )
+
+        if 'firings' in header:
+            firings = header[ 'firings' ]
+            nodes = Firings( [ _decode_name( v ) for v in firings[ 'actors' ]], np.diff( firings[ 'offsets' ] ))
+        else:
+            nodes = [ _decode_name( v ) for v in header[ 'nodes' ]]
+
+        keys = header[ 'keys' ]
+        if keys is not None:
+            keys = [ _decode_name( key ) for key in keys ]
+
+        arrays = { name : np.load( os.path.join( directory, name + '.npy' ), mmap_mode = mmap_mode ) for name in MARKED_GRAPH_ARRAYS }
+        return cls.from_csr( nodes, keys = keys, multigraph = header[ 'multigraph' ], **arrays )
+
+    def is_mapped( self ):
+        """ Returns whether the edge arrays are memory-mapped (see load) """
+        return isinstance( self.target, np.memmap )
+
+    def _init( self, **fields ):
+        for name, value in fields.items():
+            object.__setattr__( self, name, value )
+
+    def __setattr__( self, name, value ):
+        raise AttributeError( "CompactMarkedGraph is immutable" )
+
+    def __delattr__( self, name ):
+        raise AttributeError( "CompactMarkedGraph is immutable" )
+
+    def __getstate__( self ):
+        return { name : getattr( self, name ) for name in self.__slots__ }
+
+    def __setstate__( self, state ):
+        self._init( **state )
+
+    def number_of_nodes( self ):
+        return len( self.nodes )
+
+    def number_of_edges( self ):
+        return len( self.target )
+
+    def node_index( self, v ):
+        """ Returns the id of the node named v """
+        if isinstance( self.nodes, Firings ):
+            return self.nodes.index( v )
+        if self.index is None:
+            self._init( index = { name : i for i, name in enumerate( self.nodes ) })
+        return self.index[ v ]
+
+    def out_edges( self, v ):
+        """ Returns the range of edge indices that leave node v """
+        return range( self.offsets[ v ], self.offsets[ v + 1 ] )
+
+    def in_csr( self ):
+        """ Returns (offsets, edges) such that the incoming edges of node v are edges[offsets[v]:offsets[v + 1]] """
+        if self._in is None:
+            self._init( _in = _csr( len( self.nodes ), self.target ))
+        return self._in
+
+    def key( self, e ):
+        return e if self.keys is None else self.keys[ e ]
+
+    def edge( self, e ):
+        """ Returns edge e in terms of the original node names: a (v, w, key) triple or a (v, w) pair """
+        v, w = self.nodes[ self.source[ e ]], self.nodes[ self.target[ e ]]
+        return (v, w, self.key( e )) if self.multigraph else (v, w)
+
+    def subgraph( self, nodes ):
+        """ Returns the marked graph that is induced by the given node ids. Its nodes are ordered by id, and its
+        edges keep their keys (see key) and are reported as edges of this graph (see edge).
+        """
+        nodes = np.unique( np.asarray( nodes, dtype = np.int64 ))
+        ids = np.full( len( self.nodes ), -1, dtype = np.int64 )
+        ids[ nodes ] = np.arange( len( nodes ))
+        mask = (ids[ self.source ] >= 0) & (ids[ self.target ] >= 0)
+        keys = tuple( self.key( e ) for e in np.flatnonzero( mask ).tolist() )
+        return CompactMarkedGraph( [ self.nodes[ v ] for v in nodes.tolist() ],
+            ids[ self.source[ mask ]], ids[ self.target[ mask ]], self.weight[ mask ], self.tokens[ mask ],
+            keys, self.multigraph )
+
+    def to_networkx( self ):
+        """ Returns the marked graph as a networkx graph, with the same node names and edge keys """
+        g = nx.MultiDiGraph() if self.multigraph else nx.DiGraph()
+        g.add_nodes_from( self.nodes )
+        edges = zip( self.source.tolist(), self.target.tolist(), self.weight.tolist(), self.tokens.tolist() )
+        for e, (v, w, weight, tokens) in enumerate( edges ):
+            if self.multigraph:
+                g.add_edge( self.nodes[ v ], self.nodes[ w ], self.key( e ), weight = weight, tokens = tokens )
+            else:
+                g.add_edge( self.nodes[ v ], self.nodes[ w ], weight = weight, tokens = tokens )
+        return g
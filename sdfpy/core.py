@@ -1,8 +1,12 @@
 from math import ceil
 from functools import reduce
 import networkx as nx
+import numpy as np
 import json
 import yaml
+import ast
+import mmap
+import struct
 import sys
 import re
 import pdb
@@ -11,6 +15,7 @@ from math import gcd
 from sdfpy.integers import lcm
 from sdfpy.cyclic import Cyclic
 from sdfpy.graphs import dfs_edges
+from sdfpy.compact import CompactSDFGraph, _encode_name, _decode_name
 import xml.etree.ElementTree as etree
 
 class SDFGraph( nx.MultiDiGraph ):
@@ -59,6 +64,41 @@ class SDFGraph( nx.MultiDiGraph ):
         self.__s = s
         self.__tpi = tpi
 
+    @classmethod
+    def from_compiled( cls, cg, q_order = None ):
+        """ Rebuilds an SDF graph from a compiled graph (see compact.CompactSDFGraph).
+
+        The graph is neither validated nor checked for consistency: its repetition vector, normalisation
+        vector and modulus are taken from the compiled graph. The optional q_order lists the actor ids
+        in the order in which they appear in the repetition vector (by default, the actor order).
+        """
+        g = cls.__new__( cls )
+        nx.MultiDiGraph.__init__( g )
+
+        wcet, wcet_ptr, phases = cg.wcet.tolist(), cg.wcet_ptr.tolist(), cg.phases.tolist()
+        for v, name in enumerate( cg.actors ):
+            nx.MultiDiGraph.add_node( g, name, wcet = Cyclic( wcet[ wcet_ptr[ v ] : wcet_ptr[ v + 1 ]] ),
+                phases = phases[ v ], period = phases[ v ] )
+
+        prod, prod_ptr = cg.prod.tolist(), cg.prod_ptr.tolist()
+        cons, cons_ptr = cg.cons.tolist(), cg.cons_ptr.tolist()
+        s = {}
+        channels = zip( cg.src.tolist(), cg.dst.tolist(), cg.tokens.tolist(), cg.keys, cg.s )
+        for c, (v, w, tokens, key, s_c) in enumerate( channels ):
+            production = Cyclic( prod[ prod_ptr[ c ] : prod_ptr[ c + 1 ]] )
+            consumption = Cyclic( cons[ cons_ptr[ c ] : cons_ptr[ c + 1 ]] )
+            nx.MultiDiGraph.add_edge( g, cg.actors[ v ], cg.actors[ w ], key,
+                production = production, consumption = consumption, tokens = tokens,
+                gcd = gcd( production.sum(), consumption.sum() ),
+                pred = SDFGraph.__predecessor_fun( production, consumption, tokens ))
+            s[ (cg.actors[ v ], cg.actors[ w ]) ] = s_c
+
+        q = cg.q.tolist()
+        g.__q = { cg.actors[ v ] : q[ v ] for v in (range( len( q )) if q_order is None else q_order) }
+        g.__s = s
+        g.__tpi = cg.tpi
+        return g
+
     def repetition_vector(self):
         return self.__q
 
@@ -456,28 +496,112 @@ def predecessor(k = None, **kwargs):
 
         return maxval
 
+def predecessors(ks, **kwargs):
+    """ Vectorized version of predecessor: computes predecessor(k) for every
+    consuming firing k in the integer array ks, and returns the results as an array.
+
+    predecessor(k) = m + 1, where m is the largest number of producing firings that
+    together produce at most C(k) - tokens - 1 tokens, and C(k) is the number of tokens
+    consumed by the first k consuming firings. Rather than taking a maximum over all
+    production phases, m is split into whole periods and a remainder, which is found
+    with a binary search in the prefix sums of the production rates.
+    """
+    prates = Cyclic(kwargs['production'])
+    crates = Cyclic(kwargs['consumption'])
+    tokens = kwargs['tokens']
+
+    plen = len(prates)
+    clen = len(crates)
+    psum = prates.sum()
+    csum = crates.sum()
+
+    ks = np.asarray(ks, dtype = np.int64)
+    cprefix = np.array(crates.prefix_sums(), dtype = np.int64)
+    pprefix = np.array(prates.prefix_sums()[:plen], dtype = np.int64)
+
+    numerator = (ks // clen) * csum + cprefix[ks % clen] - tokens - 1
+    periods = numerator // psum
+    phase = np.searchsorted(pprefix, numerator - periods * psum, side = 'right') - 1
+    return periods * plen + phase + 1
+
 def chain(*predfuns):
     return reduce(lambda f, g: lambda x: g(f(x)), reversed(predfuns))
 
-def load_sdf_xml(filename):
-    tree = etree.parse(filename)
-    root = tree.getroot()
-    if root.tag != 'sdf3':
-        raise SDFParseError("Missing sdf3 root element")
-    if not 'type' in root.keys():
-        raise SDFParseError("Missing attribute 'type'")
-    graph_type = root.get('type')
-    if graph_type not in ['sdf', 'csdf']:
-        raise SDFParseError("Don't know how to deal with graph type {}".format(graph_type))
-    if not 'version' in root.keys():
-        raise SDFParseError("Missing attribute 'version'")
-    if root.get('version') != '1.0':
-        raise SDFParseError("Don't know how to deal with version {}".format(root.get('version')))
-    app_graph = root.find('applicationGraph')
+def load_sdf_xml(filename, free_elements = False):
+    """ Loads an SDF3 file.
+
+    The file is read in a single streaming pass, during which the ports of every actor, the channels and
+    the default execution times are indexed by name. Channels are then resolved against these indexes,
+    so that the graph is constructed in time linear in the size of the file.
+    If free_elements is True, elements are cleared and detached from the document as soon as they have been
+    indexed, which bounds the memory footprint when loading large files.
+    """
+    graph_type = None
+    app_graph = sdf_graph = sdf_graph_properties = None
+
+    actors = list()         # actor names, in document order
+    ports = dict()          # (actor, port) -> port attributes
+    channels = list()       # channel attributes, in document order
+    times = dict()          # actor -> default execution time attribute
+
+    path = list()
+    for event, element in etree.iterparse(filename, events = ('start', 'end')):
+        if event == 'start':
+            depth = len(path)
+            if depth == 0:
+                if element.tag != 'sdf3':
+                    raise SDFParseError("Missing sdf3 root element")
+                if not 'type' in element.keys():
+                    raise SDFParseError("Missing attribute 'type'")
+                graph_type = element.get('type')
+                if graph_type not in ['sdf', 'csdf']:
+                    raise SDFParseError("Don't know how to deal with graph type {}".format(graph_type))
+                if not 'version' in element.keys():
+                    raise SDFParseError("Missing attribute 'version'")
+                if element.get('version') != '1.0':
+                    raise SDFParseError("Don't know how to deal with version {}".format(element.get('version')))
+            elif depth == 1:
+                if app_graph is None and element.tag == 'applicationGraph':
+                    app_graph = element
+            elif depth == 2 and path[1] is app_graph:
+                if sdf_graph is None and element.tag == graph_type:
+                    sdf_graph = element
+                elif sdf_graph_properties is None and element.tag == '{}Properties'.format(graph_type):
+                    sdf_graph_properties = element
+            path.append(element)
+            continue
+
+        path.pop()
+        if not path:
+            continue
+
+        parent = path[-1]
+        if parent is sdf_graph:
+            if element.tag == 'actor':
+                name = element.get('name')
+                actors.append(name)
+                for port in element.iterfind('port'):
+                    ports.setdefault((name, port.get('name')), dict(port.attrib))
+            elif element.tag == 'channel':
+                channels.append(dict(element.attrib))
+        elif parent is sdf_graph_properties:
+            name = element.get('actor')
+            if element.tag == 'actorProperties' and name not in times:
+                for processor in element.iterfind("processor[@default='true']"):
+                    time = processor.find('executionTime[@time]')
+                    if time is not None:
+                        times[name] = time.get('time')
+                        break
+        elif len(path) > 2:
+            # descendants of other elements are freed together with their ancestor
+            continue
+
+        if free_elements:
+            element.clear()
+            parent.remove(element)
+
     if app_graph is None:
         raise SDFParseError("Missing 'applicationGraph' element")
-    sdf_graph = app_graph.find(graph_type)
-    sdf_graph_properties = app_graph.find('{}Properties'.format(graph_type))
     if sdf_graph is None:
         raise SDFParseError("Missing '{}' element".format(graph_type))
     if sdf_graph_properties is None:
@@ -487,16 +611,14 @@ def load_sdf_xml(filename):
     sdfg = nx.MultiDiGraph()
 
     # go over all actors and look up each actor's properties
-    for actor_element in sdf_graph.findall("actor"):
-        name = actor_element.get('name')
-        times = sdf_graph_properties.find("actorProperties[@actor='{}']/processor[@default='true']/executionTime[@time]".format(name))
-        if times is None:
+    for name in actors:
+        time = times.get(name)
+        if time is None:
             print("Warning: no execution time found for actor {}, assuming 1".format(name))
-            times = '1'
+            time = '1'
 
         wcet = list()
-        assert times is not None
-        for t in times.get('time').split(','):
+        for t in time.split(','):
             try:
                 wcet.append(int(t))
             except ValueError:
@@ -504,14 +626,14 @@ def load_sdf_xml(filename):
         sdfg.add_node( name, wcet = wcet )
 
     # go over channels
-    for channel_element in sdf_graph.findall("channel"):
-        src = channel_element.get('srcActor'), channel_element.get('srcPort')
+    for channel in channels:
+        src = channel.get('srcActor'), channel.get('srcPort')
         assert src[0] is not None, "channel has no srcActor"
         assert src[1] is not None, "channel has no srcPort"
-        src_port = sdf_graph.find("actor[@name='{}']/port[@name='{}']".format( *src ))
+        src_port = ports.get(src)
         if src_port is None:
             raise SDFParseError("Unknown actor/port: {}/{}".format( *src))
-        assert 'type' in src_port.attrib and src_port.attrib['type'] == 'out'
+        assert 'type' in src_port and src_port['type'] == 'out'
         production = list()
         for rate in src_port.get('rate', '1').split(','):
             try:
@@ -519,11 +641,11 @@ def load_sdf_xml(filename):
             except ValueError:
                 raise SDFParseError("Invalid rate for actor/port {}/{}".format(*src))
 
-        dst = channel_element.get('dstActor'), channel_element.get('dstPort')
-        dst_port = sdf_graph.find("actor[@name='{}']/port[@name='{}']".format( *dst ))
+        dst = channel.get('dstActor'), channel.get('dstPort')
+        dst_port = ports.get(dst)
         if dst_port is None:
             raise SDFParseError("Unknown actor/port: {}/{}".format(*dst))
-        assert 'type' in dst_port.attrib and dst_port.attrib['type'] == 'in'
+        assert 'type' in dst_port and dst_port['type'] == 'in'
         consumption = list()
         for rate in dst_port.get('rate', '1').split(','):
             try:
@@ -532,9 +654,9 @@ def load_sdf_xml(filename):
                 raise SDFParseError("Invalid rate for actor/port {}/{}".format(*dst))
 
         try:
-            tokens = int(channel_element.get('initialTokens', 0))
+            tokens = int(channel.get('initialTokens', 0))
         except ValueError:
-            raise SDFParseError("Invalid initialTokens attribute for channel {}".format(channel_element.get('name')))
+            raise SDFParseError("Invalid initialTokens attribute for channel {}".format(channel.get('name')))
 
         sdfg.add_edge( src[0], dst[0], production = Cyclic(production), consumption = Cyclic(consumption), tokens = tokens )
 
@@ -623,6 +745,95 @@ def write_sdf_xml( g, filename ):
     tree = etree.ElementTree(root)
     tree.write(filename, )
     
+# Binary format: magic, header length (little-endian uint64), JSON header, then the arrays of a compiled
+# graph as little-endian int64, in the order listed in the header, each starting at a multiple of eight bytes.
+# String and integer names and keys are stored as such, other names and keys as a list holding their Python literal.
+# The normalisation vector and the modulus are stored as (unbounded) integers.
+SDF_BINARY_MAGIC = b'SDFPYB01'
+SDF_BINARY_ARRAYS = ( 'phases', 'wcet', 'wcet_ptr', 'src', 'dst', 'tokens',
+                      'prod', 'prod_ptr', 'prod_psum', 'cons', 'cons_ptr', 'cons_psum',
+                      'out_ptr', 'out_channels', 'in_ptr', 'in_channels', 'q' )
+
+def write_sdf_binary( g, filename ):
+    """ Writes an SDF graph, or a compiled graph, in a binary format that is loaded with load_sdf_binary.
+    The file contains the rates, tokens, execution times and adjacency of the graph, as well as its repetition
+    vector, normalisation vector and modulus, so that loading the file does not need to analyse the graph again.
+    """
+    cg = g if isinstance( g, CompactSDFGraph ) else CompactSDFGraph( g )
+    if isinstance( g, CompactSDFGraph ):
+        q_order = list( range( cg.number_of_actors() ))
+    else:
+        q_order = [ cg.index[ v ] for v in g.repetition_vector() ]
+
+    arrays = [ (name, getattr( cg, name )) for name in SDF_BINARY_ARRAYS ]
+    arrays.append( ('q_order', np.asarray( q_order, dtype = np.int64 )) )
+    header = json.dumps( dict(
+        actors = [ _encode_name( v ) for v in cg.actors ],
+        keys = [ _encode_name( key ) for key in cg.keys ],
+        s = list( cg.s ),
+        tpi = cg.tpi,
+        arrays = [ [name, len( array )] for name, array in arrays ] )).encode( 'utf-8' )
+    header += b' ' * (-(len( SDF_BINARY_MAGIC ) + 8 + len( header )) % 8)
+
+    with open( filename, 'wb' ) as outfile:
+        outfile.write( SDF_BINARY_MAGIC )
+        outfile.write( struct.pack( '<Q', len( header )))
+        outfile.write( header )
+        for _, array in arrays:
+            outfile.write( np.ascontiguousarray( array, dtype = '<i8' ).tobytes() )
+
+def load_sdf_binary( filename, compiled = False ):
+    """ Loads a graph written by write_sdf_binary.
+
+    The file is memory-mapped and the graph is rebuilt without validating it or checking its consistency again.
+    If compiled is True, a CompactSDFGraph is returned whose arrays are read-only views of the mapped file.
+    Otherwise, the result is an SDFGraph.
+    """
+    with open( filename, 'rb' ) as infile:
+        try:
+            buf = mmap.mmap( infile.fileno(), 0, access = mmap.ACCESS_READ )
+        except ValueError:
+            raise SDFParseError("Not an sdfpy binary graph file: {}".format( filename ))
+
+    try:
+        start = len( SDF_BINARY_MAGIC ) + 8
+        if len( buf ) < start or buf[ : len( SDF_BINARY_MAGIC ) ] != SDF_BINARY_MAGIC:
+            raise SDFParseError("Not an sdfpy binary graph file: {}".format( filename ))
+
+        header_len, = struct.unpack_from( '<Q', buf, len( SDF_BINARY_MAGIC ))
+        try:
+            header = json.loads( buf[ start : start + header_len ].decode( 'utf-8' ))
+            actors = tuple( _decode_name( v ) for v in header['actors'] )
+            keys = tuple( _decode_name( key ) for key in header['keys'] )
+            s, tpi = tuple( header['s'] ), header['tpi']
+            lengths = [ (name, int( length )) for name, length in header['arrays'] ]
+        except (ValueError, SyntaxError, KeyError, TypeError) as e:
+            raise SDFParseError("Invalid header in binary graph file: {}".format( filename ), e)
+
+        if 'q_order' not in dict( lengths ):
+            raise SDFParseError("Missing array in binary graph file: 'q_order'")
+
+        # check the sizes before mapping any arrays, so that the file can be closed on errors
+        if start + header_len + 8 * sum( length for _, length in lengths ) > len( buf ):
+            raise SDFParseError("Binary graph file is truncated: {}".format( filename ))
+    except SDFParseError:
+        buf.close()
+        raise
+
+    arrays = {}
+    offset = start + header_len
+    for name, length in lengths:
+        arrays[ name ] = np.frombuffer( buf, dtype = '<i8', count = length, offset = offset )
+        offset += 8 * length
+
+    q_order = arrays.pop( 'q_order' ).tolist()
+    cg = CompactSDFGraph.from_fields( actors = actors, index = { v : i for i, v in enumerate( actors ) },
+        keys = keys, s = s, tpi = tpi, **arrays )
+
+    if compiled:
+        return cg
+    return SDFGraph.from_compiled( cg, q_order )
+
 def load_sdf_yaml(filename):
     with open(filename, 'r') as stream:
         try:
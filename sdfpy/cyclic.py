@@ -1,7 +1,14 @@
 from math import gcd
+from itertools import accumulate, cycle, islice
 from sdfpy.integers import lcm
 
 class Cyclic( tuple ):
+    """ A tuple that is indexed cyclically: entry k is entry (k mod N) of the underlying pattern of length N.
+
+    Sums over ranges of the infinite cyclic sequence are answered in O(1) from a table of prefix sums,
+    which is computed on first use. Strided sums use a prefix sum table per stride, which is also
+    computed on first use and then cached.
+    """
     def __new__(self, *arg):
         try:
             return super().__new__(self, tuple(*arg))
@@ -9,63 +16,104 @@ class Cyclic( tuple ):
             return super().__new__(self, tuple(arg))
 
     def __init__(self, *arg):
-        self.__sum = sum(self)
-    
+        self.__prefix = None
+        self.__strides = None
+
     def __getitem__(self, idx):
         if type(idx) is slice:
             start = idx.start or 0
-            start_mod = start % len(self)
-
             step = idx.step or 1
-            period = len(self) // gcd( step, len(self) )
-
-            pattern = []
-            for i in range(period):
-                if (idx.stop or 1) > 0:
-                    pattern.append(super().__getitem__((start + i * step) % len(self)))
-                else:
-                    pattern.append(super().__getitem__((start - i * step) % len(self)))
-            
+
+            if idx.stop is not None and idx.stop < 0:
+                # sequence runs backwards from start
+                result_len = max(0, 1 + (start - idx.stop - 1) // step)
+                return tuple( super(Cyclic, self).__getitem__((start - i * step) % len(self)) for i in range(result_len) )
+
+            pattern = self.__pattern(start, step)
             if idx.stop is not None:
                 # return tuple
-                if idx.stop >= 0:
-                    result_len = max(0, 1 + (idx.stop - start - 1) // step)
-                    num_periods = result_len // period
-                    mod_periods = result_len % period
-                    return tuple( pattern * num_periods + pattern[:mod_periods] )
-                else:
-                    result_len = max(0, 1 + (start - idx.stop - 1) // step)
-                    num_periods = result_len // period
-                    mod_periods = result_len % period
-                    return tuple( pattern * num_periods + pattern[:mod_periods] )
+                result_len = max(0, 1 + (idx.stop - start - 1) // step)
+                return tuple( islice( cycle( pattern ), result_len ))
             else:
                 # return cyclic pattern
                 return Cyclic( pattern )
         else:
             return super().__getitem__(idx % len(self))
 
+    def __pattern(self, start, step):
+        """ Returns the pattern start, start + step, start + 2 * step, ... taken over a single period """
+        n = len(self)
+        start_mod = start % n
+        if step % n == 1 % n:
+            # rotation of the pattern
+            return super().__getitem__(slice(start_mod, None)) + super().__getitem__(slice(0, start_mod))
+
+        period = n // gcd( step, n )
+        return tuple( super(Cyclic, self).__getitem__((start_mod + i * step) % n) for i in range(period) )
+
+    def prefix_sums(self):
+        """ Returns the prefix sums of the pattern: a tuple of length N + 1 that starts with zero """
+        if self.__prefix is None:
+            self.__prefix = tuple( accumulate( self, initial = 0 ))
+        return self.__prefix
+
+    def partial_sum(self, k):
+        """ Returns the sum of the first k entries of the cyclic sequence.
+        For negative k, returns minus the sum of the -k entries that precede entry 0.
+        """
+        n = len(self)
+        prefix = self.prefix_sums()
+        return (k // n) * prefix[n] + prefix[k % n]
+
+    def __stride_table(self, step):
+        """ Returns the prefix sum tables for sums with the given step.
+        The entries of the pattern are partitioned into gcd(step, N) residue classes; within a class,
+        consecutive elements are step apart. The result is a pair (tables, position), where tables[r] contains the
+        prefix sums of residue class r, and position[x] = (r, i) locates entry x as the i-th element of class r.
+        """
+        n = len(self)
+        step = step % n
+        if self.__strides is None:
+            self.__strides = dict()
+
+        table = self.__strides.get( step )
+        if table is None:
+            classes = gcd( step, n )
+            period = n // classes
+            tables = []
+            position = [None] * n
+            for r in range( classes ):
+                sequence = []
+                for i in range( period ):
+                    x = (r + i * step) % n
+                    position[ x ] = (r, i)
+                    sequence.append( super().__getitem__( x ))
+                tables.append( tuple( accumulate( sequence, initial = 0 )))
+
+            table = self.__strides[ step ] = (tables, position)
+
+        return table
+
     def sum(self, start = 0, stop = None, step = 1):
-        start_mod = start % len(self)
-        period = len(self) // gcd( step, len(self) )
-
-        pattern = self
-        psum = self.__sum
-        if start_mod > 0 or step != 1:
-            pattern = []
-            psum = 0
-            for i in range(period):
-                elem = super().__getitem__((start + i * step) % len(self))
-                psum += elem
-                pattern.append(elem)
-        
+        """ Returns the sum of entries start, start + step, ..., up to but not including stop """
         if stop is None:
             stop = len(self)
 
-        # return tuple
+        if step < 1:
+            raise ValueError("Step must be positive")
+
+        if step == 1:
+            if stop <= start:
+                return 0
+            return self.partial_sum(stop) - self.partial_sum(start)
+
         result_len = max(0, 1 + (stop - start - 1) // step)
-        num_periods = result_len // period
-        mod_periods = result_len % period
-        return num_periods * psum + sum(pattern[:mod_periods])
-    
+        tables, position = self.__stride_table(step)
+        r, i = position[ start % len(self) ]
+        prefix = tables[ r ]
+        period = len(prefix) - 1
+        end = i + result_len
+        return ((end // period) * prefix[period] + prefix[end % period]) - prefix[i]
+
     def as_list(self):
     	return list(self)
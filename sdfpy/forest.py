@@ -1,145 +1,117 @@
-class Node( object ):
-    def __init__(self):
-        self.__next_sibling = self
-        self.__prev_sibling = self
-        self.__first_child = None
-        self.__parent = None
-
-        self.__in_edge = None
-
-    @property
-    def next_sibling(self):
-        return self.__next_sibling
-
-    @property
-    def prev_sibling(self):
-        return self.__prev_sibling
-
-    @property
-    def in_edge(self):
-        return self.__in_edge
-
-    @property
-    def parent(self):
-        return self.__parent
-
-    @next_sibling.setter
-    def next_sibling(self, value):
-        self.__next_sibling = value
-
-    @prev_sibling.setter
-    def prev_sibling(self, value):
-        self.__prev_sibling = value
-
-    @in_edge.setter
-    def in_edge(self, args):
-        self.__parent = args[ 0 ]
-        self.__in_edge = args[ 1 ]
-
-    def removed_child( self, child ):
-        if self.__first_child == child:
-            next_sibling = child.next_sibling
-            if next_sibling == child:
-                self.__first_child = None
-            else:
-                self.__first_child = next_sibling
-
-    def unlink( self ):
-        self.__next_sibling.prev_sibling = self.__prev_sibling
-        self.__prev_sibling.next_sibling = self.__next_sibling
-        if self.__parent is not None:
-            self.__parent.removed_child( self )
-            self.__parent = None
-
-        self.__prev_sibling = self.__next_sibling = self
-
-    def append_child( self, child ):
-        if self.__first_child is None:
-            self.__first_child = child
-        else:
-            self.__first_child.prev_sibling.add_sibling( child )
-
-    def add_sibling( self, sib ):
-        sib.next_sibling = self.__next_sibling
-        self.__next_sibling.prev_sibling = sib
-        self.__next_sibling = sib
-        sib.prev_sibling = self
-
-    def children( self ):
-        child = self.__first_child
-        if child is not None:
-            yield child
-            child = child.next_sibling
-            while child != self.__first_child:
-                yield child
-                child = child.next_sibling
-
-    def pre_order( self ):
-        yield self
-        for child in self.children():
-            yield from child.pre_order()
-
-    def pre_order_edges( self ):
-        for child in self.children():
-            yield child.in_edge
-            yield from child.pre_order_edges()
-
 class Forest( object ):
+    """ A forest of rooted trees, whose edges are (parent, child, ...) tuples.
+
+    Nodes are stored in slots of parallel lists, which link every node to its parent, its first and last child,
+    and its previous and next sibling. Moving a subtree (see add_edge) relinks a constant number of slots, and
+    subtrees are traversed in pre-order by following the links, without recursion and in linear time.
+    """
+
+    __slots__ = ( '_index', '_roots', '_names', '_in_edge', '_parent', '_first', '_last', '_next', '_prev' )
 
     def __init__(self):
         super().__init__()
-        self.__nodes = {}
-        self.__roots = {}
+        self._index = {}
+        self._roots = {}
+        self._names = []
+        self._in_edge = []
+        self._parent = []
+        self._first = []
+        self._last = []
+        self._next = []
+        self._prev = []
 
     def roots( self ):
-        yield from self.__roots
+        yield from self._roots
 
     def parent(self, child):
-        return self.__nodes[child].in_edge
+        return self._in_edge[ self._index[ child ]]
 
     def __contains__(self, item):
-        return item in self.__nodes
+        return item in self._index
 
-    def add_edge(self, *edge):
-        a, b, *_ = edge
-        node_a = self.__nodes.get( a )
-        if node_a is None:
-            self.__nodes[ a ] = node_a = Node()
-            self.__roots[ a ] = node_a
+    def __len__(self):
+        return len( self._index )
 
-        node_b = self.__nodes.get( b )
-        if node_b is None:
-            self.__nodes[ b ] = node_b = Node()
+    def __new_slot( self, name ):
+        s = len( self._names )
+        self._index[ name ] = s
+        self._names.append( name )
+        self._in_edge.append( None )
+        for links in ( self._parent, self._first, self._last, self._next, self._prev ):
+            links.append( -1 )
+        return s
 
-        node_b.unlink()
-        node_a.append_child( node_b )
-        node_b.in_edge = node_a, edge
+    def add_edge(self, *edge):
+        """ Adds edge (a, b, ...), which makes b the last child of a. If b already has a parent, the edge replaces
+        the edge from its parent, and b is moved together with its subtree. """
+        a, b, *_ = edge
+        index, parent, first, last, nxt, prv = self._index, self._parent, self._first, self._last, self._next, self._prev
 
-        # node b can't be a root
-        self.__roots.pop( b, None )
+        sa = index.get( a )
+        if sa is None:
+            sa = self.__new_slot( a )
+            self._roots[ a ] = None
 
-    def pre_order( self, root = None ):
-        if root is not None:
-            # get the Node
-            yield root
-            n = self.__nodes[ root ]
-            for _, b, *_ in n.pre_order_edges():
-                yield b
+        sb = index.get( b )
+        if sb is None:
+            sb = self.__new_slot( b )
         else:
-            for root in self.__roots:
-                yield root
-                n = self.__roots[ root ]
-                for _, b, *_ in n.pre_order_edges():
-                    yield b
-
-    def pre_order_edges( self, root = None ):
-        if root is not None:
-            n = self.__nodes[ root ]
-            yield from n.pre_order_edges()
+            # unlink b from its parent and siblings
+            p, before, after = parent[ sb ], prv[ sb ], nxt[ sb ]
+            if before >= 0:
+                nxt[ before ] = after
+            elif p >= 0:
+                first[ p ] = after
+            if after >= 0:
+                prv[ after ] = before
+            elif p >= 0:
+                last[ p ] = before
+
+            # node b can't be a root
+            self._roots.pop( b, None )
+
+        # append b to the children of a
+        tail = last[ sa ]
+        if tail >= 0:
+            nxt[ tail ] = sb
         else:
-            for r in self.__roots:
-                n = self.__roots[ r ]
-                yield from n.pre_order_edges()
-
+            first[ sa ] = sb
+        prv[ sb ] = tail
+        nxt[ sb ] = -1
+        last[ sa ] = sb
+
+        parent[ sb ] = sa
+        self._in_edge[ sb ] = edge
+
+    def __descendants( self, root ):
+        """ Yields the slots of the proper descendants of root, in pre-order """
+        parent, first, nxt = self._parent, self._first, self._next
+        r = self._index[ root ]
+        s = first[ r ]
+        while s >= 0:
+            yield s
+            if first[ s ] >= 0:
+                s = first[ s ]
+                continue
+
+            # climb to the nearest ancestor (within the subtree) that has a next sibling
+            while s != r and nxt[ s ] < 0:
+                s = parent[ s ]
+            if s == r:
+                return
+            s = nxt[ s ]
 
+    def pre_order( self, root = None ):
+        names = self._names
+        roots = [ root ] if root is not None else list( self._roots )
+        for r in roots:
+            yield r
+            for s in self.__descendants( r ):
+                yield names[ s ]
 
+    def pre_order_edges( self, root = None ):
+        in_edge = self._in_edge
+        roots = [ root ] if root is not None else list( self._roots )
+        for r in roots:
+            for s in self.__descendants( r ):
+                yield in_edge[ s ]
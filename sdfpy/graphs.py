@@ -1,6 +1,8 @@
 import networkx as nx
+import numpy as np
 from random import sample, seed
 from math import ceil
+from bisect import bisect_right
 from collections import deque
 
 class InfeasibleCycle(Exception):
@@ -32,6 +34,65 @@ def cycle_induced_subgraph(g):
     # gather all edges of SCCs
     return nx.DiGraph( ( edge for scc in nx.strongly_connected_component_subgraphs( g ) for edge in scc.edges() ))
 
+def strongly_connected_components_csr( offsets, target ):
+    ''' Computes the strongly connected components of a graph in CSR form, in which the outgoing edges of node v
+    are offsets[v], ..., offsets[v + 1] - 1 and edge e leads to node target[e] (see compact.CompactMarkedGraph).
+    Returns a list of lists of node ids, in reverse topological order of the components.
+    '''
+    # the offsets are read into memory, the targets may be read from a memory-mapped array
+    offsets, target = _tolist( np.asarray( offsets )), _tolist( target )
+    n = len( offsets ) - 1
+
+    # Tarjan's algorithm, with an explicit stack of (node, next outgoing edge) pairs
+    number = [ -1 ] * n
+    lowlink = [ 0 ] * n
+    on_stack = [ False ] * n
+    stack = []
+    components = []
+    counter = 0
+    for root in range( n ):
+        if number[ root ] >= 0:
+            continue
+
+        number[ root ] = lowlink[ root ] = counter
+        counter += 1
+        stack.append( root )
+        on_stack[ root ] = True
+        calls = [ (root, offsets[ root ]) ]
+        while calls:
+            v, e = calls[ -1 ]
+            if e < offsets[ v + 1 ]:
+                calls[ -1 ] = v, e + 1
+                w = target[ e ]
+                if number[ w ] < 0:
+                    number[ w ] = lowlink[ w ] = counter
+                    counter += 1
+                    stack.append( w )
+                    on_stack[ w ] = True
+                    calls.append( (w, offsets[ w ]) )
+                elif on_stack[ w ] and number[ w ] < lowlink[ v ]:
+                    lowlink[ v ] = number[ w ]
+                continue
+
+            # post visit v
+            calls.pop()
+            if calls:
+                u = calls[ -1 ][ 0 ]
+                if lowlink[ v ] < lowlink[ u ]:
+                    lowlink[ u ] = lowlink[ v ]
+
+            if lowlink[ v ] == number[ v ]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[ w ] = False
+                    component.append( w )
+                    if w == v:
+                        break
+                components.append( component )
+
+    return components
+
 def dfs_edges( g, root = None ):
     if g.number_of_nodes() == 0: return
     visited = set()
@@ -58,116 +119,153 @@ def dfs_edges( g, root = None ):
             stack.pop()
 
 def circuit_basis( g ):
-    ''' Return a circuit basis for graph g.
+    ''' Return a circuit basis for graph g, as a generator of cycles. A cycle is a list of edges:
+    (v, w, key) triples if g is a multigraph, and (v, w) pairs otherwise.
     Graph g must be strongly connected.
-    '''
-
-    # maintain a multi-digraph to keep track of non-contracted edges
-    h = nx.MultiDiGraph()
-
-    # nodes in h are contractions of cycles in g
-    # represented as tuples
-    for v in g:
-        h.add_node( (v, ))
 
-    # add edges from g to h
-    for u, v, in g.edges():
-        h.add_edge( (u, ), (v, ), edge = (u, v ) )
-
-    # self-loops are fundamental circuits
-    for u, v in g.selfloop_edges():
-        assert u == v
-        yield [(u, v)]
-        h.remove_edge( (u,), (v,) )
-
-    # span contains all cycles of g found so far    
-    span = nx.DiGraph()
-
-    # while the graph has non-contracted edges,
-    # find a cycle using depth-first search
-    while h.number_of_edges() > 0:
-        # choose a random starting point
-        root = next( h.nodes())
+    The basis consists of fundamental cycles: a breadth-first out-tree spans the paths from a root node,
+    and a breadth-first in-tree the paths back to it. Each edge e = (u, v) that is not in the out-tree
+    closes the cycle that consists of the out-tree path from z to u, edge e, and the in-tree path from v to z,
+    where z is the first node on the in-tree path from v that is also on the out-tree path to u.
+    These cycles are simple, and independent: each contains e, or is the first to contain an edge of
+    the in-tree. Cycles are generated in O(V + E) time plus the length of the cycles.
+    '''
+    if g.number_of_nodes() == 0:
+        return
 
-        # run DFS from root
-        parent = dict()
-        queue = list()
-        visited = dict()
-        queue.append( (root, h.out_edges( root, keys = True )))
-        while queue:
-            v, it = queue[-1]
-            visited[v] = False
-            try:
-                _, w, idx = next( it )
-                if w not in visited:
-                    queue.append( (w, h.out_edges( w, keys = True )))
-                    parent[ w ] = v, idx
-                elif not visited[ w ]:
-                    # back edge, cycle found
-                    cycle = list()
-                    k = v
-                    while k != w:
-                        p, i = parent[ k ]
-                        cycle.append( (p, k, i ))
-                        k = p
-                    cycle.reverse()
-                    cycle.append( ( v, w, idx ))
-                    break
-            except StopIteration:
-                # post visit v
-                visited[v] = True
-                queue.pop()
+    if g.is_multigraph():
+        edges = list( g.edges( keys = True ))
+    else:
+        edges = list( g.edges() )
+
+    root = next( iter( g.nodes() ))
+    out_tree = _bfs_tree( root, edges, 0, 1 )
+    in_tree = _bfs_tree( root, edges, 1, 0 )
+    assert len( out_tree ) == len( in_tree ) == g.number_of_nodes(), "Graph is not strongly connected"
+
+    # number the out-tree in pre- and post-order, to test whether a node is on the path to another
+    children = { v : [] for v in out_tree }
+    for v, e in out_tree.items():
+        if e is not None:
+            children[ e[ 0 ]].append( v )
+
+    pre, post = dict(), dict()
+    counter = 0
+    stack = [ (root, iter( children[ root ] )) ]
+    pre[ root ] = counter
+    while stack:
+        v, it = stack[ -1 ]
+        w = next( it, None )
+        if w is None:
+            post[ v ] = counter
+            stack.pop()
         else:
-            assert False, "No cycle found, graph {} is not strongly connected".format( g.edges() )
-
-        # reconstruct cycle in g from cycle in h
-        cycle_in_g = list()
-        u, v, idx = cycle[ -1 ]
-        _, prev = h.get_edge_data( u, v )[ idx ].get('edge')
-
-        for u, v, idx in cycle:
-            a, b = h.get_edge_data( u, v )[ idx ].get('edge')
-
-            if a != prev:
-                # find path in span from prev to a
-                nodes = next(nx.all_simple_paths( span, prev, a ))
-                path = list(zip( nodes, nodes[1:] ))
-                cycle_in_g.extend( path )
-                span.add_edges_from( path )
-                
-            cycle_in_g.append( (a, b ))
-            span.add_edge( a, b )
-
-            h.remove_edge( u, v, idx )
-            prev = b
-
-        # yield cycle
-        yield cycle_in_g
-
-        if len( cycle ) > 1:
-            # contract cycle
-            # introduce new node
-            ns = []
-            for u, v, _ in cycle:
-                ns.extend( list(u) )
-            ns = tuple( ns )
-            h.add_node( ns)
-
-            for v, _, _ in cycle:
-                for u, _, data in h.in_edges( v, True ):
-                    h.add_edge( u, ns, edge = data.get('edge'))
-
-                for _, w, data in h.out_edges( v, True ):
-                    h.add_edge( ns, w, edge = data.get('edge'))
-
-                h.remove_node( v )
+            counter += 1
+            pre[ w ] = counter
+            stack.append( (w, iter( children[ w ] )) )
+
+    def on_path( z, u ):
+        # z is on the out-tree path from the root to u, i.e. z is an ancestor of u
+        return pre[ z ] <= pre[ u ] and post[ u ] <= post[ z ]
+
+    for e in edges:
+        u, v, *_ = e
+        if out_tree[ v ] == e:
+            continue
+
+        # follow the in-tree path from v up to the out-tree path to u
+        cycle = [ e ]
+        z = v
+        while not on_path( z, u ):
+            edge = in_tree[ z ]
+            cycle.append( edge )
+            z = edge[ 1 ]
+
+        # prepend the out-tree path from z to u
+        path = []
+        x = u
+        while x != z:
+            edge = out_tree[ x ]
+            path.append( edge )
+            x = edge[ 0 ]
+        path.reverse()
+
+        yield path + cycle
+
+def _bfs_tree( root, edges, tail, head ):
+    ''' Returns a breadth-first tree from root as a dictionary that maps the reached nodes onto their tree edge
+    (None for the root). The tree follows edges from position tail to position head, i.e. it is an out-tree if
+    (tail, head) is (0, 1), and an in-tree if it is (1, 0) '''
+    adjacency = dict()
+    for e in edges:
+        adjacency.setdefault( e[ tail ], [] ).append( e )
+
+    tree = { root : None }
+    queue = deque([ root ])
+    while queue:
+        v = queue.popleft()
+        for e in adjacency.get( v, () ):
+            w = e[ head ]
+            if w not in tree:
+                tree[ w ] = e
+                queue.append( w )
+
+    return tree
 
 def longest_distances( g, root, weight_attr = "weight" ):
+    ''' Computes the longest distances from root in the multigraph g. Returns the longest paths tree as a dictionary
+    that maps nodes onto their incoming (v, w, key) tree edge (None for the root), and the dictionary of distances.
+    Raises PositiveCycle if a cycle with positive weight is reachable from root.
+    '''
+    return _distances( g, root, weight_attr, 1, PositiveCycle )
+
+def shortest_distances( g, root, weight_attr = "weight" ):
+    ''' Computes the shortest distances from root in the multigraph g. Returns the shortest paths tree as a dictionary
+    that maps nodes onto their incoming (v, w, key) tree edge (None for the root), and the dictionary of distances.
+    Raises NegativeCycle if a cycle with negative weight is reachable from root.
+    '''
+    parents, distances = _distances( g, root, weight_attr, -1, NegativeCycle )
+    return parents, { v : -d for v, d in distances.items() }
+
+def _parent_cycle( parents ):
+    ''' Returns a cycle of (v, w, key) edges in the graph of parent edges, or None if that graph is a forest '''
+    state = dict()
+    for v in parents:
+        path = []
+        while v is not None and v not in state:
+            state[ v ] = path
+            path.append( v )
+            edge = parents[ v ]
+            v = edge[ 0 ] if edge is not None else None
+
+        if v is not None and state[ v ] is path:
+            # the walk returned to v: trace the cycle back to v
+            cycle = deque()
+            p = v
+            while True:
+                k, _, key = parents[ p ]
+                cycle.appendleft( (k, p, key) )
+                p = k
+                if p == v:
+                    return list( cycle )
+
+    return None
+
+def _distances( g, root, weight_attr, sign, cycle_exception ):
+    ''' Computes the longest distances from root for the edge weights multiplied by sign.
+
+    The distances are computed in rounds. Each round runs a DFS from the queued nodes along the edges that increase
+    a distance, during which an increase of the distance to a node on the DFS path reveals a cycle. The visited nodes
+    are then scanned in topological order (i.e. reverse post order). Nodes whose distance increases after they were
+    scanned, or that were not visited in this round, are queued for the next round.
+    Without cycles, the distances are final after as many rounds as there are nodes. From then on, the graph of
+    parent edges is checked for cycles after every round, which exist as soon as the distances on a cycle increase.
+    '''
     # maintain distances in dict
     distances = dict()
     distances[ root ] = 0
 
-    # maintain shortest paths tree structure
+    # maintain longest paths tree structure
     parents = dict()
     parents[ root ] = None
 
@@ -175,163 +273,260 @@ def longest_distances( g, root, weight_attr = "weight" ):
     # in topological order after each DFS
     post_order = list()
 
+    number_of_nodes = g.number_of_nodes()
+    rounds = 0
+
     queue = [ root ]
     while queue:
+        rounds += 1
+        if rounds > number_of_nodes:
+            cycle = _parent_cycle( parents )
+            if cycle is not None:
+                raise cycle_exception( cycle )
+
         # run DFS from nodes in queue
         visited = dict()
         while queue:
             # peek queue
             v = queue[ -1 ]
-            distance_from_v = distances[ v ]
+            children = visited.get( v, False )
+            if children is False:
+                # not visited yet, pre-visit v
+                visited[ v ] = iter( g.out_edges( v, keys = True, data = True ))
+                continue
+            elif children is None:
+                # v was queued more than once, and has been post-visited already
+                queue.pop()
+                continue
+
             try:
                 # visit next child
-                children = visited[ v ]
-                try:
-                    _, w, key, data = next( children )
-                    weight = data.get( weight_attr )
-                    distance_to_w = distances.get( w )
-                    distance_via_v = distance_from_v + weight
-
-                    admissible = (distance_to_w is None) or (distance_via_v > distance_to_w)
-                    if w not in visited and admissible:
-                        distances[ w ] = distance_via_v
-                        parents[ w ] = v, w, key
-                        queue.append( w )
-                    elif admissible:
-                        # w was visited before. if w is an ancestor of v,
-                        # then we have found a negative cycle
-                        children_w = visited[ w ]
-                        if children_w is not None:
-                            # w is an ancestor of v -> negative cycle found
-                            # trace edges back to w
-                            path = deque([ (v, w, key) ])
-                            p = v
-                            while p != w:
-                                k, _, key = parents[ p ]
-                                path.appendleft( (k, p, key) )
-                                p = k
-
-                            raise PositiveCycle( list( path ))
-                except StopIteration:
-                    # post visit v
-                    post_order.append( v )
-
-                    # indicate that v is post-visited
-                    visited[ v ] = None
-                    queue.pop()
-            except KeyError:
-                # not visited yet, pre-visit v
-                visited[ v ] = iter(g.out_edges( v, keys = True, data = True ))
+                _, w, key, data = next( children )
+            except StopIteration:
+                # post visit v
+                post_order.append( v )
+
+                # indicate that v is post-visited
+                visited[ v ] = None
+                queue.pop()
+                continue
+
+            distance_to_w = distances.get( w )
+            distance_via_v = distances[ v ] + sign * data.get( weight_attr )
+            if distance_to_w is not None and distance_via_v <= distance_to_w:
+                continue
+
+            children_w = visited.get( w, False )
+            if children_w is False:
+                distances[ w ] = distance_via_v
+                parents[ w ] = v, w, key
+                queue.append( w )
+            elif children_w is not None:
+                # w is an ancestor of v -> cycle found
+                # trace edges back to w
+                path = deque([ (v, w, key) ])
+                p = v
+                while p != w:
+                    k, _, key = parents[ p ]
+                    path.appendleft( (k, p, key) )
+                    p = k
+
+                raise cycle_exception( list( path ))
+            # otherwise, w is post-visited, and the edge is scanned below
 
         # go over nodes in reverse post order (i.e. topological order)
-        visited = dict()
+        scanned = set()
+        queued = set()
         while post_order:
             v = post_order.pop()
-            visited[ v ] = -1
+            scanned.add( v )
             distance_from_v = distances[ v ]
 
             for _, w, key, data in g.out_edges( v, keys = True, data = True ):
-                weight = data.get( weight_attr )
-                distance_to_w = distances[ w ]
-                distance_via_v = distance_from_v + weight
+                distance_to_w = distances.get( w )
+                distance_via_v = distance_from_v + sign * data.get( weight_attr )
 
-                if distance_via_v > distance_to_w:
+                if distance_to_w is None or distance_via_v > distance_to_w:
                     distances[ w ] = distance_via_v
                     parents[ w ] = v, w, key
 
-                    pos_in_queue = visited.get( w )
-                    if pos_in_queue is not None and pos_in_queue < 0:
-                        visited[ w ] = len( queue )
+                    # nodes that are still to be scanned in this round need not be queued
+                    if (w in scanned or w not in visited) and w not in queued:
+                        queued.add( w )
                         queue.append( w )
 
     return parents, distances
 
-def shortest_distances( g, root, weight_attr = "weight" ):
-    # maintain distances in dict
-    distances = dict()
-    distances[ root ] = 0
+def longest_distances_csr( offsets, target, weight, root ):
+    ''' Computes the longest distances from node root in a graph in CSR form, in which the outgoing edges of node v
+    are offsets[v], ..., offsets[v + 1] - 1, and edge e leads to node target[e] and has weight weight[e].
+    The arguments are sequences or numpy arrays; the weights may be integers, or any other numbers.
 
-    # maintain shortest paths tree structure
-    parents = dict()
-    parents[ root ] = None
+    Returns the longest paths tree as a list that holds the incoming tree edge of every node (-1 for the root and
+    for unreachable nodes), and the list of distances (None for unreachable nodes).
+    Raises PositiveCycle, with a list of edges, if a cycle with positive weight is reachable from root.
+    See longest_distances, which uses the same algorithm.
+    '''
+    return _distances_csr( offsets, target, weight, root, 1, PositiveCycle )
 
-    # maintain a post order so that we can finish nodes
-    # in topological order after each DFS
-    post_order = list()
+def shortest_distances_csr( offsets, target, weight, root ):
+    ''' Computes the shortest distances from node root in a graph in CSR form (see longest_distances_csr).
+    Raises NegativeCycle, with a list of edges, if a cycle with negative weight is reachable from root.
+    '''
+    parents, distances = _distances_csr( offsets, target, weight, root, -1, NegativeCycle )
+    return parents, [ None if d is None else -d for d in distances ]
+
+class _MappedInts( object ):
+    ''' Reads the integers of a memory-mapped array (see compact.CompactMarkedGraph.load) as they are accessed,
+    multiplied by a factor '''
+    __slots__ = ( 'values', 'factor' )
+
+    def __init__( self, values, factor = 1 ):
+        self.values, self.factor = values, factor
+
+    def __len__( self ):
+        return len( self.values )
+
+    def __getitem__( self, i ):
+        return self.factor * int( self.values[ i ] )
+
+class _Sources( object ):
+    ''' The source node of every edge of a graph in CSR form, found by a binary search in the offsets '''
+    __slots__ = ( 'offsets', )
+
+    def __init__( self, offsets ):
+        self.offsets = offsets
+
+    def __getitem__( self, e ):
+        return bisect_right( self.offsets, e ) - 1
 
+def _tolist( values, factor = 1 ):
+    ''' Returns the values as a list, multiplied by factor. Memory-mapped arrays are read as they are accessed. '''
+    if isinstance( values, np.memmap ):
+        return _MappedInts( values, factor )
+
+    values = values.tolist() if hasattr( values, 'tolist' ) else list( values )
+    return values if factor == 1 else [ factor * value for value in values ]
+
+def _distances_csr( offsets, target, weight, root, sign, cycle_exception ):
+    ''' Array version of _distances: nodes and edges are numbered, and the tree is a list of edges '''
+    offsets, target, weight = _tolist( np.asarray( offsets )), _tolist( target ), _tolist( weight, sign )
+    n = len( offsets ) - 1
+
+    distances = [ None ] * n
+    distances[ root ] = 0
+    parents = [ -1 ] * n
+    source = _Sources( offsets )
+
+    def trace( v, w, e ):
+        # the cycle closed by edge e = (v, w), through the tree path from w to v
+        path = deque([ e ])
+        p = v
+        while p != w:
+            e = parents[ p ]
+            path.appendleft( e )
+            p = source[ e ]
+        return list( path )
+
+    # node states during a DFS: not visited, on the DFS path, or post-visited
+    NOT_VISITED, ON_PATH, POST_VISITED = 0, 1, 2
+
+    post_order = list()
+    rounds = 0
     queue = [ root ]
     while queue:
+        rounds += 1
+        if rounds > n:
+            cycle = _parent_cycle_csr( parents, source )
+            if cycle is not None:
+                raise cycle_exception( cycle )
+
         # run DFS from nodes in queue
-        visited = dict()
-        # maintain iterators for all the visited nodes
-        visited_it = dict()
+        state = dict()
+        next_edge = dict()
         while queue:
             # peek queue
             v = queue[ -1 ]
-            distance_from_v = distances[ v ]
-            try:
-                # visit next child
-                children = visited[ v ]
-                if v not in visited_it:
-                    visited_it[v]= children.__iter__()
-                children_it = visited_it[v]
-                try:
-                    _, w, key, data = next( children_it)
-                    weight = data.get( weight_attr )
-                    distance_to_w = distances.get( w )
-                    distance_via_v = distance_from_v + weight
-
-                    admissible = (distance_to_w is None) or (distance_via_v < distance_to_w)
-                    if w not in visited and admissible:
-                        distances[ w ] = distance_via_v
-                        parents[ w ] = v, w, key
-                        queue.append( w )
-                    elif admissible:
-                        # w was visited before. if w is an ancestor of v,
-                        # then we have found a negative cycle
-                        children_w = visited[ w ]
-                        if children_w is not None:
-                            # w is an ancestor of v -> negative cycle found
-                            # trace edges back to w
-                            path = deque([ (v, w, key) ])
-                            p = v
-                            while p != w:
-                                k, _, key = parents[ p ]
-                                path.appendleft( (k, p, key) )
-                                p = k
-
-                            raise NegativeCycle( list( path ))
-                except StopIteration:
-                    # post visit v
-                    post_order.append( v )
-                    # indicate that v is post-visited
-                    visited[ v ] = None
-                    queue.pop()
-            except KeyError:
-                # not visited yet, pre-visit v
-                visited[ v ] = g.out_edges( v, keys = True, data = True )
+            s = state.get( v, NOT_VISITED )
+            if s == NOT_VISITED:
+                # pre-visit v
+                state[ v ] = ON_PATH
+                next_edge[ v ] = offsets[ v ]
+                continue
+            elif s == POST_VISITED:
+                # v was queued more than once, and has been post-visited already
+                queue.pop()
+                continue
 
+            e = next_edge[ v ]
+            if e == offsets[ v + 1 ]:
+                # post visit v
+                post_order.append( v )
+                state[ v ] = POST_VISITED
+                queue.pop()
+                continue
+
+            # visit next child
+            next_edge[ v ] = e + 1
+            w = target[ e ]
+            distance_to_w = distances[ w ]
+            distance_via_v = distances[ v ] + weight[ e ]
+            if distance_to_w is not None and distance_via_v <= distance_to_w:
+                continue
+
+            s = state.get( w, NOT_VISITED )
+            if s == NOT_VISITED:
+                distances[ w ] = distance_via_v
+                parents[ w ] = e
+                queue.append( w )
+            elif s == ON_PATH:
+                # w is an ancestor of v -> cycle found
+                raise cycle_exception( trace( v, w, e ))
+            # otherwise, w is post-visited, and the edge is scanned below
 
         # go over nodes in reverse post order (i.e. topological order)
-        visited = dict()
+        scanned = set()
+        queued = set()
         while post_order:
             v = post_order.pop()
-            visited[ v ] = -1
+            scanned.add( v )
             distance_from_v = distances[ v ]
 
-            for _, w, key, data in g.out_edges( v, keys = True, data = True ):
-                weight = data.get( weight_attr )
+            for e in range( offsets[ v ], offsets[ v + 1 ] ):
+                w = target[ e ]
                 distance_to_w = distances[ w ]
-                distance_via_v = distance_from_v + weight
+                distance_via_v = distance_from_v + weight[ e ]
 
-                if distance_via_v < distance_to_w:
+                if distance_to_w is None or distance_via_v > distance_to_w:
                     distances[ w ] = distance_via_v
-                    parents[ w ] = v, w, key
+                    parents[ w ] = e
 
-                    pos_in_queue = visited.get( w )
-                    if pos_in_queue is not None and pos_in_queue < 0:
-                        visited[ w ] = len( queue )
+                    # nodes that are still to be scanned in this round need not be queued
+                    if (w in scanned or w not in state) and w not in queued:
+                        queued.add( w )
                         queue.append( w )
 
     return parents, distances
 
+def _parent_cycle_csr( parents, source ):
+    ''' Returns a cycle of edges in the graph of parent edges (see _parent_cycle), or None if that graph is a forest '''
+    state = [ None ] * len( parents )
+    for v in range( len( parents )):
+        path = []
+        while v >= 0 and state[ v ] is None:
+            state[ v ] = path
+            path.append( v )
+            e = parents[ v ]
+            v = source[ e ] if e >= 0 else -1
+
+        if v >= 0 and state[ v ] is path:
+            cycle = deque()
+            p = v
+            while True:
+                e = parents[ p ]
+                cycle.appendleft( e )
+                p = source[ e ]
+                if p == v:
+                    return list( cycle )
+
+    return None
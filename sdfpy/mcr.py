@@ -1,23 +1,17 @@
 import networkx as nx
+import numpy as np
+import os
 
-from sdfpy.graphs import PositiveCycle, longest_distances
-from sdfpy.priorityq import PriorityQueue
+from sdfpy.graphs import PositiveCycle, longest_distances, longest_distances_csr, strongly_connected_components_csr
+from sdfpy.priorityq import IndexedPriorityQueue
 from sdfpy.forest import Forest
+from sdfpy.compact import CompactMarkedGraph
 from collections import deque
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from fractions import Fraction
-
-class pdistance( tuple ):
-    def __new__(self, weight, tokens):
-        return super().__new__(self, (weight, tokens))
-
-    def __add__(self, value):
-        return pdistance(self[0] + value[0], self[1] + value[1])
-            
-    def __sub__(self, value):
-        return pdistance(self[0] - value[0], self[1] - value[1])
-
-    def eval(self, ratio):
-        return self[0] - self[1] * ratio
+from math import gcd
 
 class InfeasibleException( PositiveCycle ):
     def __init__(self, cycle):
@@ -31,11 +25,58 @@ def strongly_connected_components_sg(g):
     for c in nx.strongly_connected_components(g):
         yield g.subgraph(c)
 
-def max_cycle_ratio( g, estimate = None ):
+def max_cycle_ratio( g, estimate = None, engine = 'pivot', processes = 1 ):
+    ''' Computes the maximum cycle ratio of the marked graph g, which is either a networkx graph
+    or a compact.CompactMarkedGraph. The edges of a compact graph that has no keys are keyed by their index.
+
+    The engine selects the algorithm that is applied to each strongly connected component (see ENGINES):
+    'pivot' for parametric pivoting (compute_mcr_component), or 'howard' for Howard's policy iteration
+    (compute_mcr_component_howard). Both compute the exact ratio.
+
+    The strongly connected components are independent. If processes is larger than one (or None, for one
+    process per CPU), they are solved in a pool of worker processes, which also computes the longest paths
+    forest of every component. The result does not depend on the number of processes.
+    '''
+    if engine not in ENGINES:
+        raise ValueError( "Unknown MCR engine: {}".format( engine ))
+
+    if isinstance( g, CompactMarkedGraph ):
+        # the components are compiled graphs as well; a component that spans g is g itself, so that the arrays of
+        # a memory-mapped graph are not copied
+        components = ( g if len( c ) == g.number_of_nodes() else g.subgraph( c )
+                       for c in strongly_connected_components_csr( g.offsets, g.target ))
+    else:
+        components = strongly_connected_components_sg( g )
+
+    # only components that contain an edge have cycles
+    components = [ scc for scc in components if scc.number_of_edges() > 0 ]
+
+    if processes == 1 or len( components ) <= 1:
+        results = [ _component_mcr( scc, estimate, engine ) for scc in components ]
+        maxratio, arg_cycle = _combine( results )
+        forest_edges = [ _component_forest( scc, maxratio ) for scc in components ]
+    else:
+        workers = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor( max_workers = workers ) as pool:
+            descriptions = [ _describe( scc ) for scc in components ]
+            chunksize = max( 1, len( descriptions ) // (4 * workers) )
+            results = list( pool.map( _described_component_mcr, descriptions,
+                repeat( estimate ), repeat( engine ), chunksize = chunksize ))
+            maxratio, arg_cycle = _combine( results )
+            forest_edges = list( pool.map( _described_component_forest, descriptions,
+                repeat( maxratio ), chunksize = chunksize ))
+
+    forest = Forest()
+    for edges in forest_edges:
+        for edge in edges:
+            forest.add_edge( *edge )
+
+    return maxratio, arg_cycle, forest
+
+def _combine( results ):
+    ''' Returns the maximum of the (ratio, cycle) pairs of the components '''
     maxratio, arg_cycle = None, None
-    for scc in strongly_connected_components_sg( g ):
-        root = next( iter( scc.nodes() ))
-        scc_mcr, cycle = compute_mcr_component( scc, root, estimate )
+    for scc_mcr, cycle in results:
         if scc_mcr is None:
             continue
 
@@ -43,25 +84,136 @@ def max_cycle_ratio( g, estimate = None ):
             maxratio = scc_mcr
             arg_cycle = cycle
 
-    forest = Forest()
-    for scc in strongly_connected_components_sg( g):
-        if scc.number_of_edges() == 0:
-            continue
+    return maxratio, arg_cycle
 
-        for ( v, w, scc_data ) in scc.edges( data = True ):
-            data = g.get_edge_data( v, w )
+def _first_node( scc ):
+    return scc.nodes[ 0 ] if isinstance( scc, CompactMarkedGraph ) else next( iter( scc.nodes() ))
 
-            # negate weight so that we can construct a longest paths tree for the current solution
-            scc_data['w'] = data.get( 'weight', 0 ) - data.get( 'tokens', 0 ) * maxratio
+def _component_mcr( scc, estimate, engine ):
+    return ENGINES[ engine ]( scc, _first_node( scc ), estimate )
 
-        root = w
-        parents, _ = longest_distances( scc, root, 'w' )
-        for child in parents:
-            in_edge = parents.get( child )
-            if in_edge is not None:
-                forest.add_edge( *in_edge )
+def _edge_list( scc ):
+    ''' Returns whether edges of the component are (v, w, key) triples, and a list of (v, w, key, weight, tokens) tuples '''
+    if isinstance( scc, CompactMarkedGraph ):
+        nodes = scc.nodes
+        edges = zip( scc.source.tolist(), scc.target.tolist(), scc.weight.tolist(), scc.tokens.tolist() )
+        return scc.multigraph, [ (nodes[ v ], nodes[ w ], scc.key( e ) if scc.multigraph else None, weight, tokens)
+                                 for e, (v, w, weight, tokens) in enumerate( edges ) ]
+    elif scc.is_multigraph():
+        return True, [ (v, w, key, data.get( 'weight', 0 ), data.get( 'tokens', 0 )) for v, w, key, data in scc.edges( keys = True, data = True ) ]
+    else:
+        return False, [ (v, w, None, data.get( 'weight', 0 ), data.get( 'tokens', 0 )) for v, w, data in scc.edges( data = True ) ]
 
-    return maxratio, arg_cycle, forest
+def _component_forest( scc, ratio ):
+    ''' Returns the edges of a longest paths tree of the component, for edge weights weight - tokens * ratio.
+    Since no cycle has a ratio that exceeds the maximum cycle ratio, there are no positive cycles.
+    '''
+    ratio = ratio or 0
+    if isinstance( scc, CompactMarkedGraph ):
+        # scale the weights by the denominator of the ratio, to keep them integer
+        ratio = Fraction( ratio )
+        if scc.is_mapped():
+            weights = _ScaledWeights( scc, ratio.denominator, -ratio.numerator )
+        else:
+            weights = [ ratio.denominator * weight - ratio.numerator * tokens for weight, tokens in zip( scc.weight.tolist(), scc.tokens.tolist() ) ]
+        parents, _ = longest_distances_csr( scc.offsets, scc.target, weights, 0 )
+        return [ scc.edge( e ) for e in parents if e >= 0 ]
+
+    is_multi, edges = _edge_list( scc )
+
+    wg = nx.MultiDiGraph()
+    for v, w, key, weight, tokens in edges:
+        wg.add_edge( v, w, key if is_multi else 0, weight = weight - tokens * ratio )
+
+    parents, _ = longest_distances( wg, _first_node( scc ))
+    return [ in_edge if is_multi else in_edge[ :2 ] for in_edge in parents.values() if in_edge is not None ]
+
+class _ScaledWeights( object ):
+    ''' The weights a * weight + b * tokens of the edges of a memory-mapped compiled graph, read as they are accessed '''
+    __slots__ = ( 'weight', 'tokens', 'a', 'b' )
+
+    def __init__( self, g, a, b ):
+        self.weight, self.tokens, self.a, self.b = g.weight, g.tokens, a, b
+
+    def __len__( self ):
+        return len( self.weight )
+
+    def __getitem__( self, e ):
+        return self.a * int( self.weight[ e ] ) + self.b * int( self.tokens[ e ] )
+
+def _describe( scc ):
+    ''' Returns a picklable description of a component: its type, nodes, and (v, w, key, weight, tokens) edges.
+    Compiled components are picklable themselves. '''
+    if isinstance( scc, CompactMarkedGraph ):
+        return scc
+
+    is_multi, edges = _edge_list( scc )
+    return is_multi, list( scc.nodes() ), edges
+
+def _rebuild( description ):
+    if isinstance( description, CompactMarkedGraph ):
+        return description
+
+    is_multi, nodes, edges = description
+    g = nx.MultiDiGraph() if is_multi else nx.DiGraph()
+    g.add_nodes_from( nodes )
+    for v, w, key, weight, tokens in edges:
+        if is_multi:
+            g.add_edge( v, w, key, weight = weight, tokens = tokens )
+        else:
+            g.add_edge( v, w, weight = weight, tokens = tokens )
+    return g
+
+def _described_component_mcr( description, estimate, engine ):
+    return _component_mcr( _rebuild( description ), estimate, engine )
+
+def _described_component_forest( description, ratio ):
+    return _component_forest( _rebuild( description ), ratio )
+
+def _higher_ratio( x, y ):
+    ''' Compares node keys (num, den, edge), which represent the ratio num / den with den > 0 '''
+    return x[0] * y[1] > y[0] * x[1]
+
+def _number_edges( g ):
+    ''' Numbers the nodes and edges of g, which is a networkx graph or a compact.CompactMarkedGraph. Returns the list
+    of nodes, a dictionary that maps nodes onto their numbers, the list of edges ((v, w, key) triples or (v, w) pairs),
+    the lists of source, target, weight and tokens per edge, and the lists of outgoing and incoming edges per node.
+    '''
+    if isinstance( g, CompactMarkedGraph ):
+        # the compiled graph is already numbered
+        nodes = list( g.nodes )
+        index = { v : i for i, v in enumerate( nodes ) }
+        offsets = g.offsets.tolist()
+        in_offsets, in_order = ( a.tolist() for a in g.in_csr() )
+        out_edges = [ list( range( offsets[ v ], offsets[ v + 1 ] )) for v in range( len( nodes )) ]
+        in_edges = [ in_order[ in_offsets[ v ] : in_offsets[ v + 1 ]] for v in range( len( nodes )) ]
+        edges = [ g.edge( e ) for e in range( g.number_of_edges() ) ]
+        return nodes, index, edges, g.source.tolist(), g.target.tolist(), g.weight.tolist(), g.tokens.tolist(), out_edges, in_edges
+
+    is_multi = g.is_multigraph()
+    nodes = list( g.nodes() )
+    index = { v : i for i, v in enumerate( nodes ) }
+    n = len( nodes )
+
+    if is_multi:
+        edge_iter = g.edges( keys = True, data = True )
+    else:
+        edge_iter = ( (v, w, None, data) for v, w, data in g.edges( data = True ))
+
+    edges, source, target, weight, tokens = [], [], [], [], []
+    out_edges = [ [] for _ in range( n ) ]
+    in_edges = [ [] for _ in range( n ) ]
+    for v, w, key, data in edge_iter:
+        e = len( edges )
+        edges.append( (v, w, key) if is_multi else (v, w) )
+        source.append( index[ v ] )
+        target.append( index[ w ] )
+        weight.append( data.get( 'weight', 0 ))
+        tokens.append( data.get( 'tokens', 0 ))
+        out_edges[ index[ v ] ].append( e )
+        in_edges[ index[ w ] ].append( e )
+
+    return nodes, index, edges, source, target, weight, tokens, out_edges, in_edges
 
 def compute_mcr_component( g, root, estimate = None ):
     ''' Computes the maximum cycle ratio of g.
@@ -70,114 +222,447 @@ def compute_mcr_component( g, root, estimate = None ):
         - The number of tokens on each edge must be non-negative.
         - The graph is assumed to be strongly connected.
     '''
+    return IncrementalMCR( g, root, estimate ).solve()
+
+class IncrementalMCR( object ):
+    ''' Maximum cycle ratio of a strongly connected marked graph, which is recomputed after changes to the weights
+    and tokens of its edges (see update_edge).
+
+    The ratio is computed with parametric pivoting: starting from a longest paths tree for a ratio that exceeds the
+    maximum cycle ratio, the ratio is decreased and the tree updated (pivoted), until a cycle closes. The final tree
+    remains a longest paths tree for the final ratio. After an update, the distances of the subtree below a changed
+    tree edge are shifted, and the tree is repaired into a longest paths tree for the previous ratio, starting from
+    the edges whose slack changed. Pivoting then resumes from the previous ratio. If the tree cannot be repaired,
+    the ratio has increased and the computation starts over.
+
+    Nodes and edges are numbered, and the parametric distance of every node is kept as an integer weight in dw
+    and an integer number of tokens in dt. Ratios are compared by cross-multiplication.
+    '''
+    def __init__( self, g, root = None, estimate = None ):
+        nodes, index, edges, source, target, weight, tokens, out_edges, in_edges = _number_edges( g )
+        self.__nodes, self.__edges = nodes, edges
+        self.__edge_index = { edge : e for e, edge in enumerate( edges ) }
+        self.__source, self.__target = source, target
+        self.__weight, self.__tokens = weight, tokens
+        self.__out_edges, self.__in_edges = out_edges, in_edges
+        offsets = [ 0 ]
+        for es in out_edges:
+            offsets.append( offsets[ -1 ] + len( es ))
+        self.__csr = offsets, [ e for es in out_edges for e in es ]
+        self.__root = 0 if root is None else index[ root ]
+        self.__estimate = estimate
+
+        self.__tree = None
+        self.__result = None
+        self.__ratio = None         # (num, den) of the last result
+        self.__changed = set()      # edges that changed since the last result
+        self.__shifted = set()      # nodes whose distance changed since the last result
+
+    def update_edge( self, edge, weight = None, tokens = None ):
+        ''' Changes the weight and/or tokens of an edge, given as a (v, w, key) triple, or a (v, w) pair
+        if the graph is not a multigraph '''
+        e = self.__edge_index[ edge ]
+        delta_w = 0 if weight is None else weight - self.__weight[ e ]
+        delta_t = 0 if tokens is None else tokens - self.__tokens[ e ]
+        if delta_w == delta_t == 0:
+            return
+
+        self.__weight[ e ] += delta_w
+        self.__tokens[ e ] += delta_t
+        self.__changed.add( e )
+        self.__result = None
+
+        tree = self.__tree
+        w = self.__target[ e ]
+        if tree is not None and w in tree and (tree.parent( w ) or (None, None, None))[ 2 ] == e:
+            # the distances to all nodes below w change
+            dw, dt = self.__dw, self.__dt
+            for j in tree.pre_order( w ):
+                dw[ j ] += delta_w
+                dt[ j ] += delta_t
+                self.__shifted.add( j )
+
+    def solve( self ):
+        ''' Returns the maximum cycle ratio and a critical cycle, or (None, None) if the graph has no cycles '''
+        if self.__result is None:
+            if self.__ratio is None or not self.__warm_start():
+                # a failed warm start leaves the tree in an arbitrary state
+                self.__ratio = None
+                self.__cold_start()
+
+            self.__changed.clear()
+            self.__shifted.clear()
+            self.__result = self.__pivot()
+
+        return self.__result
+
+    def __cold_start( self ):
+        source, target, weight, tokens = self.__source, self.__target, self.__weight, self.__tokens
+        n = len( self.__nodes )
+
+        estimate = self.__estimate
+        if estimate is None:
+            # determine lower bound for mcr
+            estimate = 1 + sum( max( 0, w ) for w in weight )
+
+        # compute longest paths for the non-parametric path weights, on the edges in CSR order
+        offsets, order = self.__csr
+        r = self.__root
+        dw, dt = [ None ] * n, [ None ] * n
+        try:
+            parents, _ = longest_distances_csr( offsets, [ target[ e ] for e in order ],
+                [ weight[ e ] - tokens[ e ] * estimate for e in order ], r )
+        except PositiveCycle as ex:
+            raise InfeasibleException( [ self.__edges[ order[ e ]] for e in ex.cycle ] )
 
-    # initialize:
-    distances = {}
-    queue = PriorityQueue()
-
-    if estimate is None:
-        # determine lower bound for mcr
-        estimate = 1
-        for (v, w, data) in g.edges(data=True):
-            tokens = data.get('tokens', 0)
-            weight = data.get('weight', 0)
-            estimate = estimate + max(0, weight)
-
-    initial_graph = nx.MultiDiGraph()
-    
-    # construct graph with non-parametric path weights
-    for v in g:
-        initial_graph.add_node( v )
-
-    for v, w, key, data in nx.MultiDiGraph(g).edges(keys = True, data = True):
-        tokens = data.get('tokens', 0)
-        weight = data.get('weight', 0)
-        initial_graph.add_edge( v, w, key, weight = weight - tokens * estimate, dist = pdistance(weight, tokens))
-
-    try:
-        parents, _ = longest_distances( initial_graph, root )
         # build tree from parents
         tree = Forest()
-        for child in parents:
-            in_edge = parents.get( child )
-            if in_edge is not None:
-                tree.add_edge( *in_edge )
-
-        distances[root] = pdistance(0, 0)
-        if root in tree:
-            for v, w, key in tree.pre_order_edges( root ):
-                dv = distances[ v ]
-                data = initial_graph.get_edge_data( v, w, key )
-                distances[ w ] = dv + data.get('dist')
-
-    except PositiveCycle as ex:
-        raise InfeasibleException( ex.cycle )
-
-    # fill priority queue:
-    # go over all nodes and compute their key
-    # print("Distances from root {}: {}".format(root, distances))
-    for v in distances:
-        update_node_key( initial_graph, v, distances, queue )
-
-    # pivot until cycle is found
-    while len(queue) > 0:
-        (node, (ratio, (v, w, vw_key))) = queue.pop()
-        delta = distances[v] + initial_graph.get_edge_data(v, w, vw_key)['dist'] - distances[w]
-
-        for j in tree.pre_order(w):
-            # update parametric distance to j
-            distances[j] += delta
-
-            if v == j:
-                # j is reachable from v -> there's a cycle!
-                is_multi = g.is_multigraph()
-                path = deque([ (v, w, vw_key) if is_multi else (v, w) ])
-                p = v
-                while p != w:
-                    k, _, key = tree.parent( p )
-                    path.appendleft( (k, p, key) if is_multi else (k, p) )
-                    p = k
-                return -ratio, list( path )
-            
-            # update successors of j; the node key of a successor k can only increase!
-            for _, k, jk_key, data in initial_graph.out_edges(j, keys = True, data = True):
-                # update priority of (j, k)
-                ratio_k = None
-                if k in queue:
-                    ratio_k, _ = queue[k]
-
-                delta_k = distances[j] + data['dist'] - distances[k]
-                if delta_k[1] > 0:
-                    r = -Fraction(delta_k[0], delta_k[1])
-                    if ratio_k is None or r < ratio_k:
-                        queue[k] = (r, (j, k, jk_key))
-
-            # recompute vertex key of j
-            update_node_key( initial_graph, j, distances, queue )
-
-        tree.add_edge( v, w, vw_key )
-    else:
-        # no cycle found, any period is admissible
-        # Note that this implies that the graph is acyclic
-        return None, None
-
-def update_node_key( g, node, pdistances, queue ):
-    maxratio, argmax = None, None
+        for child, e in enumerate( parents ):
+            if e >= 0:
+                e = order[ e ]
+                tree.add_edge( source[ e ], child, e )
+
+        dw[ r ], dt[ r ] = 0, 0
+        if r in tree:
+            for v, w, e in tree.pre_order_edges( r ):
+                dw[ w ] = dw[ v ] + weight[ e ]
+                dt[ w ] = dt[ v ] + tokens[ e ]
+
+        self.__tree, self.__dw, self.__dt = tree, dw, dt
+
+        # fill priority queue:
+        # go over all nodes and compute their key, then build the heap at once
+        keys = dict()
+        for v in range( n ):
+            if dw[ v ] is not None:
+                update_node_key( v, self.__in_edges[ v ], source, weight, tokens, dw, dt, keys )
+        self.__queue = IndexedPriorityQueue( n, less = _higher_ratio, keys = keys )
+
+    def __warm_start( self ):
+        ''' Makes the tree a longest paths tree for the previous ratio again, and updates the node keys.
+        Returns False if there is no such tree, i.e., if the maximum cycle ratio has increased.
+
+        The edges whose slack changed are checked first. An edge (u, x) that is too short becomes the tree edge of x,
+        and the distances in the subtree of x are shifted, after which the outgoing edges of that subtree are checked.
+        If u is in the subtree of x, the edges form a cycle with a ratio that exceeds the previous ratio.
+        '''
+        source, target, weight, tokens = self.__source, self.__target, self.__weight, self.__tokens
+        out_edges, in_edges = self.__out_edges, self.__in_edges
+        tree, dw, dt = self.__tree, self.__dw, self.__dt
+        num, den = self.__ratio
+
+        edges = set( self.__changed )
+        for v in self.__shifted:
+            edges.update( in_edges[ v ] )
+            edges.update( out_edges[ v ] )
+
+        if any( dw[ source[ e ]] is None or dw[ target[ e ]] is None for e in edges ):
+            return False
+
+        touched = set( target[ e ] for e in edges )
+        pending = deque( sorted( set( source[ e ] for e in edges )))
+        while pending:
+            u = pending.popleft()
+            for e in out_edges[ u ]:
+                x = target[ e ]
+                delta_w = dw[ u ] + weight[ e ] - dw[ x ]
+                delta_t = dt[ u ] + tokens[ e ] - dt[ x ]
+                if delta_w * den <= num * delta_t:
+                    continue
+
+                # (u, x) is too short for the previous ratio: move the subtree of x
+                for j in tree.pre_order( x ):
+                    if j == u:
+                        return False
+
+                    dw[ j ] += delta_w
+                    dt[ j ] += delta_t
+                    touched.add( j )
+                    pending.append( j )
+
+                tree.add_edge( u, x, e )
+
+        for j in list( touched ):
+            touched.update( target[ e ] for e in out_edges[ j ] )
+
+        queue = self.__queue
+        for x in touched:
+            update_node_key( x, in_edges[ x ], source, weight, tokens, dw, dt, queue )
+
+        return True
+
+    def __pivot( self ):
+        source, target, weight, tokens = self.__source, self.__target, self.__weight, self.__tokens
+        out_edges, in_edges = self.__out_edges, self.__in_edges
+        tree, dw, dt, queue = self.__tree, self.__dw, self.__dt, self.__queue
+
+        # pivot until cycle is found
+        while len(queue) > 0:
+            (w, (ratio_num, ratio_den, vw)) = queue.pop()
+            v = source[ vw ]
+            delta_w = dw[ v ] + weight[ vw ] - dw[ w ]
+            delta_t = dt[ v ] + tokens[ vw ] - dt[ w ]
+
+            # increased keys of successors of the subtree, which are applied to the queue in one batch
+            raised = dict()
+            for j in tree.pre_order( w ):
+                # update parametric distance to j
+                dw[ j ] += delta_w
+                dt[ j ] += delta_t
+
+                if v == j:
+                    # j is reachable from v -> there's a cycle!
+                    path = deque([ self.__edges[ vw ] ])
+                    p = v
+                    while p != w:
+                        k, _, e = tree.parent( p )
+                        path.appendleft( self.__edges[ e ] )
+                        p = k
+
+                    self.__restore( w, v, delta_w, delta_t )
+                    self.__ratio = (ratio_num, ratio_den)
+                    return Fraction( ratio_num, ratio_den ), list( path )
+
+                # update successors of j; the node key of a successor k can only increase!
+                dw_j, dt_j = dw[ j ], dt[ j ]
+                for jk in out_edges[ j ]:
+                    k = target[ jk ]
+                    # update priority of (j, k)
+                    delta_k_t = dt_j + tokens[ jk ] - dt[ k ]
+                    if delta_k_t > 0:
+                        delta_k_w = dw_j + weight[ jk ] - dw[ k ]
+                        key_k = raised.get( k ) or queue.get( k )
+                        if key_k is None or delta_k_w * key_k[1] > key_k[0] * delta_k_t:
+                            raised[ k ] = (delta_k_w, delta_k_t, jk)
+
+                # recompute vertex key of j
+                raised.pop( j, None )
+                update_node_key( j, in_edges[ j ], source, weight, tokens, dw, dt, queue )
+
+            queue.decrease_keys( raised.items() )
+            tree.add_edge( v, w, vw )
+        else:
+            # no cycle found, any period is admissible
+            # Note that this implies that the graph is acyclic
+            self.__ratio = None
+            return None, None
+
+    def __restore( self, w, v, delta_w, delta_t ):
+        ''' Undoes the distance updates of the pivot that closed a cycle, up to and including node v, so that the
+        tree is a longest paths tree for the final ratio, and recomputes the affected node keys '''
+        source, target, weight, tokens = self.__source, self.__target, self.__weight, self.__tokens
+        dw, dt, queue = self.__dw, self.__dt, self.__queue
+
+        updated = []
+        for j in self.__tree.pre_order( w ):
+            dw[ j ] -= delta_w
+            dt[ j ] -= delta_t
+            updated.append( j )
+            if j == v:
+                break
+
+        keys = set( updated )
+        for j in updated:
+            keys.update( target[ jk ] for jk in self.__out_edges[ j ] )
+        for k in keys:
+            update_node_key( k, self.__in_edges[ k ], source, weight, tokens, dw, dt, queue )
+
+def update_node_key( node, in_edges, source, weight, tokens, dw, dt, queue ):
+    ''' Computes the key of a node: its incoming edge (u, node) that maximizes the ratio of the weight and tokens
+    by which the parametric distance to node would increase via u. Returns the key (num, den, edge), or None.
+    '''
+    key = None
+    dw_node, dt_node = dw[ node ], dt[ node ]
     # go over all incoming edges of the node
-    for u, v, key, data in g.in_edges( node, keys = True, data = True ):
-        if u in pdistances:
-            delta = pdistances[u] + data['dist'] - pdistances[v]
-            # print("Delta for {} = {}".format((u, v), delta))
-            if delta[1] > 0:
-                ratio = Fraction(delta[0], delta[1])
-                if argmax is None or ratio > maxratio:
-                    maxratio = ratio
-                    argmax = u, v, key
+    for e in in_edges:
+        u = source[ e ]
+        if dw[ u ] is not None:
+            delta_t = dt[ u ] + tokens[ e ] - dt_node
+            if delta_t > 0:
+                delta_w = dw[ u ] + weight[ e ] - dw_node
+                if key is None or delta_w * key[1] > key[0] * delta_t:
+                    key = (delta_w, delta_t, e)
 
     # store the node key for v
-    if argmax is not None:
-        queue[node] = (-maxratio, argmax)
+    if key is not None:
+        queue[ node ] = key
     elif node in queue:
-        del queue[node]
+        del queue[ node ]
+
+    return key
+
+def _csr_chunks( g ):
+    ''' Returns the offsets of g in CSR form, a function that yields its edges in chunks, and a function that maps an edge
+    onto its (v, w, key) triple or (v, w) pair. A chunk (a, b, base, targets, weights, tokens) holds lists with the edges
+    of nodes a, ..., b - 1 in CSR order, of which the first is edge base.
+
+    A compiled graph is already in CSR form. If it is memory-mapped (see compact.CompactMarkedGraph.load), its edges
+    are read from disk in chunks of about CSR_CHUNK_SIZE edges, and otherwise in a single chunk.
+    '''
+    if isinstance( g, CompactMarkedGraph ):
+        offsets = np.asarray( g.offsets ).tolist()
+        n = len( offsets ) - 1
+        size = CSR_CHUNK_SIZE if g.is_mapped() else max( 1, offsets[ -1 ] )
+
+        def chunks():
+            a = 0
+            while a < n:
+                b = max( a + 1, min( n, bisect_right( offsets, offsets[ a ] + size ) - 1 ))
+                lo, hi = offsets[ a ], offsets[ b ]
+                yield a, b, lo, g.target[ lo : hi ].tolist(), g.weight[ lo : hi ].tolist(), g.tokens[ lo : hi ].tolist()
+                a = b
+
+        return offsets, chunks, g.edge
+
+    nodes, _, edges, _, target, weight, tokens, out_edges, _ = _number_edges( g )
+    offsets = [ 0 ]
+    for es in out_edges:
+        offsets.append( offsets[ -1 ] + len( es ))
+    order = [ e for es in out_edges for e in es ]
+    lists = [ target[ e ] for e in order ], [ weight[ e ] for e in order ], [ tokens[ e ] for e in order ]
+
+    def chunks():
+        if nodes:
+            yield (0, len( nodes ), 0, *lists)
+
+    return offsets, chunks, lambda e: edges[ order[ e ]]
+
+# the number of edges that compute_mcr_component_howard reads at once from a memory-mapped graph
+CSR_CHUNK_SIZE = 1 << 16
+
+def compute_mcr_component_howard( g, root = None, estimate = None ):
+    ''' Computes the maximum cycle ratio of g with Howard's policy iteration algorithm.
+    Returns the same (ratio, cycle) pair as compute_mcr_component; root and estimate are not used.
+    NOTES:
+        - The weight on each edge must be non-negative
+        - The number of tokens on each edge must be non-negative.
+        - The graph is assumed to be strongly connected.
+
+    A policy selects one outgoing edge for every node. Every node then reaches a single cycle of the policy graph,
+    whose ratio is the node's value, and a potential that is relative to a node on that cycle. The policy is
+    improved, first by choosing edges to nodes with a higher ratio, and then by choosing edges that increase the
+    potential, until it is stable. Cycles that persist from one policy to the next, with the same policy edge at
+    every node, keep their potentials, so that the potentials increase monotonically and the iteration terminates.
+    The ratio of the cycles in the final policy graph is the maximum cycle ratio.
+
+    Ratios are kept as reduced pairs (num, den) of integers and potentials are scaled by den, so that all arithmetic
+    is exact and integer. A cycle without tokens has ratio (-M, 1), where M exceeds the total weight of the graph,
+    unless its weight is positive, in which case the graph is infeasible.
+
+    Only the policy and the values of the nodes are kept in memory; the edges are scanned in CSR order, so that
+    a memory-mapped compiled graph is read from disk in chunks (see _csr_chunks).
+    '''
+    offsets, chunks, edge = _csr_chunks( g )
+    n = len( offsets ) - 1
+
+    if n == 0 or any( offsets[ v ] == offsets[ v + 1 ] for v in range( n )):
+        # in a strongly connected graph, this implies that the graph has no cycles
+        return None, None
+
+    # initial policy: the heaviest outgoing edge
+    # the target, weight and tokens of the policy edge of every node are kept with the policy
+    policy, policy_target, policy_weight, policy_tokens = [ None ] * n, [ None ] * n, [ None ] * n, [ None ] * n
+    total_weight = 0
+    for a, b, base, targets, weights, tokens in chunks():
+        total_weight += sum( abs( w ) for w in weights )
+        for v in range( a, b ):
+            i = max( range( offsets[ v ] - base, offsets[ v + 1 ] - base ), key = weights.__getitem__ )
+            policy[ v ], policy_target[ v ], policy_weight[ v ], policy_tokens[ v ] = base + i, targets[ i ], weights[ i ], tokens[ i ]
+
+    zero_ratio = (-1 - total_weight, 1)
+
+    num, den, potential = [ None ] * n, [ None ] * n, [ None ] * n
+    evaluated_policy = [ None ] * n
+    while True:
+        # determine the ratio of the cycle reached by every node, and its potential
+        previous = num, den, potential
+        previous_policy, evaluated_policy = evaluated_policy, list( policy )
+        num, den, potential = [ None ] * n, [ None ] * n, [ None ] * n
+        cycles = []
+        visited = [ -1 ] * n
+        for start in range( n ):
+            if num[ start ] is not None:
+                continue
+
+            # follow the policy until an evaluated node, or a node on the current walk
+            path = []
+            v = start
+            while num[ v ] is None and visited[ v ] != start:
+                visited[ v ] = start
+                path.append( v )
+                v = policy_target[ v ]
+
+            if num[ v ] is None:
+                # v is on a new cycle
+                cycle = path[ path.index( v ): ]
+                del path[ len( path ) - len( cycle ): ]
+                cycle_weight = sum( policy_weight[ u ] for u in cycle )
+                cycle_tokens = sum( policy_tokens[ u ] for u in cycle )
+                if cycle_tokens == 0:
+                    if cycle_weight > 0:
+                        raise InfeasibleException( [ edge( policy[ u ] ) for u in cycle ] )
+                    r = zero_ratio
+                else:
+                    d = gcd( cycle_weight, cycle_tokens )
+                    r = (cycle_weight // d, cycle_tokens // d)
+
+                cycles.append( (r, cycle) )
+                num[ v ], den[ v ], potential[ v ] = r[ 0 ], r[ 1 ], 0
+                if all( policy[ u ] == previous_policy[ u ] for u in cycle ):
+                    # the cycle is unchanged: keep the previous potentials, which are comparable to those of its
+                    # neighbours
+                    potential[ v ] = previous[ 2 ][ v ]
+                for u in reversed( cycle[ 1: ] ):
+                    w = policy_target[ u ]
+                    num[ u ], den[ u ] = r
+                    potential[ u ] = r[ 1 ] * policy_weight[ u ] - r[ 0 ] * policy_tokens[ u ] + potential[ w ]
+
+            for u in reversed( path ):
+                w = policy_target[ u ]
+                num[ u ], den[ u ] = num[ w ], den[ w ]
+                potential[ u ] = den[ w ] * policy_weight[ u ] - num[ w ] * policy_tokens[ u ] + potential[ w ]
+
+        # improve the ratios: move to successors that reach cycles with a higher ratio
+        improved = False
+        for a, b, base, targets, weights, tokens in chunks():
+            for v in range( a, b ):
+                best_num, best_den, best = num[ v ], den[ v ], None
+                for i in range( offsets[ v ] - base, offsets[ v + 1 ] - base ):
+                    w = targets[ i ]
+                    if num[ w ] * best_den > best_num * den[ w ]:
+                        best_num, best_den, best = num[ w ], den[ w ], i
+                if best is not None:
+                    policy[ v ], policy_target[ v ], policy_weight[ v ], policy_tokens[ v ] = base + best, targets[ best ], weights[ best ], tokens[ best ]
+                    improved = True
+
+        if improved:
+            continue
+
+        # improve the potentials among nodes with the same ratio
+        for a, b, base, targets, weights, tokens in chunks():
+            for v in range( a, b ):
+                best_potential, best = potential[ v ], None
+                for i in range( offsets[ v ] - base, offsets[ v + 1 ] - base ):
+                    w = targets[ i ]
+                    if num[ w ] == num[ v ] and den[ w ] == den[ v ]:
+                        p = den[ v ] * weights[ i ] - num[ v ] * tokens[ i ] + potential[ w ]
+                        if p > best_potential:
+                            best_potential, best = p, i
+                if best is not None:
+                    policy[ v ], policy_target[ v ], policy_weight[ v ], policy_tokens[ v ] = base + best, targets[ best ], weights[ best ], tokens[ best ]
+                    improved = True
+
+        if not improved:
+            break
+
+    (ratio_num, ratio_den), cycle = max( cycles, key = lambda c: Fraction( *c[ 0 ] ))
+    if (ratio_num, ratio_den) == zero_ratio:
+        # no cycle carries tokens
+        return None, None
+
+    return Fraction( ratio_num, ratio_den ), [ edge( policy[ u ] ) for u in cycle ]
 
-    return maxratio
+ENGINES = {
+    'pivot' : compute_mcr_component,
+    'howard' : compute_mcr_component_howard,
+}
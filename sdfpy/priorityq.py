@@ -1,9 +1,16 @@
+import operator
+
 class PriorityQueue(dict):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, less = None, **kwargs):
+        """ Creates an empty queue. The optional function less( x, y ) decides whether value x has a higher
+        priority than value y; by default, values are compared with <, and tuples by their first entry.
+        """
         super().__init__(*args, **kwargs)
 
         self._lookup = {}
         self._heap = [None]
+        if less is not None:
+            self._less_values = less
 
     def peek(self):
         """Returns the smallest element in the heap, without removing it
@@ -84,7 +91,7 @@ class PriorityQueue(dict):
         # look up current index
         pos = self._lookup[key]
 
-        if value > current:
+        if self._less_values(current, value):
             # move item away from root
             self._sink(pos)
         else:
@@ -95,8 +102,10 @@ class PriorityQueue(dict):
         self._lookup[self._heap[i]] = i
 
     def _less(self, i, j):
-        val_i = self[self._heap[i]]
-        val_j = self[self._heap[j]]
+        return self._less_values(self[self._heap[i]], self[self._heap[j]])
+
+    @staticmethod
+    def _less_values(val_i, val_j):
         if type(val_i) is type(val_j) is tuple:
             return val_i[0] < val_j[0]
         else:
@@ -133,3 +142,190 @@ class PriorityQueue(dict):
             self._swap(k, j)
             k = j
 
+
+class IndexedPriorityQueue(object):
+    """ An indexed binary heap, whose items are dense integer handles 0, 1, ... with a key each.
+
+    The heap is a list of handles, and the key and heap position of every handle are kept in parallel lists,
+    so that looking up, changing and removing the key of a handle takes no hashing. The optional function
+    less( x, y ) decides whether key x has a higher priority than key y; by default, keys are compared with <.
+    The lists grow when a handle beyond the current size is inserted.
+    """
+
+    __slots__ = ('_heap', '_position', '_keys', '_less')
+
+    def __init__(self, size = 0, less = None, keys = None):
+        self._heap = []
+        self._position = [-1] * size
+        self._keys = [None] * size
+        self._less = less if less is not None else operator.lt
+        if keys is not None:
+            self.heapify(keys)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, handle):
+        return 0 <= handle < len(self._position) and self._position[handle] >= 0
+
+    def __getitem__(self, handle):
+        if handle not in self:
+            raise KeyError(handle)
+        return self._keys[handle]
+
+    def get(self, handle, default = None):
+        return self._keys[handle] if handle in self else default
+
+    def peek(self):
+        """Returns the handle with the highest priority and its key, without removing it
+        """
+        handle = self._heap[0]
+        return (handle, self._keys[handle])
+
+    def pop(self):
+        """Returns and removes the handle with the highest priority, and its key
+        """
+        heap = self._heap
+        handle = heap[0]
+        last = heap.pop()
+        if heap:
+            heap[0] = last
+            self._position[last] = 0
+            self._sink(0)
+
+        self._position[handle] = -1
+        key, self._keys[handle] = self._keys[handle], None
+        return (handle, key)
+
+    def __iter__(self):
+        while self._heap:
+            yield self.pop()
+
+    def clear(self):
+        """Empties the queue
+        """
+        for handle in self._heap:
+            self._position[handle] = -1
+            self._keys[handle] = None
+        self._heap = []
+
+    def _reserve(self, handle):
+        missing = handle + 1 - len(self._position)
+        if missing > 0:
+            self._position.extend([-1] * missing)
+            self._keys.extend([None] * missing)
+
+    def heapify(self, keys):
+        """Replaces the contents of the queue by the given keys: a dictionary that maps handles onto keys,
+        or a sequence of (handle, key) pairs. Complexity: O(N).
+        """
+        self.clear()
+        items = keys.items() if hasattr(keys, 'items') else keys
+        heap, position, values = self._heap, self._position, self._keys
+        for handle, key in items:
+            self._reserve(handle)
+            if position[handle] < 0:
+                position[handle] = len(heap)
+                heap.append(handle)
+            values[handle] = key
+
+        for pos in range(len(heap) // 2 - 1, -1, -1):
+            self._sink(pos)
+
+    def __setitem__(self, handle, key):
+        """Inserts a handle, or changes its key. Complexity: O(log N).
+        """
+        self._reserve(handle)
+        pos = self._position[handle]
+        if pos < 0:
+            pos = self._position[handle] = len(self._heap)
+            self._heap.append(handle)
+            self._keys[handle] = key
+            self._swim(pos)
+        else:
+            current = self._keys[handle]
+            self._keys[handle] = key
+            if self._less(current, key):
+                self._sink(pos)
+            else:
+                self._swim(pos)
+
+    def decrease_keys(self, items):
+        """Inserts handles, or raises their priority, given as a sequence of (handle, key) pairs. A key must not
+        have a lower priority than the current key of its handle. The heap is rebuilt in O(N) when that is cheaper
+        than moving the handles up one by one.
+        """
+        items = list(items)
+        n = len(self._heap)
+        if len(items) * n.bit_length() > n + len(items):
+            position, values = self._position, self._keys
+            heap = self._heap
+            for handle, key in items:
+                self._reserve(handle)
+                if position[handle] < 0:
+                    position[handle] = len(heap)
+                    heap.append(handle)
+                values[handle] = key
+            for pos in range(len(heap) // 2 - 1, -1, -1):
+                self._sink(pos)
+        else:
+            for handle, key in items:
+                self[handle] = key
+
+    def __delitem__(self, handle):
+        """Removes a handle from the queue. Complexity: O(log N).
+        """
+        if handle not in self:
+            raise KeyError(handle)
+
+        heap, position = self._heap, self._position
+        pos = position[handle]
+        last = heap.pop()
+        position[handle] = -1
+        self._keys[handle] = None
+        if pos < len(heap):
+            heap[pos] = last
+            position[last] = pos
+            self._sink(pos)
+            self._swim(position[last])
+
+    def _swim(self, pos):
+        # move the handle at pos up while it has a higher priority than its parent
+        heap, position, keys, less = self._heap, self._position, self._keys, self._less
+        handle = heap[pos]
+        key = keys[handle]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            parent_handle = heap[parent]
+            if not less(key, keys[parent_handle]):
+                break
+            heap[pos] = parent_handle
+            position[parent_handle] = pos
+            pos = parent
+
+        heap[pos] = handle
+        position[handle] = pos
+
+    def _sink(self, pos):
+        # move the handle at pos down while one of its children has a higher priority
+        heap, position, keys, less = self._heap, self._position, self._keys, self._less
+        n = len(heap)
+        handle = heap[pos]
+        key = keys[handle]
+        while True:
+            child = 2 * pos + 1
+            if child >= n:
+                break
+
+            # inspect the child with the highest priority
+            if child + 1 < n and less(keys[heap[child + 1]], keys[heap[child]]):
+                child += 1
+            child_handle = heap[child]
+            if not less(keys[child_handle], key):
+                break
+            heap[pos] = child_handle
+            position[child_handle] = pos
+            pos = child
+
+        heap[pos] = handle
+        position[handle] = pos
@@ -5,7 +5,8 @@ import sdfpy.transform as transform
 import sdfpy.mcr as mcr
 import sdfpy.core
 import sdfpy.graphs as graphs
-from fractions import gcd
+from sdfpy.compact import CompactSDFGraph, CompactMarkedGraph
+from math import gcd
 
 """ A schedule defines the times at which actors fire.
 Each actor fires periodically, but the periods of two actors may vary.
@@ -21,6 +22,9 @@ The associated value is a
 """
 
 def strictly_periodic_schedule( graph, admissible = True ):
+    if isinstance( graph, CompactSDFGraph ):
+        return compact_strictly_periodic_schedule( graph, admissible )
+
     # transform the graph to its (pessimistic) single-rate aproximation
     apx = transform.single_rate_apx( graph, admissible )
 
@@ -41,14 +45,49 @@ def strictly_periodic_schedule( graph, admissible = True ):
     # compute the longest distances from a critical node
     parents, eigen_vector = graphs.longest_distances( wg, a )
 
+    return _periodic_schedule( graph, cycle_time, eigen_vector )
+
+def compact_strictly_periodic_schedule( cg, admissible = True ):
+    """ Computes the strictly periodic schedule of a compiled SDF graph (see compact.CompactSDFGraph).
+    The single-rate approximation is built as a compact.CompactMarkedGraph, whose longest distances are
+    computed on its arrays (see graphs.longest_distances_csr). The result equals that of strictly_periodic_schedule.
+    """
+    # the (pessimistic) single-rate approximation, as a marked graph that relates start times:
+    # channel (v, w) becomes an edge with the execution time of v as weight
+    wcets = [ max( cg.wcets( v )) if admissible else min( cg.wcets( v )) for v in range( cg.number_of_actors() ) ]
+    src, dst = cg.src.tolist(), cg.dst.tolist()
+    tokens = []
+    for c in range( cg.number_of_channels() ):
+        lo, up = transform.predecessor_lin_bounds( production = cg.production( c ),
+            consumption = cg.consumption( c ), tokens = int( cg.tokens[ c ] ))
+        delay = up if admissible else lo
+        toks = cg.s[ c ] * delay
+        v, w, _ = cg.channel( c )
+        assert toks.denominator == 1, "delay({}, {}) = {}, s[({}, {})] = {}".format( v, w, delay, v, w, cg.s[ c ] )
+        tokens.append( toks.numerator )
+
+    mg = CompactMarkedGraph( cg.actors, src, dst, [ wcets[ v ] for v in src ], tokens )
+
+    # compute max. cycle ratio for the approximation
+    cycle_time, cycle, *_ = mcr.max_cycle_ratio( mg )
+
+    # compute the longest distances from a critical node
+    (a, *_), *_ = cycle
+    weights = [ w - t * cycle_time for w, t in zip( mg.weight.tolist(), mg.tokens.tolist() ) ]
+    _, distances = graphs.longest_distances_csr( mg.offsets, mg.target, weights, mg.node_index( a ))
+
+    return _periodic_schedule( cg, cycle_time, dict( zip( mg.nodes, distances )))
+
+def _periodic_schedule( graph, cycle_time, eigen_vector ):
+    q = graph.repetition_vector()
+
     # compute the period for each actor
-    periods = { v : (graph.modulus() // graph.repetition_vector()[ v ]) * cycle_time for v in graph }
+    periods = { v : (graph.modulus() // q[ v ]) * cycle_time for v in q }
 
     # transform the eigenvector to a periodic schedule for the graph
     # first element in tuple = time of first firing
-    result = { v : (eigen_vector[ v ] + ( graph.modulus() // graph.repetition_vector()[ v ] - 1 ) * cycle_time, periods[ v ]) for v in periods }
+    result = { v : (eigen_vector[ v ] + ( graph.modulus() // q[ v ] - 1 ) * cycle_time, periods[ v ]) for v in periods }
 
     # ensure that time of first firing is non-negative
     min_start_time, _ = min( result.values() )
-    return { v : (eigen_vector[ v ] - min_start_time + ( graph.modulus() // graph.repetition_vector()[ v ] - 1 ) * cycle_time, periods[ v ]) for v in periods }
-
+    return { v : (eigen_vector[ v ] - min_start_time + ( graph.modulus() // q[ v ] - 1 ) * cycle_time, periods[ v ]) for v in periods }
@@ -5,199 +5,356 @@ Created on Wed Jun 12 15:32:53 2019
 @author: Robert de Groote
 """
 import networkx as nx
+import random
+import sys
+import time
+from collections import deque
 
-class SPTreeNode(object):
+from sdfpy.graphs import NegativeCycle, PositiveCycle, longest_distances, shortest_distances
+
+class TreeNode(object):
+    ''' A node in a shortest (or longest) paths policy.
+        Its parent is the incoming tree edge at the last visit of the node, and
+        its adopter is the incoming edge that realizes its current distance.
+    '''
     def __init__(self, distance = None):
         self.parent = None
         self.adopter = None
         self.distance = distance
         self.changed = False
         self.queued = False
-        
+
+    def policy_changed(self):
+        if self.parent is None:
+            return False
+
+        return self.parent != self.adopter
+
+    def update_policy(self):
+        self.parent = self.adopter
+
+class SPTreeNode(TreeNode):
     def is_improvement(self, d):
         if self.distance is None:
             return True
         else:
             return d < self.distance
 
-class LPTreeNode(object):
-    def __init__(self, distance = None):
-        self.parent = None
-        self.distance = distance
-        self.new_parent = None
-    
-    def policy_changed(self):
-        if self.parent is None:
-            return False
-        
-        return self.parent != self.new_parent
-    
-    def improves_policy(self, new_parent, new_distance):
-        if new_distance > self.distance:
-            self.new_parent = new_parent
-            self.distance = new_distance
+class LPTreeNode(TreeNode):
+    def is_improvement(self, d):
+        if self.distance is None:
             return True
         else:
-            return False
+            return d > self.distance
 
-    def update_policy(self):
-        self.parent = self.new_parent
-        
 def __keyed_edges(g, nbunch = None, data = False):
     if g.is_multigraph():
         return g.edges(nbunch, keys = True, data = data)
     elif data:
-        return ((u, v, -1, d) for u, v, d in g.edges(nbunch, data = True))
+        return ((u, v, None, d) for u, v, d in g.edges(nbunch, data = True))
     else:
-        return ((u, v, -1) for u, v in g.edges(nbunch))
-    
-''' Shortest paths algorithm that builds incrementally
-    better shortest path policies.
-    A shortest path policy is simply the current best known shortest paths
-    tree.
-    Policy updates are done in such a way that policy-changing updates
-    are postponed until all policy-preserving updates have been made.
-    Consequently, in case the policy is very inaccurate (such is the case
-    at the first iteration), the algorithm behaves as a breadth-first search.
-    As (parts of) the policy becomes more accurate, the algorithm behaves
-    more as a depth-first search.
-    This could be sped up a bit by running a full DFS at the first iteration,
-    building a spanning policy in the process. As a nice consequence, this would
-    also mean that acyclic graphs are "solved" in the first iteration.
-'''
-def shortest_paths(g, root, weight = 'weight'):
-    # build a first longest paths tree, rooted in root, using DFS
-    # mark relaxed but non-visited nodes
-    # restart DFSs from marked nodes
-    # postpone DFS at nodes for which visitor is not the parent
-    
-    # per node in the graph, its parent in the current
-    # longest paths tree
-    
-    # the longest distances in the current longest paths tree
+        return ((u, v, None) for u, v in g.edges(nbunch))
+
+def _adjacency(g, weight):
+    ''' Lists the outgoing (target, edge, weight) triples of every node, where an edge is
+        a (u, v, key) triple in a multigraph, and a (u, v) pair otherwise '''
+    multi = g.is_multigraph()
+    adjacency = {v : [] for v in g}
+    for u, v, key, data in __keyed_edges(g, data = True):
+        adjacency[u].append((v, (u, v, key) if multi else (u, v), data[weight]))
+    return adjacency
+
+def _adopter_cycle(lpt):
+    ''' Returns a cycle in the graph of adopter edges, or None if that graph is a forest '''
+    state = dict()
+    for v in lpt:
+        path = []
+        while v is not None and v not in state:
+            state[v] = path
+            path.append(v)
+            edge = lpt[v].adopter
+            v = edge[0] if edge is not None else None
+
+        if v is not None and state[v] is path:
+            cycle = deque()
+            p = v
+            while True:
+                edge = lpt[p].adopter
+                cycle.appendleft(edge)
+                p = edge[0]
+                if p == v:
+                    return list(cycle)
+
+    return None
+
+def _policy_paths(g, root, weight, node_type, cycle_exception):
+    # per node in the graph, its parent and adopter in the current policy,
+    # and its best known distance
     lpt = dict()
     for v in g:
-        lpt[v] = SPTreeNode()
-        
-    lpt[root] = SPTreeNode(0)
-    
+        lpt[v] = node_type()
+
+    lpt[root] = node_type(0)
+    adjacency = _adjacency(g, weight)
+
     post_order = list()
     previsits = 0
-    
+    rounds = 0
+
     # DFS queue
-    queue = [(root, None)]
-    # Outer loop: per iteration, a depth-first delimited search followed
+    queue = [root]
+    lpt[root].queued = True
+    # Outer loop: per round, depth-first delimited searches followed
     # by a reversed post order visit
     while queue:
-        visited = set()
+        rounds += 1
+        if rounds > len(lpt):
+            # without cycles, the distances are final after this many rounds
+            cycle = _adopter_cycle(lpt)
+            if cycle is not None:
+                raise cycle_exception(cycle)
+
+        # per visited node, the index of its next edge while it is on
+        # the DFS path, and None once it has been post-visited
+        visited = dict()
+
         # DFS loop:
         #  per iteration, a depth-first delimited search is run
         #  from each node in the queue
         while queue:
-            queue2 = list()
+            postponed = list()
             # Inner loop: depth-first delimited search
             # depth-first delimited searches from adopted children
-            # are postponed 
+            # are postponed
             while queue:
-                # pop the current node and its edge-iterator
-                v, it = queue[-1]
+                v = queue[-1]
                 node_v = lpt[v]
-                # check if we're pre-visiting v
-                if it is None:
+                if v not in visited:
                     # pre visit v
-                    if v in visited:
-                        raise Exception("Already visited!")
-                    
                     previsits += 1
-                    visited.add( v )
-                    node_v.parent = node_v.adopter
-                    it = iter( g.edges( v, data = True ))
-                    queue[-1] = v, it
-        
-                node_v.changed = node_v.queued = False
-                for _, w, data in it:
-                    # see if the distance to w using this edge is longer
-                    # than its current distance
-                    node_w = lpt.get(w, SPTreeNode())
-                    dw = node_v.distance + data[weight]
-                    if node_w.is_improvement( dw ):
-                        # update distance
-                        node_w.distance = dw
-                        node_w.adopter = v
-                        node_w.changed = True
-                        
-                        # did we already visit w?
-                        if w not in visited and not node_w.queued:
-                            # either continue DFS with w,
-                            # or postpone DFS rooted in w
-                            # Is v the parent of w?
-                            if node_w.parent == v:
-                                # continue DFS if w has not been visited yet
-                                queue.append( (w, None) )
-                                break
-                            else:
-                                # postpone visiting w
-                                queue2.append( (w, None) )
-                                node_w.queued = True
-                        elif node_w.parent != v:
-                            # disassemble the subtree rooted in w, ma
+                    node_v.update_policy()
+                    node_v.changed = node_v.queued = False
+                    visited[v] = 0
+                elif visited[v] is None:
+                    # v was queued more than once, and has been post-visited already
+                    node_v.queued = False
+                    queue.pop()
+                    continue
+
+                edges = adjacency[v]
+                i = visited[v]
+                while i < len(edges):
+                    w, edge, data = edges[i]
+                    i += 1
+
+                    # see if the distance to w using this edge improves
+                    # its current distance
+                    node_w = lpt[w]
+                    dw = node_v.distance + data
+                    if not node_w.is_improvement(dw):
+                        continue
+
+                    if visited.get(w) is not None:
+                        # w is on the DFS path to v -> cycle found
+                        path = deque([edge])
+                        p = v
+                        while p != w:
+                            e = lpt[p].adopter
+                            path.appendleft(e)
+                            p = e[0]
+                        raise cycle_exception(list(path))
 
+                    # update distance
+                    node_w.distance = dw
+                    node_w.adopter = edge
+                    node_w.changed = True
+
+                    # did we already visit w?
+                    # otherwise, w is post-visited, and is scanned below
+                    if w not in visited and not node_w.queued:
+                        # either continue DFS with w, or postpone DFS rooted in w:
+                        # continue if w has no policy yet, or if the policy is preserved
+                        if node_w.parent is None or node_w.parent == edge:
+                            queue.append(w)
+                            break
+                        else:
+                            postponed.append(w)
+                            node_w.queued = True
                 else:
                     # post visit v
                     queue.pop()
                     post_order.append(v)
-                    node_v.queued = False
-        
+                    visited[v] = None
+                    continue
+
+                visited[v] = i
+
             # run DFS from postponed
-            queue = queue2
-                
+            queue = postponed
+
         # run reverse post order traversal
+        scanned = set()
         while post_order:
             v = post_order.pop()
-            node_v = lpt[ v ]
-            node_v.parent = node_v.adopter
-            
+            scanned.add(v)
+            node_v = lpt[v]
+            node_v.update_policy()
+
             # check outgoing edges
             if node_v.changed:
                 previsits += 1
-                for _, w, data in g.edges(v, data = True):
-                    node_w = lpt.get(w, SPTreeNode())
-                    dw = node_v.distance + data[weight]
-                    if node_w.is_improvement( dw ):
+                for w, edge, data in adjacency[v]:
+                    node_w = lpt[w]
+                    dw = node_v.distance + data
+                    if node_w.is_improvement(dw):
                         node_w.distance = dw
-                        node_w.adopter = v
+                        node_w.adopter = edge
                         node_w.changed = True
-                        if not node_w.queued:
-                            queue.append( (w, None) )
+
+                        # nodes that are still to be scanned in this round need not be queued
+                        if (w in scanned or w not in visited) and not node_w.queued:
+                            queue.append(w)
                             node_w.queued = True
-                        
+
             node_v.changed = False
 
-    # return distances
+    parents = dict()
     distances = dict()
-    for v in g:
-        distances[v] = lpt[ v ].distance
-        
-    return distances, previsits
+    for v, node_v in lpt.items():
+        if node_v.distance is not None:
+            parents[v] = node_v.adopter
+            distances[v] = node_v.distance
 
-if __name__ == "__main__":
-    with open("/Users/grootee/graphs/grid_200_500_1", "r") as f:
-        g = nx.DiGraph()
-        for l in f.readlines():
-            contents = l.split()
-            if contents[0] == 'a':
-                src = int(contents[1])
-                dst = int(contents[2])
-                w = int(contents[3])
-                g.add_edge(src, dst, weight = w)
+    return parents, distances, previsits
 
+def shortest_paths(g, root, weight = 'weight'):
+    ''' Shortest paths algorithm that builds incrementally
+        better shortest path policies.
+        A shortest path policy is simply the current best known shortest paths
+        tree.
+        Policy updates are done in such a way that policy-changing updates
+        are postponed until all policy-preserving updates have been made.
+        The first visit of a node runs a full DFS, which builds a spanning policy,
+        so that acyclic graphs are "solved" in the first round.
+        As (parts of) the policy becomes more accurate, the algorithm behaves
+        more as a depth-first search.
+
+        Returns the shortest paths tree as a dictionary that maps every reachable node onto its
+        incoming tree edge (None for root), the distances of the reachable nodes, and the number of
+        node visits and scans.
+        Raises graphs.NegativeCycle if a cycle with negative weight is reachable from root.
+    '''
+    return _policy_paths(g, root, weight, SPTreeNode, NegativeCycle)
+
+def longest_paths(g, root, weight = 'weight'):
+    ''' Longest paths version of shortest_paths.
+        Raises graphs.PositiveCycle if a cycle with positive weight is reachable from root.
+    '''
+    return _policy_paths(g, root, weight, LPTreeNode, PositiveCycle)
+
+def load_dimacs(filename):
+    ''' Loads a graph in the DIMACS shortest paths format (.gr): a problem line 'p sp <nodes> <arcs>',
+        followed by arc lines 'a <source> <target> <weight>'. Nodes are numbered from 1.
+        Returns the graph, and the source node of an optional line 'n <source>' (or None)
+    '''
+    g = nx.MultiDiGraph()
+    root = None
+    with open(filename, "r") as f:
+        for l in f:
+            contents = l.split()
+            if not contents or contents[0] == 'c':
+                continue
+            elif contents[0] == 'p':
+                g.add_nodes_from(range(1, int(contents[2]) + 1))
+            elif contents[0] == 'a':
+                g.add_edge(int(contents[1]), int(contents[2]), weight = int(contents[3]))
             elif contents[0] == 'n':
                 root = int(contents[1])
 
-        print("Root: {}".format(root))
-        print("Graph has {} nodes, {} edges".format(g.number_of_nodes(), g.number_of_edges()))
+    return g, root
+
+def grid_instance(rows, columns, max_weight = 100, rng = random):
+    ''' Generates a grid, in which each node has arcs to its neighbours in the next column, and
+        arcs up and down its column. Returns the graph, with random non-negative weights, and a source
+        node that has arcs to the first column.
+    '''
+    g = nx.MultiDiGraph()
+    g.add_node(0)
+    for r in range(rows):
+        g.add_edge(0, (r, 0), weight = rng.randint(0, max_weight))
+        for c in range(columns):
+            if c + 1 < columns:
+                g.add_edge((r, c), (r, c + 1), weight = rng.randint(0, max_weight))
+            g.add_edge((r, c), ((r + 1) % rows, c), weight = rng.randint(0, max_weight))
+            g.add_edge((r, c), ((r - 1) % rows, c), weight = rng.randint(0, max_weight))
+
+    return g, 0
+
+def random_instance(nodes, arcs, max_weight = 100, rng = random):
+    ''' Generates a strongly connected graph (a Hamiltonian cycle plus random arcs), with random
+        non-negative weights. Returns the graph and a source node.
+    '''
+    g = nx.MultiDiGraph()
+    for v in range(nodes):
+        g.add_edge(v, (v + 1) % nodes, weight = rng.randint(0, max_weight))
+    for _ in range(arcs - nodes):
+        g.add_edge(rng.randrange(nodes), rng.randrange(nodes), weight = rng.randint(0, max_weight))
 
-        distances, scans = shortest_paths(g, root)
-        print("Scans per vertex: {:.2f}".format(scans / g.number_of_nodes()))
+    return g, 0
+
+class _CountingGraph(nx.MultiDiGraph):
+    ''' Counts the calls of out_edges, i.e. the node visits and scans of graphs.longest_distances '''
+    scans = 0
+
+    @property
+    def out_edges(self):
+        view = nx.reportviews.OutMultiEdgeView(self)
+        def counted(*args, **kwargs):
+            self.scans += 1
+            return view(*args, **kwargs)
+        return counted
+
+def benchmark(instances, out = sys.stdout):
+    ''' Compares shortest_paths and longest_paths with graphs.shortest_distances and graphs.longest_distances.
+        For every (name, graph, root) instance, prints the visits and scans per node, and the wall time.
+        The longest paths are computed on the negated weights, so that the graphs have no positive cycles.
+    '''
+    print("{:<24} {:<10} {:>12} {:>12} {:>12} {:>12}".format(
+        "instance", "problem", "scans/node", "graphs", "seconds", "graphs"), file = out)
+    for name, g, root in instances:
+        negated = nx.MultiDiGraph()
+        negated.add_nodes_from(g)
+        negated.add_edges_from((u, v, key, {'weight' : -w}) for u, v, key, w in g.edges(keys = True, data = 'weight'))
+
+        for problem, h, policy, reference in [('shortest', g, shortest_paths, shortest_distances),
+                                              ('longest', negated, longest_paths, longest_distances)]:
+            start = time.perf_counter()
+            _, distances, scans = policy(h, root)
+            elapsed = time.perf_counter() - start
+
+            counting = _CountingGraph(h)
+            start = time.perf_counter()
+            _, expected = reference(counting, root)
+            reference_elapsed = time.perf_counter() - start
+
+            assert distances == expected, "Distances differ on {}".format(name)
+            n = g.number_of_nodes()
+            print("{:<24} {:<10} {:>12.2f} {:>12.2f} {:>12.3f} {:>12.3f}".format(
+                name, problem, scans / n, counting.scans / n, elapsed, reference_elapsed), file = out)
+
+if __name__ == "__main__":
+    rng = random.Random(1)
+    instances = []
+    for filename in sys.argv[1:]:
+        g, root = load_dimacs(filename)
+        instances.append((filename, g, root if root is not None else 1))
 
+    if not instances:
+        for rows, columns in [(10, 100), (50, 200), (200, 50)]:
+            g, root = grid_instance(rows, columns, rng = rng)
+            instances.append(("grid {}x{}".format(rows, columns), g, root))
+        for nodes in [1000, 10000, 50000]:
+            g, root = random_instance(nodes, 4 * nodes, rng = rng)
+            instances.append(("random {}/{}".format(nodes, 4 * nodes), g, root))
 
+    benchmark(instances)
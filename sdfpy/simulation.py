@@ -1,10 +1,13 @@
 import heapq as hq
+from bisect import bisect_right
 import networkx as nx
 from fractions import Fraction
 import math
 
 import sdfpy.schedule as sched
 import sdfpy.core as core
+from sdfpy.compact import CompactSDFGraph
+from sdfpy.priorityq import IndexedPriorityQueue
 
 """ Simulates a self-timed execution of a CSDF graph.
 self-timed means that actors fire as soon as they are enabled.
@@ -81,12 +84,342 @@ def periodic_state( graph, time, admissible = True ):
 
     return core.SDFGraph( result )
 
+class EventQueue( object ):
+    """ The future actor finish events of a simulation: (finish time, actor, count) triples, which are popped
+    in increasing order, like the entries of a heap of tuples.
+
+    The events of every actor are kept in a heap of their own, and the actors in an indexed priority queue,
+    keyed by their earliest event, so that the queue is ordered over the actors rather than over all events.
+    """
+
+    __slots__ = ( '_handles', '_events', '_actors', '_size' )
+
+    def __init__( self, actors ):
+        self._handles = { v : i for i, v in enumerate( actors ) }
+        self._events = [ [] for _ in self._handles ]
+        self._actors = IndexedPriorityQueue( len( self._handles ))
+        self._size = 0
+
+    def __len__( self ):
+        return self._size
+
+    def __iter__( self ):
+        """ Yields all events, in no particular order """
+        for actor, handle in self._handles.items():
+            for finish_time, count in self._events[ handle ]:
+                yield finish_time, actor, count
+
+    def push( self, finish_time, actor, count ):
+        handle = self._handles[ actor ]
+        events = self._events[ handle ]
+        hq.heappush( events, (finish_time, count) )
+        self._actors[ handle ] = (events[ 0 ][ 0 ], actor)
+        self._size += 1
+
+    def peek( self ):
+        """ Returns the first event, without removing it """
+        handle, (finish_time, actor) = self._actors.peek()
+        return finish_time, actor, self._events[ handle ][ 0 ][ 1 ]
+
+    def pop( self ):
+        """ Returns and removes the first event """
+        handle, (finish_time, actor) = self._actors.peek()
+        events = self._events[ handle ]
+        _, count = hq.heappop( events )
+        if events:
+            self._actors[ handle ] = (events[ 0 ][ 0 ], actor)
+        else:
+            del self._actors[ handle ]
+
+        self._size -= 1
+        return finish_time, actor, count
+
+HASH_MASK = (1 << 64) - 1
+
+# the base of the hash of the active firings, and its inverse modulo 2^64
+HASH_BASE = 0x9E3779B97F4A7C15
+HASH_BASE_INVERSE = pow( HASH_BASE, -1, 1 << 64 )
+
+def _mix( x ):
+    """ The splitmix64 finaliser, which maps a 64-bit integer onto a pseudo-random 64-bit integer """
+    x = (x + 0x9E3779B97F4A7C15) & HASH_MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return x ^ (x >> 31)
+
+def _marking_hash( seed, tokens ):
+    """ The Zobrist hash of a channel with the given seed and number of tokens; empty channels are not hashed """
+    return _mix( seed ^ (tokens & HASH_MASK) ) if tokens > 0 else 0
+
+class SelfTimedSimulation( object ):
+    """ The state of a self-timed execution of a compiled SDF graph (see compact.CompactSDFGraph).
+
+    The state is kept in flat lists that are indexed by actor or channel id: the tokens on every channel, the current
+    production and consumption phase of every channel, as offsets into the shared rate tables of the compiled graph,
+    and the current execution time phase of every actor. Firing an actor updates these integers in place, and does
+    not allocate any rate or execution time vectors.
+
+    The simulation performs the same events as the simulation graph (see build_simulation_graph, start_self_timed and
+    finish_actor), in the same order, and state() returns the same states.
+
+    Snapshots of the marking are produced lazily: the simulation records which channels changed since the last
+    snapshot, so that marking() only updates those channels, and the work per event is proportional to the channels
+    of the actors that finish and start.
+
+    The simulation also maintains a 64-bit hash of its state (see state_hash), which is updated with every change of
+    the tokens and active firings. The marking is hashed by xor-ing a pseudo-random number per channel and number of
+    tokens. The active firings are hashed by the sum of count * z[ actor ] * B^finish_time modulo 2^64, which is
+    multiplied by B^-time to obtain a hash of the remaining times.
+    """
+
+    __slots__ = ( 'graph', 'time', 'queue', 'tokens', 'completed', 'latest', 'blocked', 'num_blocked',
+                  '_actors', '_ranks', '_by_rank', '_keys', '_src', '_dst', '_out', '_in',
+                  '_prod', '_prod_ptr', '_prod_psum', '_prod_phase',
+                  '_cons', '_cons_ptr', '_cons_psum', '_cons_phase',
+                  '_wcet', '_wcet_ptr', '_wcet_phase',
+                  '_channel_seeds', '_actor_seeds', '_marking_hash', '_events_hash',
+                  '_marking', '_changed', '_dirty' )
+
+    def __init__( self, cg ):
+        n, m = cg.number_of_actors(), cg.number_of_channels()
+        self.graph = cg
+        self.time = 0
+
+        # the events are ordered by actor name, as in the simulation graph
+        try:
+            by_rank = sorted( range( n ), key = lambda v : cg.actors[ v ] )
+        except TypeError:
+            by_rank = list( range( n ))
+        self._by_rank = by_rank
+        self._ranks = [ 0 ] * n
+        for r, v in enumerate( by_rank ):
+            self._ranks[ v ] = r
+        self.queue = EventQueue( range( n ))
+
+        self._actors = cg.actors
+        self._keys = [ cg.channel( c ) for c in range( m ) ]
+        self._src, self._dst = cg.src.tolist(), cg.dst.tolist()
+        out_ptr, out_channels = cg.out_ptr.tolist(), cg.out_channels.tolist()
+        in_ptr, in_channels = cg.in_ptr.tolist(), cg.in_channels.tolist()
+        self._out = [ out_channels[ out_ptr[ v ] : out_ptr[ v + 1 ]] for v in range( n ) ]
+        self._in = [ in_channels[ in_ptr[ v ] : in_ptr[ v + 1 ]] for v in range( n ) ]
+
+        # shared rate and execution time tables; the prefix sums of channel c start at position ptr[ c ] + c
+        self._prod, self._prod_ptr, self._prod_psum = cg.prod.tolist(), cg.prod_ptr.tolist(), cg.prod_psum.tolist()
+        self._cons, self._cons_ptr, self._cons_psum = cg.cons.tolist(), cg.cons_ptr.tolist(), cg.cons_psum.tolist()
+        self._wcet, self._wcet_ptr = cg.wcet.tolist(), cg.wcet_ptr.tolist()
+        self._prod_phase = [ 0 ] * m
+        self._cons_phase = [ 0 ] * m
+        self._wcet_phase = [ 0 ] * n
+
+        self.tokens = cg.tokens.tolist()
+        self._channel_seeds = [ _mix( 2 * c ) for c in range( m ) ]
+        self._actor_seeds = [ _mix( 2 * v + 1 ) for v in range( n ) ]
+        self._marking_hash = 0
+        for seed, tokens in zip( self._channel_seeds, self.tokens ):
+            self._marking_hash ^= _marking_hash( seed, tokens )
+        self._events_hash = 0
+
+        # the marking at the last snapshot, and the channels that changed since
+        self._marking = { key : tokens for key, tokens in zip( self._keys, self.tokens ) if tokens > 0 }
+        self._changed = list()
+        self._dirty = [ False ] * m
+
+        self.completed = [ 0 ] * n
+        self.latest = [ 0 ] * n
+        self.blocked = [ False ] * m
+        self.num_blocked = [ 0 ] * n
+        for c in range( m ):
+            if self.tokens[ c ] < self._cons[ self._cons_ptr[ c ]]:
+                self.blocked[ c ] = True
+                self.num_blocked[ self._dst[ c ]] += 1
+
+    def __rate_sum( self, c, phase, count, ptr, psum ):
+        """ Returns the sum of count rates of channel c, from the given phase on """
+        start = ptr[ c ]
+        n = ptr[ c + 1 ] - start
+        end = phase + count
+        base = start + c
+        return (end // n) * psum[ base + n ] + psum[ base + end % n ] - psum[ base + phase ]
+
+    def __add_tokens( self, c, delta ):
+        """ Adds delta tokens to channel c, and updates the hash of the marking """
+        seed, before = self._channel_seeds[ c ], self.tokens[ c ]
+        after = self.tokens[ c ] = before + delta
+        self._marking_hash ^= _marking_hash( seed, before ) ^ _marking_hash( seed, after )
+        if not self._dirty[ c ]:
+            self._dirty[ c ] = True
+            self._changed.append( c )
+
+    def __push( self, finish_time, v, count ):
+        """ Adds an event, and updates the hash of the active firings """
+        self.queue.push( finish_time, self._ranks[ v ], count )
+        self._events_hash = (self._events_hash + count * self._actor_seeds[ v ] * pow( HASH_BASE, finish_time, 1 << 64 )) & HASH_MASK
+
+    def __pop( self ):
+        """ Removes the first event, and updates the hash of the active firings """
+        finish_time, rank, count = self.queue.pop()
+        v = self._by_rank[ rank ]
+        self._events_hash = (self._events_hash - count * self._actor_seeds[ v ] * pow( HASH_BASE, finish_time, 1 << 64 )) & HASH_MASK
+        return finish_time, v, count
+
+    def state_hash( self ):
+        """ Returns a 64-bit hash of state(), which is equal for equal states, in constant time """
+        events = (self._events_hash * pow( HASH_BASE_INVERSE, self.time, 1 << 64 )) & HASH_MASK
+        return self._marking_hash ^ _mix( events )
+
+    def start_enabled( self ):
+        """ Starts the actors that are not blocked on any channel, as sse_states does """
+        for v in range( len( self._actors )):
+            if not self.num_blocked[ v ]:
+                self.start( v )
+
+    def start( self, v ):
+        """ Starts the enabled firings of actor v (see start_self_timed) """
+        tokens, blocked, cons, cons_ptr, cons_phase = self.tokens, self.blocked, self._cons, self._cons_ptr, self._cons_phase
+        time = self.time
+
+        enabled_firings = None
+        for c in self._in[ v ]:
+            i = count_enabled_firings( self._cons_psum, tokens[ c ], cons_phase[ c ], cons_ptr[ c ] + c, cons_ptr[ c + 1 ] - cons_ptr[ c ] )
+            enabled_firings = i if enabled_firings is None else min( i, enabled_firings )
+
+        num_blocked = 0
+        for c in self._in[ v ]:
+            start = cons_ptr[ c ]
+            n = cons_ptr[ c + 1 ] - start
+
+            # consume tokens and advance the consumption phase
+            self.__add_tokens( c, -self.__rate_sum( c, cons_phase[ c ], enabled_firings, cons_ptr, self._cons_psum ))
+            phase = cons_phase[ c ] = (cons_phase[ c ] + enabled_firings) % n
+
+            blocked[ c ] = tokens[ c ] < cons[ start + phase ]
+            num_blocked += blocked[ c ]
+        self.num_blocked[ v ] = num_blocked
+
+        # push the finish times, as parallel_finish_times does without building the dictionary of counts: the finish
+        # times of the consecutive firings are non-decreasing, so that equal finish times are adjacent
+        wcet, start = self._wcet, self._wcet_ptr[ v ]
+        n = self._wcet_ptr[ v + 1 ] - start
+        phase = self._wcet_phase[ v ]
+        first = max( 0, min( n, enabled_firings - 1 ))
+        remaining = max( 0, enabled_firings - first )
+
+        latest = self.latest[ v ]
+        min_wcet = latest - time
+        pending, count = None, 0
+        for i in range( first ):
+            min_wcet = max( wcet[ start + (phase + i) % n ], min_wcet )
+            if min_wcet != pending:
+                if count:
+                    latest = time + pending
+                    self.__push( latest, v, count )
+                pending, count = min_wcet, 0
+            count += 1
+
+        # all remaining firings complete at t = min_wcet
+        if remaining:
+            min_wcet = max( wcet[ start + (phase + enabled_firings - 1) % n ], min_wcet )
+            if min_wcet != pending:
+                if count:
+                    latest = time + pending
+                    self.__push( latest, v, count )
+                pending, count = min_wcet, 0
+            count += remaining
+
+        if count:
+            latest = time + pending
+            self.__push( latest, v, count )
+
+        self.latest[ v ] = latest
+        self._wcet_phase[ v ] = (phase + enabled_firings) % n
+
+    def finish( self, v, count ):
+        """ Finishes count firings of actor v (see finish_actor) """
+        tokens, blocked, num_blocked, dst = self.tokens, self.blocked, self.num_blocked, self._dst
+        prod_ptr, prod_phase, cons, cons_ptr, cons_phase = self._prod_ptr, self._prod_phase, self._cons, self._cons_ptr, self._cons_phase
+        for c in self._out[ v ]:
+            self.__add_tokens( c, self.__rate_sum( c, prod_phase[ c ], count, prod_ptr, self._prod_psum ))
+            prod_phase[ c ] = (prod_phase[ c ] + count) % (prod_ptr[ c + 1 ] - prod_ptr[ c ])
+
+            if blocked[ c ] and tokens[ c ] >= cons[ cons_ptr[ c ] + cons_phase[ c ]]:
+                # unblock
+                blocked[ c ] = False
+                w = dst[ c ]
+                num_blocked[ w ] -= 1
+                if not num_blocked[ w ]:
+                    self.start( w )
+
+        # update number of completed firings
+        self.completed[ v ] += count
+
+    def step( self ):
+        """ Finishes the firings that finish first, see step """
+        queue = self.queue
+        if not queue:
+            # no active firings -> deadlocked
+            return False
+
+        finish_time, v, count = self.__pop()
+        self.time = finish_time
+        self.finish( v, count )
+
+        # find more firings that finish at t
+        while queue:
+            t, _, _ = queue.peek()
+            if t > finish_time:
+                break
+
+            _, v, count = self.__pop()
+            self.finish( v, count )
+
+        return True
+
+    def completed_firings( self, actor ):
+        """ Returns the number of completed firings of the actor with the given name """
+        return self.completed[ self.graph.index[ actor ]]
+
+    def marking( self ):
+        """ Returns the marking as a dictionary from channel keys to the number of tokens on non-empty channels.
+        Only the channels that changed since the previous call are visited.
+        """
+        marking, keys, tokens, dirty = self._marking, self._keys, self.tokens, self._dirty
+        for c in self._changed:
+            dirty[ c ] = False
+            if tokens[ c ] > 0:
+                marking[ keys[ c ]] = tokens[ c ]
+            else:
+                marking.pop( keys[ c ], None )
+        self._changed = list()
+        return dict( marking )
+
+    def remaining_firings( self ):
+        """ Returns a dictionary that maps every active actor onto a dictionary from remaining times to counts """
+        remaining_firings = dict()
+        for finish_time, rank, count in self.queue:
+            actor = self._actors[ self._by_rank[ rank ]]
+            delta = finish_time - self.time
+            remaining = remaining_firings.setdefault( actor, dict() )
+            remaining[ delta ] = remaining.get( delta, 0 ) + count
+        return remaining_firings
+
+    def state( self ):
+        """ Returns the current time, the marking and the remaining times of the active firings, see state """
+        return self.time, self.marking(), self.remaining_firings()
+
 def build_simulation_graph( graph ):
     """ In the simulation graph, each actor has a list of active (parallel) firings,
     ordered by the time they finish.
-    In addition to this, the graph maintains a queue that contains future actor finish times.
+    In addition to this, the graph maintains a queue that contains future actor finish times (see EventQueue).
+
+    The simulation graph, with start_self_timed, finish_actor, state and step, is the reference implementation
+    that the tests compare SelfTimedSimulation against; sse_states always simulates a SelfTimedSimulation. A compiled
+    graph is simulated by a SelfTimedSimulation (see build_compact_simulation_graph).
     """
-    g = nx.MultiDiGraph( queue = list(), time = 0 )
+    if isinstance( graph, CompactSDFGraph ):
+        return build_compact_simulation_graph( graph )
+
+    g = nx.MultiDiGraph( queue = EventQueue( graph.nodes() ), time = 0 )
     for v, data in graph.nodes( data = True ):
         data = data.copy()
         num_phases = data[ 'phases' ]
@@ -107,6 +440,27 @@ def build_simulation_graph( graph ):
 
     return g
 
+def build_compact_simulation_graph( cg ):
+    """ Builds the array-based simulation of a compiled SDF graph (see SelfTimedSimulation), which takes the place of
+    the simulation graph """
+    return SelfTimedSimulation( cg )
+
+def count_enabled_firings( prefix_sums, tokens, phase = 0, start = 0, n = None ):
+    """ Returns the number of consecutive firings, from the given phase on, that the tokens suffice for, if the
+    firings consume the cyclic rates whose prefix sums are prefix_sums[ start ], ..., prefix_sums[ start + n ]
+    (by default, all of prefix_sums). Whole periods are counted by a division, the rest by a bisection.
+    """
+    if n is None:
+        n = len( prefix_sums ) - 1 - start
+
+    total = prefix_sums[ start + n ]
+    budget = tokens + prefix_sums[ start + phase ] - prefix_sums[ start ]
+    periods, rest = divmod( budget, total )
+
+    # the last phase within the period whose prefix sum does not exceed the rest
+    last = bisect_right( prefix_sums, prefix_sums[ start ] + rest, start, start + n ) - start - 1
+    return periods * n + last - phase
+
 def parallel_finish_times( min_wcet, wcets, numpar ):
     first = max(0, min( len( wcets ), numpar - 1 ))
     remaining = max(0, numpar - first)
@@ -124,6 +478,8 @@ def parallel_finish_times( min_wcet, wcets, numpar ):
     return counts
 
 def start_self_timed( graph, node ):
+    """ Starts the enabled firings of node in the simulation graph (reference implementation, see
+    build_simulation_graph) """
     queue = graph.graph['queue']
     time = graph.graph['time']
 
@@ -138,13 +494,7 @@ def start_self_timed( graph, node ):
 
     enabled_firings = None
     for u, v, key, data in graph.in_edges( node, keys = True, data = True ):
-        consumption = data['consumption']
-        tokens = data['tokens']
-        i = 0
-        while tokens >= consumption[ i ]:
-            tokens -= consumption[ i ]
-            i += 1
-
+        i = count_enabled_firings( data['consumption'].prefix_sums(), data['tokens'] )
         enabled_firings = i if enabled_firings is None else min( i, enabled_firings )
 
     for u, v, key, data in graph.in_edges( node, keys = True, data = True ):
@@ -169,7 +519,7 @@ def start_self_timed( graph, node ):
     # then all firings following the Pth firing will finish in parallel
     for wcet, count in parallel_finish_times( latest - time, wcets, enabled_firings ).items():
         latest = time + wcet
-        hq.heappush( queue, ( latest, node, count ))
+        queue.push( latest, node, count )
 
     # shift the wcet vector
     node_data.update(
@@ -177,6 +527,8 @@ def start_self_timed( graph, node ):
         wcet = wcets[enabled_firings:])
 
 def finish_actor( graph, node, count):
+    """ Finishes count firings of node in the simulation graph (reference implementation, see
+    build_simulation_graph) """
     node_data = graph.nodes[ node ]
 
     for v, w, key, data in graph.out_edges( node, keys = True, data = True ):
@@ -207,6 +559,21 @@ def compute_hash( marking, firings ):
     hash2 = hash( frozenset( { k : frozenset( v.items()) for k, v in firings.items() }.items()))
     return hash((hash1, hash2))
 
+def record_state( history, g, ref_iterations ):
+    """ Records the state of simulation g (see SelfTimedSimulation) after ref_iterations reference iterations.
+    The history maps state hashes onto lists of (time, reference iterations, marking, firings) tuples, so that states
+    are only compared in full if their hashes are equal.
+    Returns the (time, reference iterations) of an earlier recorded state that is equal, or None.
+    """
+    t, marking, firings = state( g )
+    matches = history.setdefault( g.state_hash(), list() )
+    for time, completed, m, f in matches:
+        if (m, f) == (marking, firings):
+            return time, completed
+
+    matches.append( (t, ref_iterations, marking, firings) )
+    return None
+
 def print_latex( graph, initial_marking = None, initial_firings = None, actors = list(), channels = list() ):
     # get the graph's repetition vector
     q = graph.repetition_vector()
@@ -257,26 +624,27 @@ def print_latex( graph, initial_marking = None, initial_firings = None, actors =
         t, marking, firings = state( g )
 
         print_state( t, marking, firings )
-        ref_iterations = g.nodes[ ref_actor ].get( 'completed_firings', 0 ) // q[ ref_actor ]
+        ref_iterations = g.completed_firings( ref_actor ) // q[ ref_actor ]
         if ref_iterations > completed_iterations:
-            h = compute_hash( marking, firings ) % 59
-            matches = history.get( h, None )
-            if matches is None:
-                matches = history[ h ] = list()
-
-            for time, completed, m, f in matches:
-                if (m, f) == (marking, firings):
-                    print("\\end{tabular}")
-                    print("\nsame states: t = {} and t = {}".format( t, time ))
-                    return Fraction( ref_iterations - completed, t - time )
-
-            matches.append( (t, ref_iterations, marking, firings) )
+            match = record_state( history, g, ref_iterations )
+            if match is not None:
+                time, completed = match
+                print("\\end{tabular}")
+                print("\nsame states: t = {} and t = {}".format( t, time ))
+                return Fraction( ref_iterations - completed, t - time )
 
         completed_iterations = ref_iterations
     else:
         raise Exception("Deadlock detected")
 
-def find_throughput( graph, ref_actor = None, initial_marking = None, initial_firings = None ):
+def find_throughput( graph, ref_actor = None, initial_marking = None, initial_firings = None, bounded_memory = False ):
+    """ Finds the throughput of a graph, in iterations per time unit, by running a self-timed execution until it
+    returns to a state that it was in after an earlier completed iteration of the reference actor.
+
+    By default, the states after all completed reference iterations are recorded (see record_state). With
+    bounded_memory, the recurrence is detected with Brent's algorithm instead, which keeps two states and two
+    simulations, at the cost of simulating the transient and one period about three times. The results are the same.
+    """
     # get the graph's repetition vector
     q = graph.repetition_vector()
 
@@ -284,68 +652,103 @@ def find_throughput( graph, ref_actor = None, initial_marking = None, initial_fi
     if ref_actor is None:
         ref_actor = next(iter(q.keys()))
 
-    # get the state space
-    state_space = sse_states( graph, initial_marking, initial_firings )
+    if bounded_memory:
+        (t, ref_iterations), (time, completed) = _brent_recurrence( graph, ref_actor, q[ ref_actor ], initial_marking, initial_firings )
+        print("same states: t = {} and t = {}, transient = {}".format( t, time, completed ))
+        return Fraction( ref_iterations - completed, t - time )
 
     # go over the state space and compare
     history = dict()
+    for g, ref_iterations in _reference_states( graph, ref_actor, q[ ref_actor ], initial_marking, initial_firings ):
+        match = record_state( history, g, ref_iterations )
+        if match is not None:
+            time, completed = match
+            print("same states: t = {} and t = {}, transient = {}".format( g.time, time, completed ))
+            return Fraction( ref_iterations - completed, g.time - time )
+
+def _reference_states( graph, ref_actor, q_ref, initial_marking = None, initial_firings = None ):
+    """ Runs a self-timed execution of graph, and yields the simulation, with the number of completed iterations of the
+    reference actor, whenever that number increases. Raises an exception if the execution deadlocks.
+    """
     completed_iterations = 0
-    for g in state_space:
-        t, marking, firings = state( g )
-        # print("t = {}: firings = {}, marking = {}".format( t, firings, marking ))
-        ref_iterations = g.nodes[ ref_actor ].get( 'completed_firings', 0 ) // q[ ref_actor ]
+    for g in sse_states( graph, initial_marking, initial_firings ):
+        ref_iterations = g.completed_firings( ref_actor ) // q_ref
         if ref_iterations > completed_iterations:
-            h = compute_hash( marking, firings ) % 59
-            matches = history.get( h, None )
-            if matches is None:
-                matches = history[ h ] = list()
+            yield g, ref_iterations
 
-            for time, completed, m, f in matches:
-                if (m, f) == (marking, firings):
-                    print("same states: t = {} and t = {}, transient = {}".format( t, time, completed ))
-                    return Fraction( ref_iterations - completed, t - time )
+        completed_iterations = ref_iterations
 
-            matches.append( (t, ref_iterations, marking, firings) )
+    raise Exception("Deadlock detected")
 
-        completed_iterations = ref_iterations
-    else:
-        raise Exception("Deadlock detected")
+def _snapshot( g, ref_iterations ):
+    """ Returns the (hash, time, reference iterations, marking, firings) of the state of simulation g """
+    return (g.state_hash(), ref_iterations) + state( g )
 
-def sse_states( graph, initial_marking = None, initial_firings = None ):
-    """ Runs a self-timed execution until a periodic phase is detected.
+def _same_state( g, snapshot ):
+    """ Tells whether simulation g is in the state of the snapshot (see _snapshot) """
+    if g.state_hash() != snapshot[ 0 ]:
+        return False
 
-    initial_state:  a tuple (m, fs) of a dictionary m, which represents the marking of the graph, and a dictionary fs of active firings.
+    _, marking, firings = state( g )
+    return (marking, firings) == snapshot[ 3: ]
+
+def _brent_recurrence( graph, ref_actor, q_ref, initial_marking = None, initial_firings = None ):
+    """ Finds the first state after a completed reference iteration that recurs, with Brent's cycle detection
+    algorithm on the sequence of these states. Returns the (time, reference iterations) of its first recurrence
+    and of the state itself.
     """
-    if initial_marking is None:
-        # start with the initial marking
-        marking = dict()
-        for u, v, key, data in graph.edges( keys = True, data = True ):
-            marking[ (u, v, key) ] = data.get('tokens')
-    else:
-        # copy the marking
-        marking = initial_marking.copy()
+    states = _reference_states( graph, ref_actor, q_ref, initial_marking, initial_firings )
+
+    # find the length of the period: the distance to a recurrence of the state at the last power of two
+    g, ref_iterations = next( states )
+    tortoise = _snapshot( g, ref_iterations )
+    power = length = 1
+    for g, ref_iterations in states:
+        if _same_state( g, tortoise ):
+            break
 
-    if initial_firings is None:
-        # no active firings
-        firings = dict()
-    else:
-        # copy the initial_firings
-        firings = initial_firings.copy()
+        if power == length:
+            tortoise = _snapshot( g, ref_iterations )
+            power *= 2
+            length = 0
+        length += 1
+
+    # find the first state that recurs, by running a second execution that is length states ahead
+    lead = _reference_states( graph, ref_actor, q_ref, initial_marking, initial_firings )
+    trail = _reference_states( graph, ref_actor, q_ref, initial_marking, initial_firings )
+    for _ in range( length ):
+        next( lead )
+
+    for (g, ref_iterations), (h, completed) in zip( lead, trail ):
+        if g.state_hash() == h.state_hash() and state( g )[ 1: ] == state( h )[ 1: ]:
+            return (g.time, ref_iterations), (h.time, completed)
+
+def sse_states( graph, initial_marking = None, initial_firings = None ):
+    """ Runs a self-timed execution of graph from its initial marking, and returns an iterator over the states of the
+    simulation (see SelfTimedSimulation) after every event.
+
+    Starting from a different marking or from active firings is not supported: a ValueError is raised if
+    initial_marking or initial_firings is given.
+    """
+    if initial_marking is not None or initial_firings is not None:
+        raise ValueError("Self-timed executions from an initial marking or initial firings are not supported")
 
     # build internal data structure used for simulation
-    g = build_simulation_graph( graph )
-    # start enabled actors
-    for v, data in g.nodes( data = True ):
-        blocked_on = data['blocked_on']
-        if not blocked_on:
-            # enable 
-            start_self_timed( g, v )
-    
+    g = build_compact_simulation_graph( graph if isinstance( graph, CompactSDFGraph ) else CompactSDFGraph( graph ))
+    return _simulate( g )
+
+def _simulate( g ):
+    """ Starts the enabled actors of simulation g, and yields g after every event until it deadlocks """
+    g.start_enabled()
+
     yield g
-    while step( g ):
+    while g.step():
         yield g
 
 def state( graph ):
+    if isinstance( graph, SelfTimedSimulation ):
+        return graph.state()
+
     # get remaining times for active firings
     remaining_firings = dict()
 
@@ -366,12 +769,15 @@ def state( graph ):
     return current_time, marking, remaining_firings
     
 def step( graph ):
+    if isinstance( graph, SelfTimedSimulation ):
+        return graph.step()
+
     queue = graph.graph['queue']
     if not queue:
         # no active firings -> deadlocked
         return False
 
-    finish_time, actor, count = hq.heappop( queue )
+    finish_time, actor, count = queue.pop()
     t = finish_time
     graph.graph.update( time = finish_time )
 
@@ -381,19 +787,14 @@ def step( graph ):
 
     # find more firings that finish at t
     while queue:
-        finish_time, actor, count = queue[ 0 ]
+        finish_time, actor, count = queue.peek()
         if finish_time > t:
             break
 
-        hq.heappop( queue )
+        queue.pop()
         # print("  Finshing {} firings of actor {}".format( count, actor ))
         finish_actor( graph, actor, count )
 
-    marking = dict()
-    for u, v, key, data in graph.edges( keys = True, data = True ):
-        if data.get('tokens', 0) > 0:
-            marking[ (u, v, key) ] = data['tokens']
-
     return True
 
 
@@ -1,9 +1,14 @@
 import networkx as nx
+import numpy as np
 import sdfpy.core as core
 import sdfpy.mcr as mcr
 import uuid
+import os
 
-from sdfpy.core import Cyclic, predecessor
+from sdfpy.core import Cyclic, predecessor, predecessors
+from sdfpy.compact import CompactSDFGraph, CompactMarkedGraph, Firings, MARKED_GRAPH_ARRAYS, write_marked_graph_header
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from fractions import Fraction
 from math import gcd
 from sdfpy.integers import xgcd, lcm
@@ -60,91 +65,161 @@ def predecessor_lin_bounds( **kwargs ):
 
     return maxval, minval + g - avg_prate
 
+def _memoized_samples( sample, vector, period, sign ):
+    """ Memoizes sample_prates (sign 1) or sample_crates (sign -1) for a vector and a period.
+    The sampled pattern of an offset only depends on the offset modulo the length of the vector, whereas the
+    token delta changes by sign * vector.sum() per period of the vector. Returns a function of the offset.
+    """
+    n, total = len( vector ), vector.sum()
+    patterns = dict()
+    def sampled( offset ):
+        r = offset % n
+        if r not in patterns:
+            patterns[ r ] = sample( vector, r, period )
+        tokens, pattern = patterns[ r ]
+        return tokens + sign * (offset // n) * total, pattern
+    return sampled
+
+def _unfolded_sources( prates, crates, tokens, Tv, Tw ):
+    """ Determines which copies of the producer of a channel are connected to which copies of its consumer, if they
+    are unfolded Tv and Tw times. Returns a boolean Tw x Tv array, whose entry (j, i) is True if copy i has a channel
+    to copy j (0-based). See Algorithm ? in PhD thesis.
+    """
+    plen, clen = len( prates ), len( crates )
+
+    # consuming actor in unfolded graph has a single phase
+    # and consumption rate equal to periods_w * crates.sum()
+    csum = crates.sum() * Tw // gcd( Tw, clen )
+
+    # sum of production rates in multi-rate equivalent of unfolded graph
+    psum = prates.sum() * Tv // gcd( Tv, plen )
+
+    gm = gcd( csum, psum )
+    gvw = gcd( csum, prates.sum() )
+
+    # multiplicative inverse of (psum // gvw) modulo (gm // gvw)
+    g_cd, mulinv, _ = xgcd( prates.sum() // gvw, gm // gvw )
+    assert g_cd == 1
+
+    # the copies are connected by residue modulo the modulus: the solutions sol_min <= sol < sol_max for producing
+    # phase i0 and consuming firing j + 1 + n0 * Tw select the residues (i0 + sol * step) % modulus
+    modulus = gcd( Tv, plen * gm // gvw )
+    step = mulinv * plen % modulus
+    cycle = modulus // gcd( step, modulus )
+
+    # the differences between the tokens produced and consumed, for every j, n0 and i0
+    stop = np.arange( Tw )[ :, None ] + 1 + np.arange( clen // gcd( clen, Tw ))[ None, : ] * Tw
+    consumed = (stop // clen) * crates.sum() + np.asarray( crates.prefix_sums() )[ stop % clen ]
+    produced = np.asarray( prates.prefix_sums() )
+    sol_min = (gvw - (tokens + produced[ 1: ] - consumed[ :, :, None ]) - 1) // gvw
+    sol_max = (gvw - (tokens + produced[ :-1 ] - consumed[ :, :, None ]) - 1) // gvw
+
+    # the residues repeat after cycle solutions, so that at most cycle solutions are enumerated per (j, n0, i0)
+    counts = np.minimum( sol_max - sol_min, cycle ).ravel()
+    rows = np.repeat( np.arange( counts.size ), counts )
+    sols = sol_min.ravel()[ rows ] + np.arange( rows.size ) - np.repeat( np.cumsum( counts ) - counts, counts )
+    residues = (rows % plen + (sols % modulus) * step) % modulus
+
+    connected = np.zeros( (Tw, modulus), dtype = bool )
+    connected[ rows // (sol_min.size // Tw), residues ] = True
+    return connected[ :, np.arange( Tv ) % modulus ]
+
+def _unfolded_channels( channels, periods ):
+    """ Generates the channels of an unfolded graph (see unfold), from the (v, w, data) triples of the channels of
+    the original graph. Yields (v, i, w, j, production, consumption, tokens, data) tuples, where i and j are the
+    0-based copies of v and w.
+    """
+    for v, w, data in channels:
+        Tv = periods.get( v, 1 )
+        Tw = periods.get( w, 1 )
+        prates = Cyclic( data.get( 'production', core.Cyclic( 1 )))
+        crates = Cyclic( data.get( 'consumption', core.Cyclic( 1 )))
+        tokens = data.get( 'tokens', 0 )
+
+        sources = _unfolded_sources( prates, crates, tokens, Tv, Tw )
+        sample_p = _memoized_samples( sample_prates, prates, Tv, 1 )
+        sample_c = _memoized_samples( sample_crates, crates, Tw, -1 )
+        for j in range( Tw ):
+            # compute consumption rates for incoming channels
+            tokens_c, incoming_crates = sample_c( j )
+            for i in np.flatnonzero( sources[ j ] ).tolist():
+                tokens_p, incoming_prates = sample_p( i )
+                yield v, i, w, j, incoming_prates, incoming_crates, tokens + tokens_c + tokens_p, data
+
 def unfold( sdfg, dct = None, **periods ):
+    """ Unfolds every actor v of an SDF graph periods[ v ] times (default 1): copy i of v, named (v, i) for
+    i = 1, ..., periods[ v ], performs firings i, i + periods[ v ], ... of v.
+    The channels between the copies are determined by residue arithmetic (see _unfolded_sources). The result is an
+    SDF graph; compact_unfold computes the same graph as a compact.CompactSDFGraph.
+    """
     if dct is not None:
         periods.update( dct )
 
     result = nx.MultiDiGraph()
-    for v, data in sdfg.nodes_iter( data = True ):
+    for v, data in sdfg.nodes( data = True ):
         Tv = periods.get(v, 1)
         for i in range(Tv):
             result.add_node( (v, i + 1) if Tv > 1 else v, wcet = data.get('wcet', core.Cyclic(0))[i::Tv])
 
-    for v, w, data in sdfg.edges_iter( data = True ):
-        Tv = periods.get(v, 1)
-        Tw = periods.get(w, 1)
-        prates = data.get('production', core.Cyclic(1))
-        crates = data.get('consumption', core.Cyclic(1))
-        tokens = data.get('tokens', 0)
-        plen = len(prates)
+    for v, i, w, j, production, consumption, tokens, data in _unfolded_channels( sdfg.edges( data = True ), periods ):
+        extra_data = dict()
+        if 'var' in data:
+            extra_data['var'] = data['var']
 
-        # consuming actor in unfolded graph has a single phase
-        # and consumption rate equal to periods_w * crates.sum()
-        csum = crates.sum() * Tw // gcd(Tw, len( crates ))
+        # add channel
+        vi = (v, i + 1) if periods.get( v, 1 ) > 1 else v
+        wj = (w, j + 1) if periods.get( w, 1 ) > 1 else w
+        result.add_edge( vi, wj,
+            production = production,
+            consumption = consumption,
+            tokens = tokens,
+            **extra_data)
 
-        # sum of production rates in multi-rate equivalent of unfolded graph
-        psum = prates.sum() * Tv // gcd(Tv, len( prates ))
-
-        gm = gcd( csum, psum )
-        gvw = gcd( csum, prates.sum() )
-
-        # multiplicative inverse of (psum // gvw) modulo (gm // gvw)
-        g_cd, mulinv, _ = xgcd( prates.sum() // gvw, gm // gvw )
-        assert g_cd == 1
-
-        # iterate consuming actors
-        for j in range(Tw):
-            # determine which incoming channels must be added
-            incoming = set()
-
-            # see Algorithm ? in PhD thesis
-            sols = set()
-            for n0 in range( len( crates ) // gcd( len( crates ), Tw )):
-                for i0 in range( plen ):
-                    delta_i_n = tokens + prates.sum(stop = i0 + 1) - crates.sum(stop = j + 1 + n0 * Tw )
-                    delta_i1_n = tokens + prates.sum(stop = i0) - crates.sum(stop = j + 1 + n0 * Tw )
-                    sol_min = (gvw - delta_i_n - 1) // gvw
-                    sol_max = (gvw - delta_i1_n - 1) // gvw
-
-                    for sol in range(sol_min, sol_max):
-                        s = (i0 + sol * mulinv * plen) % gcd(Tv, plen * gm // gvw)
-                        sols.add( s )
-
-            for i_residue in sols:
-                for i0 in range(i_residue, Tv, gcd(Tv, plen * gm // gvw)):
-                    incoming.add( i0 )
+    return core.SDFGraph( result )
 
-            # compute consumption rates for incoming channels
-            tokens_c, incoming_crates = sample_crates( crates, j, Tw )
-
-            # add incoming channels:
-            for i in incoming:
-                # compute production rates
-                tokens_p, incoming_prates = sample_prates( prates, i, Tv )
-
-                extra_data = dict()
-                if 'var' in data:
-                    extra_data['var'] = data['var']
-
-                # add channel
-                vi = (v, i + 1) if Tv > 1 else v
-                wj = (w, j + 1) if Tw > 1 else w
-                result.add_edge( vi, wj,
-                    production = incoming_prates,
-                    consumption = incoming_crates,
-                    tokens = tokens + tokens_c + tokens_p,
-                    **extra_data)
+def compact_unfold( sdfg, dct = None, **periods ):
+    """ Computes the unfolded graph of an SDF graph (or a compiled one), as unfold does, but writes it straight to a
+    compact.CompactSDFGraph, without building and validating an SDF graph. The actors and channels are numbered as if
+    the result of unfold were compiled.
+    """
+    if dct is not None:
+        periods.update( dct )
 
-    return core.SDFGraph( result )
+    if isinstance( sdfg, CompactSDFGraph ):
+        cg = sdfg
+        actors = [ (v, cg.wcets( a )) for a, v in enumerate( cg.actors ) ]
+        channels = [ (cg.actors[ v ], cg.actors[ w ], dict( production = cg.production( c ), consumption = cg.consumption( c ), tokens = t ))
+            for c, (v, w, t) in enumerate( zip( cg.src.tolist(), cg.dst.tolist(), cg.tokens.tolist() )) ]
+    else:
+        actors = [ (v, Cyclic( data.get( 'wcet', core.Cyclic( 0 )))) for v, data in sdfg.nodes( data = True ) ]
+        channels = sdfg.edges( data = True )
+
+    names, wcets, first = [], [], dict()
+    for v, wcet in actors:
+        Tv = periods.get( v, 1 )
+        first[ v ] = len( names )
+        for i in range( Tv ):
+            names.append( (v, i + 1) if Tv > 1 else v )
+            wcets.append( wcet[ i::Tv ] )
+
+    # order the channels as the edges of the unfolded graph: by source, then by destination in order of appearance
+    unfolded = [ (first[ v ] + i, first[ w ] + j, production, consumption, tokens)
+        for v, i, w, j, production, consumption, tokens, _ in _unfolded_channels( channels, periods ) ]
+    rank = dict()
+    for v, w, *_ in unfolded:
+        rank.setdefault( (v, w), len( rank ))
+    unfolded.sort( key = lambda channel : (channel[ 0 ], rank[ channel[ 0 ], channel[ 1 ]] ))
+
+    return CompactSDFGraph.from_channels( names, wcets, unfolded )
 
 def multi_rate_equivalent( sdfg ):
     result = nx.MultiDiGraph()
-    for v, data in sdfg.nodes_iter( data = True ):
+    for v, data in sdfg.nodes( data = True ):
         phi = data.get('phases', 1)
         for i in range(phi):
             result.add_node((v, i + 1), wcet = data.get('wcet', core.Cyclic(0))[i])
 
-    for v, w, data in sdfg.edges_iter( data = True ):
+    for v, w, data in sdfg.edges( data = True ):
         Tv = sdfg.nodes[v].get('phases', 1)
         Tw = sdfg.nodes[w].get('phases', 1)
         prates = data.get('production')
@@ -188,6 +263,9 @@ def multi_rate_equivalent( sdfg ):
     return core.SDFGraph( result )
 
 def single_rate_equivalent( sdfg ):
+    if isinstance( sdfg, CompactSDFGraph ):
+        return compact_single_rate_equivalent( sdfg )
+
     hsdfg = nx.MultiDiGraph() if sdfg.is_multigraph() else nx.DiGraph()
     multi = nx.MultiDiGraph( sdfg )
     q = sdfg.repetition_vector()
@@ -198,20 +276,164 @@ def single_rate_equivalent( sdfg ):
         for i in range(q[v]):
             hsdfg.add_node( (v, i + 1), wcet = wcets[i % len(wcets)] )
 
+        firings = np.arange(1, q[v] + 1)
         for u, _, key, data in multi.in_edges( v, data = True, keys = True ):
-            prates = data.get('production')
-            crates = data.get('consumption')
-            tokens = data.get('tokens')
+            preds = predecessors(firings, **data)
+            sources = ((preds - 1) % q[u] + 1).tolist()
+            tokens = ((q[u] - preds) // q[u]).tolist()
             for j in range(q[v]):
-                i = predecessor(j + 1, **data)
                 if sdfg.is_multigraph():
-                    hsdfg.add_edge( (u, (i - 1) % q[u] + 1), (v, j + 1), key = key, tokens = (q[u] - i) // q[u] )
+                    hsdfg.add_edge( (u, sources[j]), (v, j + 1), key = key, tokens = tokens[j] )
                 else:
-                    hsdfg.add_edge( (u, (i - 1) % q[u] + 1), (v, j + 1), tokens = (q[u] - i) // q[u] )
+                    hsdfg.add_edge( (u, sources[j]), (v, j + 1), tokens = tokens[j] )
 
     assert hsdfg.number_of_nodes() == sum(q.values()), "Size of HSDF graph must be equal to sum of repetition vector"
     return hsdfg
 
+def compact_single_rate_equivalent( cg ):
+    """ Computes the single-rate equivalent of a compiled SDF graph (see compact.CompactSDFGraph).
+    The result is identical to that of single_rate_equivalent on the original SDF graph.
+    """
+    hsdfg = nx.MultiDiGraph()
+    q = cg.q.tolist()
+    for v, name in enumerate( cg.actors ):
+        wcets = cg.wcets( v )
+        for i in range( q[ v ] ):
+            hsdfg.add_node( (name, i + 1), wcet = wcets[ i ] )
+
+        firings = np.arange( 1, q[ v ] + 1 )
+        for c in cg.in_edges( v ).tolist():
+            u = int( cg.src[ c ] )
+            u_name, key, q_u = cg.actors[ u ], cg.keys[ c ], q[ u ]
+            preds = cg.predecessors( c, firings )
+            sources = ((preds - 1) % q_u + 1).tolist()
+            tokens = ((q_u - preds) // q_u).tolist()
+            for j in range( q[ v ] ):
+                hsdfg.add_edge( (u_name, sources[ j ]), (name, j + 1), key = key, tokens = tokens[ j ] )
+
+    return hsdfg
+
+def single_rate_channels( sdfg, processes = 1 ):
+    """ Generates the edges of the single-rate equivalent of an SDF graph (or a compiled one, see
+    compact.CompactSDFGraph) channel by channel, without building the single-rate equivalent as a graph.
+    Firings are numbered as in compact.Firings. For every channel c, yields the tuple (c, sources, targets, tokens)
+    of arrays that hold an edge per firing of the consumer of c, as in single_rate_equivalent.
+
+    The channels are independent. If processes is larger than one (or None, for one process per CPU), they are
+    expanded in a pool of worker processes, each of which receives a picklable description of its channels.
+    The channels are yielded in the same order either way.
+    """
+    cg = sdfg if isinstance( sdfg, CompactSDFGraph ) else CompactSDFGraph( sdfg )
+    offsets = Firings( cg.actors, cg.q ).offsets
+    m = cg.number_of_channels()
+    descriptions = ( _channel_description( cg, c, offsets ) for c in range( m ))
+
+    if processes == 1 or m <= 1:
+        for c, description in enumerate( descriptions ):
+            yield (c, *_expand_channel( description ))
+        return
+
+    workers = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor( max_workers = workers ) as pool:
+        chunksize = max( 1, m // (4 * workers) )
+        for c, edges in enumerate( pool.map( _expand_channel, descriptions, chunksize = chunksize )):
+            yield (c, *edges)
+
+def _channel_description( cg, c, offsets ):
+    """ Describes channel c of a compiled graph by the plain values that are needed to expand it """
+    u, v = int( cg.src[ c ] ), int( cg.dst[ c ] )
+    return ( cg.prod[ cg.prod_ptr[ c ] : cg.prod_ptr[ c + 1 ]].tolist(), cg.cons[ cg.cons_ptr[ c ] : cg.cons_ptr[ c + 1 ]].tolist(),
+             int( cg.tokens[ c ] ), int( cg.q[ u ] ), int( offsets[ u ] ), int( cg.q[ v ] ), int( offsets[ v ] ))
+
+def _expand_channel( description ):
+    """ Computes the sources, targets and tokens of the single-rate edges of a channel (see _channel_description) """
+    production, consumption, tokens, q_u, offset_u, q_v, offset_v = description
+    preds = predecessors( np.arange( 1, q_v + 1 ), production = production, consumption = consumption, tokens = tokens )
+    sources = (preds - 1) % q_u + offset_u
+    targets = np.arange( offset_v, offset_v + q_v, dtype = np.int64 )
+    return sources, targets, (q_u - preds) // q_u
+
+def compact_single_rate_marked_graph( sdfg, relate_start_times = True, directory = None, processes = 1 ):
+    """ Computes the marked graph of the single-rate equivalent of an SDF graph, as the composition of
+    single_rate_as_marked_graph and single_rate_equivalent does, but as a compact.CompactMarkedGraph.
+    The edges are expanded channel by channel (see single_rate_channels) into preallocated arrays,
+    without building the single-rate equivalent as a networkx graph. The nodes are the compact.Firings of
+    the graph, and edges are keyed by their index.
+
+    If a directory is given, the arrays are written straight to .npy files in that directory (see
+    compact.CompactMarkedGraph.save), and the result is loaded from there with memory-mapped arrays.
+    The channels are then expanded twice: once to count the outgoing edges of every firing, and once to write
+    every edge at its position in CSR order. Apart from the files, memory use is linear in the number of
+    firings and in the number of edges of a single channel.
+
+    The channels are expanded in a pool of worker processes if processes is larger than one (see single_rate_channels).
+    """
+    cg = sdfg if isinstance( sdfg, CompactSDFGraph ) else CompactSDFGraph( sdfg )
+    q = cg.q
+    firings = Firings( cg.actors, q )
+
+    # the execution time of every firing
+    wcets = np.empty( len( firings ), dtype = np.int64 )
+    for v in range( cg.number_of_actors() ):
+        wcet = cg.wcet[ cg.wcet_ptr[ v ] : cg.wcet_ptr[ v + 1 ]]
+        wcets[ firings.offsets[ v ] : firings.offsets[ v + 1 ]] = np.resize( wcet, q[ v ] )
+
+    # every channel has an edge per firing of its consumer
+    ends = np.cumsum( q[ cg.dst ] )
+    m = int( ends[ -1 ] ) if len( ends ) else 0
+
+    if directory is not None:
+        return _write_single_rate_marked_graph( cg, firings, wcets, m, relate_start_times, directory, processes )
+
+    source = np.empty( m, dtype = np.int64 )
+    target, tokens = np.empty_like( source ), np.empty_like( source )
+    for c, sources, targets, toks in single_rate_channels( cg, processes ):
+        start = ends[ c ] - len( targets )
+        source[ start : ends[ c ]] = sources
+        target[ start : ends[ c ]] = targets
+        tokens[ start : ends[ c ]] = toks
+
+    weight = wcets[ source ] if relate_start_times else wcets[ target ]
+    return CompactMarkedGraph( firings, source, target, weight, tokens )
+
+def _write_single_rate_marked_graph( cg, firings, wcets, m, relate_start_times, directory, processes ):
+    """ Writes the single-rate marked graph to disk, see compact_single_rate_marked_graph """
+    n = len( firings )
+    os.makedirs( directory, exist_ok = True )
+
+    # count the outgoing edges of every firing
+    offsets = np.zeros( n + 1, dtype = np.int64 )
+    for _, sources, _, _ in single_rate_channels( cg, processes ):
+        np.add.at( offsets, sources + 1, 1 )
+    np.cumsum( offsets, out = offsets )
+
+    arrays = dict( offsets = offsets )
+    for name in MARKED_GRAPH_ARRAYS[ 1: ]:
+        arrays[ name ] = np.lib.format.open_memmap( os.path.join( directory, name + '.npy' ), mode = 'w+', dtype = np.int64, shape = (m,) )
+
+    # write the edges of every channel after the edges that were written before for the same firing, such that
+    # the edges are in the same order as in the arrays that CompactMarkedGraph sorts by source
+    fill = offsets[ :-1 ].copy()
+    for _, sources, targets, toks in single_rate_channels( cg, processes ):
+        order = np.argsort( sources, kind = 'stable' )
+        sources, targets, toks = sources[ order ], targets[ order ], toks[ order ]
+        first = np.searchsorted( sources, sources, side = 'left' )
+        positions = fill[ sources ] + np.arange( len( sources )) - first
+        np.add.at( fill, sources, 1 )
+
+        arrays[ 'source' ][ positions ] = sources
+        arrays[ 'target' ][ positions ] = targets
+        arrays[ 'tokens' ][ positions ] = toks
+        arrays[ 'weight' ][ positions ] = wcets[ sources ] if relate_start_times else wcets[ targets ]
+
+    np.save( os.path.join( directory, 'offsets.npy' ), offsets )
+    for name in MARKED_GRAPH_ARRAYS[ 1: ]:
+        arrays[ name ].flush()
+    del arrays
+    write_marked_graph_header( directory, firings )
+
+    return CompactMarkedGraph.load( directory )
+
 def single_rate_apx( sdfg, is_pessimistic = True ):
     s = sdfg.normalisation_vector()
     hsdfg = nx.MultiDiGraph()
@@ -271,6 +493,139 @@ def single_rate_as_marked_graph( hsdfg, relate_start_times = True ):
 
     return mg 
 
+def reduce_marked_graph( mg ):
+    """ Reduces a marked graph (see single_rate_as_marked_graph) to a smaller marked graph with the same maximum
+    cycle ratio, assuming that the weights and tokens are non-negative. The following reductions are repeated until
+    none applies:
+        - a parallel edge is removed if another edge between the same nodes has at least its weight and at most
+          its tokens (but not zero tokens, unless it has none either), since every cycle through it has at most the
+          ratio of the cycle through the other edge;
+        - a node that has a single incoming (or a single outgoing) edge and no self-loop is contracted: every pair of
+          incoming and outgoing edges is replaced by an edge with their total weight and tokens. Chains of firings
+          without execution time are thereby contracted into single edges;
+        - a node without incoming or outgoing edges is removed, since it is not on any cycle.
+
+    The result is a multigraph, each edge of which has a 'path' attribute that holds the edges of mg that it replaces.
+    A critical cycle of the result is mapped onto a critical cycle of mg with expand_cycle.
+    """
+    h = nx.MultiDiGraph()
+    h.add_nodes_from( mg )
+    if mg.is_multigraph():
+        edges = ( ((v, w, key), data) for v, w, key, data in mg.edges( keys = True, data = True ))
+    else:
+        edges = ( ((v, w), data) for v, w, data in mg.edges( data = True ))
+
+    for edge, data in edges:
+        h.add_edge( edge[ 0 ], edge[ 1 ], weight = data.get( 'weight', 0 ), tokens = data.get( 'tokens', 0 ), path = (edge,) )
+
+    for v, w in list( h.edges() ):
+        _remove_dominated_edges( h, v, w )
+
+    queue = deque( h.nodes() )
+    queued = set( queue )
+    while queue:
+        v = queue.popleft()
+        queued.discard( v )
+        if v not in h:
+            continue
+
+        # follow the chain of nodes that have a single edge in the same direction as v, and contract it from its far
+        # end, so that the other edges of the chain are moved once instead of along the whole chain
+        adjacency = _contraction( h, v )
+        if adjacency is None:
+            continue
+
+        chain = [ v ]
+        on_chain = { v }
+        while adjacency[ chain[ -1 ]]:
+            u = next( iter( adjacency[ chain[ -1 ]] ))
+            if u in on_chain or _contraction( h, u ) is not adjacency:
+                break
+            chain.append( u )
+            on_chain.add( u )
+
+        for u in reversed( chain ):
+            if _contraction( h, u ) is None:
+                continue
+
+            in_edges = list( h.in_edges( u, data = True ))
+            out_edges = list( h.out_edges( u, data = True ))
+            h.remove_node( u )
+            for p, _, in_data in in_edges:
+                for _, w, out_data in out_edges:
+                    h.add_edge( p, w, weight = in_data[ 'weight' ] + out_data[ 'weight' ], tokens = in_data[ 'tokens' ] + out_data[ 'tokens' ],
+                        path = in_data[ 'path' ] + out_data[ 'path' ] )
+                    _remove_dominated_edges( h, p, w )
+
+            # the neighbours of u may be contracted now
+            for w in [ p for p, _, _ in in_edges ] + [ w for _, w, _ in out_edges ]:
+                if w not in queued:
+                    queued.add( w )
+                    queue.append( w )
+
+    return h
+
+def _contraction( h, v ):
+    """ Returns the successors (or else the predecessors) of node v in the multigraph h if v has a single outgoing
+    (incoming) edge and no self-loop, or None if v can't be contracted (see reduce_marked_graph) """
+    if v in h.succ[ v ]:
+        return None
+    elif _degree( h.succ[ v ] ) <= 1:
+        return h.succ
+    elif _degree( h.pred[ v ] ) <= 1:
+        return h.pred
+    return None
+
+def _degree( adjacency ):
+    """ Returns the number of edges in the adjacency of a node of a multigraph, or 2 if there are more """
+    if len( adjacency ) > 1:
+        return 2
+    return min( 2, sum( len( keys ) for keys in adjacency.values() ))
+
+def _remove_dominated_edges( h, v, w ):
+    """ Removes the edges from v to w in the multigraph h that are dominated by another edge (see reduce_marked_graph).
+    The edges are sorted by increasing tokens and decreasing weight, and the edges that are heavier than all edges before
+    them are kept. Edges without tokens only dominate each other, since a cycle without tokens has no ratio.
+    """
+    edges = h.succ[ v ].get( w )
+    if edges is None or len( edges ) < 2:
+        return
+
+    heaviest = dict()
+    for tokens, weight, key in sorted( (data[ 'tokens' ], -data[ 'weight' ], key) for key, data in edges.items() ):
+        best = heaviest.get( tokens > 0 )
+        if best is not None and -weight <= best:
+            h.remove_edge( v, w, key )
+        else:
+            heaviest[ tokens > 0 ] = -weight
+
+def reduce_single_rate( hsdfg, relate_start_times = True ):
+    """ Reduces the marked graph of a single-rate graph, such as the result of single_rate_equivalent (see
+    single_rate_as_marked_graph and reduce_marked_graph) """
+    return reduce_marked_graph( single_rate_as_marked_graph( hsdfg, relate_start_times ))
+
+def expand_cycle( reduced, cycle ):
+    """ Maps a cycle of (v, w, key) edges of a reduced marked graph (see reduce_marked_graph) onto the cycle of edges
+    of the original marked graph that it replaces """
+    return [ edge for v, w, key in cycle for edge in reduced.edges[ v, w, key ][ 'path' ] ]
+
+def remove_dominated_channels( sdfg ):
+    """ Removes the parallel channels of an SDF graph that are dominated by another channel between the same actors,
+    with the same production and consumption rates and at most as many tokens. A dominated channel constrains the firings
+    of its consumer no further than the other channel does, so its removal preserves the throughput.
+    The multi-rate equivalent (see multi_rate_equivalent) typically has many such channels.
+    """
+    best = dict()
+    for v, w, key, data in sdfg.edges( keys = True, data = True ):
+        signature = (v, w, tuple( data.get( 'production' )), tuple( data.get( 'consumption' )))
+        if signature not in best or data.get( 'tokens', 0 ) < best[ signature ][ 0 ]:
+            best[ signature ] = data.get( 'tokens', 0 ), key
+
+    result = nx.MultiDiGraph()
+    result.add_nodes_from( sdfg.nodes( data = True ))
+    result.add_edges_from( (v, w, key, sdfg.edges[ v, w, key ]) for (v, w, _, _), (_, key) in best.items() )
+    return core.SDFGraph( result )
+
 def fire( sdfg, firings_dict = None, **attr ):
     """ Fires actors in the SDF graph sdfg.
     Which actors to fire how many times is specified either as keyword arguments, or through
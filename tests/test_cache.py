@@ -0,0 +1,90 @@
+import unittest
+import tempfile
+import networkx as nx
+import sdfpy.core as core
+import sdfpy.cache as cache
+import sdfpy.mcr as mcr
+import sdfpy.simulation as simulation
+from sdfpy.compact import CompactSDFGraph
+from sdfpy.transform import single_rate_equivalent, single_rate_as_marked_graph
+
+def small_graph( tokens = 4, reverse = False ):
+    g = nx.MultiDiGraph()
+    nodes = [ ('a', 2), ('b', 3) ]
+    for v, wcet in (reversed( nodes ) if reverse else nodes):
+        g.add_node( v, wcet = wcet )
+    g.add_edge( 'a', 'b', production = 2, consumption = 3 )
+    g.add_edge( 'b', 'a', production = 3, consumption = 2, tokens = tokens )
+    return core.SDFGraph( g )
+
+class TestFingerprint(unittest.TestCase):
+    def test_canonical(self):
+        g = small_graph()
+        self.assertEqual( cache.fingerprint( g ), cache.fingerprint( small_graph( reverse = True )))
+        self.assertEqual( cache.fingerprint( g ), cache.fingerprint( CompactSDFGraph( g )))
+        self.assertNotEqual( cache.fingerprint( g ), cache.fingerprint( small_graph( tokens = 5 )))
+
+    def test_marked_graph(self):
+        mg = single_rate_as_marked_graph( single_rate_equivalent( core.load_sdf('tests/graphs/csdfg-small.json') ))
+        self.assertEqual( len( cache.fingerprint( mg )), 64 )
+        self.assertNotEqual( cache.fingerprint( mg ), cache.fingerprint( core.load_sdf('tests/graphs/csdfg-small.json') ))
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_lru(self):
+        c = cache.AnalysisCache( maxsize = 2 )
+        c.put( 'x', 1 )
+        c.put( 'y', 2 )
+        self.assertEqual( c.get( 'x' ), 1 )
+        c.put( 'z', 3 )
+        self.assertNotIn( 'y', c )
+        self.assertEqual( c.get( 'x' ), 1 )
+        self.assertEqual( c.get( 'z' ), 3 )
+        self.assertEqual( len( c ), 2 )
+
+    def test_memoize(self):
+        c = cache.AnalysisCache()
+        calls = []
+        analysis = lambda g: calls.append( g ) or len( calls )
+        self.assertEqual( c.memoize( 'test', analysis, small_graph(), 1 ), 1 )
+        self.assertEqual( c.memoize( 'test', analysis, small_graph( reverse = True ), 1 ), 1 )
+        self.assertEqual( c.memoize( 'test', analysis, small_graph(), 2 ), 2 )
+        self.assertEqual( (c.hits, c.misses), (1, 2) )
+
+    def test_disk(self):
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        with tempfile.TemporaryDirectory() as tmp:
+            first = cache.AnalysisCache( directory = tmp )
+            throughput = cache.find_throughput( g, cache = first )
+            self.assertEqual( throughput, simulation.find_throughput( g ))
+
+            second = cache.AnalysisCache( directory = tmp )
+            self.assertEqual( cache.find_throughput( g, cache = second ), throughput )
+            self.assertEqual( (second.hits, second.misses), (1, 0) )
+
+    def test_analyses(self):
+        c = cache.AnalysisCache()
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        mg = single_rate_as_marked_graph( single_rate_equivalent( g ))
+        expected, *_ = mcr.max_cycle_ratio( mg )
+        for _ in range( 2 ):
+            self.assertEqual( cache.repetition_vector( g, cache = c ), g.repetition_vector() )
+            ratio, cycle, _ = cache.max_cycle_ratio( mg, cache = c )
+            self.assertEqual( ratio, expected )
+            schedule = cache.strictly_periodic_schedule( g, cache = c )
+            self.assertEqual( set( schedule ), set( g.nodes() ))
+        self.assertEqual( (c.hits, c.misses), (3, 3) )
+
+        ratio, *_ = cache.max_cycle_ratio( mg, engine = 'howard', cache = c )
+        self.assertEqual( ratio, expected )
+        self.assertEqual( (c.hits, c.misses), (3, 4) )
+
+    def test_processes(self):
+        # the number of processes is not part of the key
+        c = cache.AnalysisCache()
+        mg = single_rate_as_marked_graph( single_rate_equivalent( core.load_sdf('tests/graphs/csdfg-small.json') ))
+        ratio, *_ = cache.max_cycle_ratio( mg, processes = 1, cache = c )
+        self.assertEqual( cache.max_cycle_ratio( mg, processes = 4, cache = c )[ 0 ], ratio )
+        self.assertEqual( (c.hits, c.misses), (1, 1) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import unittest
+import random
+import tempfile
+import numpy as np
+import networkx as nx
+import sdfpy.core as core
+import sdfpy.mcr as mcr
+import sdfpy.simulation as simulation
+from sdfpy.compact import CompactSDFGraph, CompactMarkedGraph, Firings
+from sdfpy.transform import single_rate_equivalent, single_rate_as_marked_graph, compact_single_rate_marked_graph
+from collections import Counter
+from fractions import Fraction
+
+class TestCompactSDFGraph(unittest.TestCase):
+    def setUp(self):
+        self.sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+        self.cg = CompactSDFGraph( self.sdfg )
+
+    def test_structure(self):
+        cg, sdfg = self.cg, self.sdfg
+        self.assertEqual( cg.number_of_actors(), sdfg.number_of_nodes() )
+        self.assertEqual( cg.number_of_channels(), sdfg.number_of_edges() )
+        self.assertDictEqual( cg.repetition_vector(), sdfg.repetition_vector() )
+        self.assertDictEqual( cg.normalisation_vector(), sdfg.normalisation_vector() )
+        self.assertEqual( cg.modulus(), sdfg.modulus() )
+
+        for c in range( cg.number_of_channels() ):
+            v, w, key = cg.channel( c )
+            data = sdfg.get_edge_data( v, w, key )
+            self.assertEqual( cg.production( c ), data['production'] )
+            self.assertEqual( cg.consumption( c ), data['consumption'] )
+            self.assertEqual( cg.tokens[ c ], data['tokens'] )
+            self.assertIn( c, cg.out_edges( cg.index[ v ] ))
+            self.assertIn( c, cg.in_edges( cg.index[ w ] ))
+
+        for v in sdfg:
+            self.assertEqual( cg.wcets( cg.index[ v ] ), sdfg.nodes[ v ]['wcet'] )
+
+    def test_frozen(self):
+        with self.assertRaises( AttributeError ):
+            self.cg.tpi = 1
+
+        with self.assertRaises( ValueError ):
+            self.cg.tokens[ 0 ] = 1
+
+    def test_rate_sum_and_predecessor(self):
+        cg, sdfg = self.cg, self.sdfg
+        for c in range( cg.number_of_channels() ):
+            v, w, key = cg.channel( c )
+            data = sdfg.get_edge_data( v, w, key )
+            for k in range( -7, 13 ):
+                self.assertEqual( cg.rate_sum( c, k ), data['production'].sum( 0, k ) if k >= 0 else -data['production'].sum( k, 0 ))
+                self.assertEqual( cg.rate_sum( c, k, False ), data['consumption'].sum( 0, k ) if k >= 0 else -data['consumption'].sum( k, 0 ))
+
+            for k in range( 1, 13 ):
+                self.assertEqual( cg.predecessor( c, k ), core.predecessor( k, **data ))
+
+            self.assertListEqual( cg.predecessors( c, np.arange( 1, 13 )).tolist(), core.predecessors( np.arange( 1, 13 ), **data ).tolist() )
+
+    def test_single_rate_equivalent(self):
+        expected = single_rate_equivalent( self.sdfg )
+        hsdfg = single_rate_equivalent( self.cg )
+        self.assertSetEqual( set( hsdfg.nodes() ), set( expected.nodes() ))
+        self.assertSetEqual( set( hsdfg.edges( keys = True, data = 'tokens' )), set( expected.edges( keys = True, data = 'tokens' )))
+
+    def test_single_rate_marked_graph(self):
+        for relate_start_times in [ True, False ]:
+            expected = single_rate_as_marked_graph( single_rate_equivalent( self.sdfg ), relate_start_times )
+            for sdfg in [ self.sdfg, self.cg ]:
+                mg = compact_single_rate_marked_graph( sdfg, relate_start_times )
+                self.assertSetEqual( set( mg.nodes ), set( expected.nodes() ))
+                edges = zip( mg.source.tolist(), mg.target.tolist(), mg.weight.tolist(), mg.tokens.tolist() )
+                self.assertEqual( Counter( (mg.nodes[ v ], mg.nodes[ w ], weight, tokens) for v, w, weight, tokens in edges ),
+                    Counter( (v, w, data[ 'weight' ], data[ 'tokens' ]) for v, w, data in expected.edges( data = True )))
+                self.assertEqual( mcr.max_cycle_ratio( mg )[ 0 ], mcr.max_cycle_ratio( expected )[ 0 ] )
+
+    def test_firings(self):
+        firings = Firings( self.cg.actors, self.cg.q )
+        expected = list( single_rate_equivalent( self.sdfg ).nodes() )
+        self.assertEqual( len( firings ), len( expected ))
+        self.assertListEqual( list( firings ), [ firings[ i ] for i in range( len( firings )) ] )
+        self.assertSetEqual( set( firings ), set( expected ))
+        for i, firing in enumerate( firings ):
+            self.assertEqual( firings.index( firing ), i )
+        with self.assertRaises( IndexError ):
+            firings[ len( firings ) ]
+
+    def test_throughput(self):
+        self.assertEqual( simulation.find_throughput( self.cg ), simulation.find_throughput( self.sdfg ))
+
+class TestCompactMarkedGraph(unittest.TestCase):
+    def test_csr(self):
+        g = nx.MultiDiGraph()
+        g.add_edge( 3, 1, weight = 2, tokens = 1 )
+        g.add_edge( 1, 2, weight = 5, tokens = 0 )
+        g.add_edge( 2, 3, weight = 1, tokens = 1 )
+        g.add_edge( 1, 2, weight = 4, tokens = 1 )
+        mg = CompactMarkedGraph.from_graph( g )
+
+        self.assertEqual( mg.number_of_nodes(), 3 )
+        self.assertEqual( mg.number_of_edges(), 4 )
+        edges = set()
+        for v in range( mg.number_of_nodes() ):
+            for e in mg.out_edges( v ):
+                self.assertEqual( mg.source[ e ], v )
+                edges.add( mg.edge( e ) + (int( mg.weight[ e ] ), int( mg.tokens[ e ] )))
+
+        expected = set( (v, w, k, d['weight'], d['tokens']) for v, w, k, d in g.edges( keys = True, data = True ))
+        self.assertSetEqual( edges, expected )
+
+    def test_max_cycle_ratio(self):
+        sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+        mg = single_rate_as_marked_graph( single_rate_equivalent( sdfg ))
+        ratio, cycle, _ = mcr.max_cycle_ratio( CompactMarkedGraph.from_graph( mg ))
+        expected, _, _ = mcr.max_cycle_ratio( mg )
+        self.assertEqual( ratio, expected )
+        self.assertEqual( ratio, 1 / simulation.find_throughput( sdfg ))
+
+    def test_subgraph(self):
+        g = nx.MultiDiGraph()
+        g.add_edge( 'a', 'b', weight = 2, tokens = 1 )
+        g.add_edge( 'b', 'c', weight = 5, tokens = 0 )
+        g.add_edge( 'c', 'a', weight = 1, tokens = 1 )
+        g.add_edge( 'b', 'a', weight = 4, tokens = 1 )
+        mg = CompactMarkedGraph.from_graph( g )
+        sub = mg.subgraph( [ mg.node_index( 'b' ), mg.node_index( 'a' ) ] )
+
+        self.assertTupleEqual( sub.nodes, ('a', 'b') )
+        self.assertSetEqual( set( sub.edge( e ) for e in range( sub.number_of_edges() )), {('a', 'b', 0), ('b', 'a', 0)} )
+
+    def test_components(self):
+        random.seed( 2 )
+        g = nx.MultiDiGraph()
+        for c in range( 4 ):
+            nodes = [ (c, i) for i in range( random.randint( 1, 6 )) ]
+            for v, w in zip( nodes, nodes[ 1: ] + nodes[ :1 ] ):
+                g.add_edge( v, w, weight = random.randint( 0, 9 ), tokens = random.randint( 1, 2 ))
+            for _ in range( 5 ):
+                g.add_edge( random.choice( nodes ), random.choice( nodes ), weight = random.randint( 0, 9 ), tokens = random.randint( 1, 2 ))
+            g.add_edge( nodes[ 0 ], (c + 1, 0), weight = 50, tokens = 0 )
+        mg = CompactMarkedGraph.from_graph( g )
+
+        # the compiled graph is analysed without converting it back
+        to_networkx = CompactMarkedGraph.to_networkx
+        CompactMarkedGraph.to_networkx = None
+        try:
+            for engine in mcr.ENGINES:
+                for processes in [1, 2]:
+                    expected, _, _ = mcr.max_cycle_ratio( g, engine = engine )
+                    ratio, cycle, forest = mcr.max_cycle_ratio( mg, engine = engine, processes = processes )
+                    self.assertEqual( ratio, expected )
+                    self.assertEqual( sum( g.edges[ e ]['weight'] for e in cycle ), ratio * sum( g.edges[ e ]['tokens'] for e in cycle ))
+                    self.assertTrue( all( g.has_edge( *e ) for e in forest.pre_order_edges() ))
+        finally:
+            CompactMarkedGraph.to_networkx = to_networkx
+
+    def test_save_load(self):
+        random.seed( 3 )
+        g = nx.MultiDiGraph()
+        nodes = [ ('v', i) for i in range( 20 ) ]
+        for v, w in zip( nodes, nodes[ 1: ] + nodes[ :1 ] ):
+            g.add_edge( v, w, weight = random.randint( 0, 9 ), tokens = random.randint( 1, 2 ))
+        for _ in range( 40 ):
+            g.add_edge( random.choice( nodes ), random.choice( nodes ), weight = random.randint( 0, 9 ), tokens = random.randint( 0, 2 ))
+        mg = CompactMarkedGraph.from_graph( g )
+
+        with tempfile.TemporaryDirectory() as directory:
+            mg.save( directory )
+            loaded = CompactMarkedGraph.load( directory )
+            self.assertTrue( loaded.is_mapped() )
+            self.assertFalse( mg.is_mapped() )
+            self.assertTupleEqual( loaded.nodes, mg.nodes )
+            self.assertTupleEqual( loaded.keys, mg.keys )
+            for name in [ 'offsets', 'source', 'target', 'weight', 'tokens' ]:
+                self.assertTrue( np.array_equal( getattr( loaded, name ), getattr( mg, name )))
+
+            # the engines run on the memory-mapped arrays, also when these are read in small chunks
+            chunk_size = mcr.CSR_CHUNK_SIZE
+            mcr.CSR_CHUNK_SIZE = 3
+            try:
+                for engine in mcr.ENGINES:
+                    expected, expected_cycle, _ = mcr.max_cycle_ratio( mg, engine = engine )
+                    ratio, cycle, _ = mcr.max_cycle_ratio( loaded, engine = engine )
+                    self.assertEqual( ratio, expected )
+                    self.assertListEqual( cycle, expected_cycle )
+            finally:
+                mcr.CSR_CHUNK_SIZE = chunk_size
+            del loaded
+
+    def test_single_rate_marked_graph_on_disk(self):
+        sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+        for relate_start_times in [ True, False ]:
+            expected = compact_single_rate_marked_graph( sdfg, relate_start_times )
+            with tempfile.TemporaryDirectory() as directory:
+                mg = compact_single_rate_marked_graph( sdfg, relate_start_times, directory )
+                self.assertTrue( mg.is_mapped() )
+                self.assertEqual( mg.nodes, expected.nodes )
+                for name in [ 'offsets', 'source', 'target', 'weight', 'tokens' ]:
+                    self.assertTrue( np.array_equal( getattr( mg, name ), getattr( expected, name )))
+                self.assertEqual( mcr.max_cycle_ratio( mg, engine = 'howard' )[ 0 ], mcr.max_cycle_ratio( expected )[ 0 ] )
+                del mg
+
+    def test_single_rate_marked_graph_in_processes(self):
+        sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+        expected = compact_single_rate_marked_graph( sdfg )
+        with tempfile.TemporaryDirectory() as directory:
+            for mg in [ compact_single_rate_marked_graph( sdfg, processes = 2 ),
+                        compact_single_rate_marked_graph( sdfg, directory = directory, processes = 2 ) ]:
+                for name in [ 'offsets', 'source', 'target', 'weight', 'tokens' ]:
+                    self.assertTrue( np.array_equal( getattr( mg, name ), getattr( expected, name )))
+            del mg
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,13 @@
 import unittest
+import random
+import os
+import tempfile
+import json
+import struct
+import numpy as np
 import networkx as nx
 import sdfpy.core as core
+from sdfpy.cyclic import Cyclic
 
 class TestLoadJSON(unittest.TestCase):
     def test_tiny_csdf(self):
@@ -80,5 +87,98 @@ class TestLoadYAML(unittest.TestCase):
         except Exception as e:
             self.fail()
 
+class TestLoadXML(unittest.TestCase):
+    def test_round_trip(self):
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'csdfg-small.xml' )
+            core.write_sdf_xml( g, filename )
+            for free_elements in [False, True]:
+                h = core.load_sdf_xml( filename, free_elements = free_elements )
+                for v, data in g.nodes( data = True ):
+                    self.assertEqual( h.nodes[v]['wcet'][:data['period']], data['wcet'][:data['period']] )
+                self.assertListEqual( list( h.edges( data = 'tokens' )), list( g.edges( data = 'tokens' )))
+                for u, v, data in g.edges( data = True ):
+                    self.assertEqual( h[u][v][0]['production'], data['production'] )
+                    self.assertEqual( h[u][v][0]['consumption'], data['consumption'] )
+                self.assertEqual( h.repetition_vector(), g.repetition_vector() )
+
+    def test_unknown_port(self):
+        g = core.load_sdf('tests/graphs/csdfg-tiny.json')
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'csdfg-tiny.xml' )
+            core.write_sdf_xml( g, filename )
+            with open( filename ) as f:
+                text = f.read()
+            with open( filename, 'w' ) as f:
+                f.write( text.replace( 'srcPort="', 'srcPort="x', 1 ))
+            self.assertRaises( core.SDFParseError, core.load_sdf_xml, filename )
+
+class TestBinary(unittest.TestCase):
+    def test_round_trip(self):
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'csdfg-small.sdfb' )
+            core.write_sdf_binary( g, filename )
+            h = core.load_sdf_binary( filename )
+            self.assertListEqual( list( h.nodes( data = True )), list( g.nodes( data = True )))
+            for (u, v, key, data), (x, y, key2, data2) in zip( g.edges( keys = True, data = True ), h.edges( keys = True, data = True )):
+                self.assertEqual( (u, v, key), (x, y, key2) )
+                for attr in ['production', 'consumption', 'tokens', 'gcd']:
+                    self.assertEqual( data[ attr ], data2[ attr ] )
+            self.assertListEqual( list( h.repetition_vector().items() ), list( g.repetition_vector().items() ))
+            self.assertDictEqual( h.normalisation_vector(), g.normalisation_vector() )
+            self.assertEqual( h.modulus(), g.modulus() )
+
+    def test_compiled(self):
+        g = nx.MultiDiGraph()
+        g.add_node( ('a', 1), wcet = [1, 2] )
+        g.add_node( 'b', wcet = 3 )
+        g.add_edge( ('a', 1), 'b', production = [1, 2], consumption = 3, tokens = 0 )
+        g.add_edge( 'b', ('a', 1), production = 3, consumption = [2, 1], tokens = 6 )
+        g = core.SDFGraph( g )
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'tuples.sdfb' )
+            core.write_sdf_binary( g, filename )
+            cg = core.load_sdf_binary( filename, compiled = True )
+            self.assertEqual( cg.actors, (('a', 1), 'b') )
+            self.assertEqual( cg.repetition_vector(), g.repetition_vector() )
+            self.assertEqual( cg.production( 0 ), Cyclic( 1, 2 ))
+            self.assertFalse( cg.prod.flags.writeable )
+            del cg
+
+    def test_invalid(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'invalid.sdfb' )
+            with open( filename, 'wb' ) as f:
+                f.write( b'not a graph' )
+            self.assertRaises( core.SDFParseError, core.load_sdf_binary, filename )
+
+    def test_invalid_header(self):
+        valid = dict( actors = [], keys = [], s = [], tpi = 1, arrays = [ ['q_order', 0] ] )
+        headers = [ dict( valid, arrays = [] ), dict( valid, tpi = None, s = None ), dict( valid, arrays = 3 ) ]
+        headers += [ { k : v for k, v in valid.items() if k != field } for field in [ 'arrays', 's', 'tpi' ] ]
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join( tmp, 'invalid.sdfb' )
+            for header in headers:
+                data = json.dumps( header ).encode( 'utf-8' )
+                with open( filename, 'wb' ) as f:
+                    f.write( core.SDF_BINARY_MAGIC + struct.pack( '<Q', len( data )) + data )
+                self.assertRaises( core.SDFParseError, core.load_sdf_binary, filename )
+
+class TestPredecessors(unittest.TestCase):
+    def test_batch_matches_scalar(self):
+        random.seed( 3 )
+        for _ in range( 200 ):
+            prates = Cyclic([ random.randrange( 0, 5 ) for _ in range( random.randrange( 1, 5 )) ])
+            crates = Cyclic([ random.randrange( 0, 5 ) for _ in range( random.randrange( 1, 5 )) ])
+            if prates.sum() == 0 or crates.sum() == 0:
+                continue
+
+            data = dict( production = prates, consumption = crates, tokens = random.randrange( 0, 12 ))
+            ks = np.arange( 1, 40 )
+            expected = [ core.predecessor( k, **data ) for k in ks.tolist() ]
+            self.assertListEqual( core.predecessors( ks, **data ).tolist(), expected )
+
 if __name__ == '__main__':
     unittest.main()
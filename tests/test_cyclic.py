@@ -0,0 +1,56 @@
+import unittest
+import random
+from sdfpy.cyclic import Cyclic
+
+def naive_sum( pattern, start, stop, step ):
+    return sum( pattern[ k % len( pattern ) ] for k in range( start, stop, step ))
+
+class TestCyclic(unittest.TestCase):
+    def test_indexing(self):
+        c = Cyclic( 1, 2, 3 )
+        self.assertEqual( c[ 4 ], 2 )
+        self.assertEqual( c[ -1 ], 3 )
+        self.assertEqual( Cyclic( 5 ), (5,) )
+        self.assertEqual( Cyclic( [4, 5] ), (4, 5) )
+
+    def test_slices(self):
+        c = Cyclic( 1, 2, 3, 4 )
+        self.assertEqual( c[ 1: ], (2, 3, 4, 1) )
+        self.assertIs( type( c[ 5: ] ), Cyclic )
+        self.assertEqual( c[ 5: ], (2, 3, 4, 1) )
+        self.assertEqual( c[ 1::2 ], (2, 4) )
+        self.assertEqual( c[ 0::3 ], (1, 4, 3, 2) )
+        self.assertEqual( c[ 2:9 ], (3, 4, 1, 2, 3, 4, 1) )
+        self.assertEqual( c[ 1:8:3 ], (2, 1, 4) )
+        self.assertEqual( c[ 5:1 ], () )
+
+    def test_range_sums(self):
+        random.seed( 7 )
+        for _ in range( 50 ):
+            pattern = [ random.randrange( 0, 10 ) for _ in range( random.randrange( 1, 8 )) ]
+            c = Cyclic( pattern )
+            for _ in range( 20 ):
+                start = random.randrange( -20, 20 )
+                stop = random.randrange( -20, 40 )
+                self.assertEqual( c.sum( start, stop ), naive_sum( pattern, start, stop, 1 ))
+                self.assertEqual( c.partial_sum( stop ), naive_sum( pattern, 0, stop, 1 ) if stop >= 0 else -naive_sum( pattern, stop, 0, 1 ))
+
+    def test_strided_sums(self):
+        random.seed( 11 )
+        for _ in range( 50 ):
+            pattern = [ random.randrange( 0, 10 ) for _ in range( random.randrange( 1, 8 )) ]
+            c = Cyclic( pattern )
+            for _ in range( 20 ):
+                start = random.randrange( -20, 20 )
+                stop = random.randrange( -20, 60 )
+                step = random.randrange( 1, 12 )
+                self.assertEqual( c.sum( start, stop, step ), naive_sum( pattern, start, stop, step ))
+
+    def test_default_sum(self):
+        c = Cyclic( 3, 0, 4 )
+        self.assertEqual( c.sum(), 7 )
+        self.assertEqual( c.sum( 2 ), 4 )
+        self.assertEqual( c.sum( stop = 7 ), 17 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -98,6 +98,34 @@ class TestForest(unittest.TestCase):
         self.assertSetEqual( set( forest.roots()), {1} )
         self.assertListEqual( list( forest.pre_order()), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13] )
 
+    def test_deep_tree(self):
+        forest = Forest()
+        n = 100000
+        for v in range( n ):
+            forest.add_edge( v, v + 1 )
+        self.assertListEqual( list( forest.pre_order( 0 )), list( range( n + 1 )))
+
+        # move the lower half of the chain below the root
+        forest.add_edge( 0, n // 2, 'moved' )
+        self.assertEqual( forest.parent( n // 2 ), (0, n // 2, 'moved') )
+        self.assertListEqual( list( forest.pre_order()), list( range( n + 1 )))
+        self.assertListEqual( list( forest.pre_order( 1 )), list( range( 1, n // 2 )))
+        self.assertEqual( len( list( forest.pre_order_edges()) ), n )
+
+    def test_relink_subtree(self):
+        forest = Forest()
+        forest.add_edge( 1, 2 )
+        forest.add_edge( 2, 3 )
+        forest.add_edge( 3, 4 )
+        forest.add_edge( 1, 5 )
+
+        # move the last descendant of 2, and then 2 itself
+        forest.add_edge( 5, 4 )
+        self.assertListEqual( list( forest.pre_order()), [1, 2, 3, 5, 4] )
+        forest.add_edge( 4, 2 )
+        self.assertListEqual( list( forest.pre_order()), [1, 5, 4, 2, 3] )
+        self.assertListEqual( list( forest.pre_order( 5 )), [5, 4, 2, 3] )
+
 if __name__ == '__main__':
     unittest.main()
 
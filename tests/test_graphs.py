@@ -1,6 +1,8 @@
 import unittest
+import random
+import numpy as np
 import networkx as nx
-from sdfpy.graphs import longest_distances, shortest_distances, NegativeCycle, PositiveCycle
+from sdfpy.graphs import circuit_basis, longest_distances, shortest_distances, longest_distances_csr, shortest_distances_csr, strongly_connected_components_csr, NegativeCycle, PositiveCycle
 
 class TestShortestPaths(unittest.TestCase):
 
@@ -215,6 +217,129 @@ class TestLongestPaths(unittest.TestCase):
 
         except PositiveCycle as c:
             self.fail( "False positive cycle detected" )
+    def test_random(self):
+        random.seed( 1 )
+        for _ in range( 500 ):
+            n = random.randint( 2, 12 )
+            g = nx.MultiDiGraph()
+            g.add_nodes_from( range( n ))
+            for _ in range( random.randint( 0, 3 * n )):
+                g.add_edge( random.randrange( n ), random.randrange( n ), weight = random.randint( -10, 4 ))
+
+            h = nx.MultiDiGraph()
+            h.add_nodes_from( g )
+            h.add_weighted_edges_from( (v, w, -weight) for v, w, weight in g.edges( data = 'weight' ))
+            try:
+                expected = { v : -d for v, d in nx.single_source_bellman_ford_path_length( h, 0 ).items() }
+            except nx.NetworkXUnbounded:
+                expected = None
+
+            try:
+                parents, distances = longest_distances( g, 0 )
+            except PositiveCycle as c:
+                self.assertIsNone( expected )
+                self.assertGreater( sum( g.edges[ e ]['weight'] for e in c.cycle ), 0 )
+                continue
+
+            self.assertDictEqual( distances, expected )
+            for v, edge in parents.items():
+                if edge is not None:
+                    self.assertEqual( distances[ v ], distances[ edge[ 0 ]] + g.edges[ edge ]['weight'] )
+class TestCSR(unittest.TestCase):
+    def test_random(self):
+        random.seed( 1 )
+        for _ in range( 500 ):
+            n = random.randint( 2, 12 )
+            edges = sorted( (random.randrange( n ), random.randrange( n ), random.randint( -10, 4 )) for _ in range( random.randint( 0, 3 * n )))
+            offsets = [ sum( 1 for v, _, _ in edges if v < u ) for u in range( n + 1 ) ]
+            target = [ w for _, w, _ in edges ]
+            weight = [ weight for _, _, weight in edges ]
+
+            g = nx.MultiDiGraph()
+            g.add_nodes_from( range( n ))
+            for e, (v, w, weight_e) in enumerate( edges ):
+                g.add_edge( v, w, e, weight = weight_e )
+
+            for csr, dct, exception, sign in [ (longest_distances_csr, longest_distances, PositiveCycle, 1),
+                                               (shortest_distances_csr, shortest_distances, NegativeCycle, -1) ]:
+                try:
+                    _, expected = dct( g, 0 )
+                except exception:
+                    with self.assertRaises( exception ) as c:
+                        csr( offsets, target, weight, 0 )
+                    cycle = c.exception.cycle
+                    self.assertTrue( all( edges[ e ][ 1 ] == edges[ f ][ 0 ] for e, f in zip( cycle, cycle[ 1: ] + cycle[ :1 ] )))
+                    self.assertGreater( sign * sum( weight[ e ] for e in cycle ), 0 )
+                    continue
+
+                parents, distances = csr( offsets, target, weight, 0 )
+                self.assertDictEqual( { v : d for v, d in enumerate( distances ) if d is not None }, expected )
+                for w, e in enumerate( parents ):
+                    if e >= 0:
+                        self.assertEqual( target[ e ], w )
+                        self.assertEqual( distances[ w ], distances[ edges[ e ][ 0 ]] + weight[ e ] )
+
+class TestComponents(unittest.TestCase):
+    def test_csr(self):
+        random.seed( 4 )
+        for _ in range( 50 ):
+            n = random.randint( 1, 15 )
+            g = nx.MultiDiGraph()
+            g.add_nodes_from( range( n ))
+            g.add_edges_from( (random.randrange( n ), random.randrange( n )) for _ in range( random.randint( 0, 2 * n )))
+
+            edges = sorted( g.edges() )
+            offsets = [ 0 ] * (n + 1)
+            for v, _ in edges:
+                offsets[ v + 1 ] += 1
+            for v in range( n ):
+                offsets[ v + 1 ] += offsets[ v ]
+
+            components = strongly_connected_components_csr( offsets, [ w for _, w in edges ] )
+            self.assertSetEqual( set( frozenset( c ) for c in components ), set( frozenset( c ) for c in nx.strongly_connected_components( g )))
+
+            # the components are in reverse topological order
+            position = { v : i for i, c in enumerate( components ) for v in c }
+            self.assertTrue( all( position[ v ] >= position[ w ] for v, w in edges ))
+
+class TestCircuitBasis(unittest.TestCase):
+    def test_random(self):
+        random.seed( 2 )
+        for i in range( 200 ):
+            n = random.randint( 1, 25 )
+            g = nx.MultiDiGraph() if i % 2 else nx.DiGraph()
+            g.add_node( 0 )
+            nx.add_cycle( g, random.sample( range( n ), n ))
+            g.add_edges_from( (random.randrange( n ), random.randrange( n )) for _ in range( random.randint( 0, 3 * n )))
+
+            edges = list( g.edges( keys = True ) if g.is_multigraph() else g.edges() )
+            index = { e : j for j, e in enumerate( edges ) }
+            cycles = list( circuit_basis( g ))
+            self.assertEqual( len( cycles ), len( edges ) - n + 1 )
+
+            # the cycles are simple and linearly independent
+            vectors = np.zeros( (len( cycles ), len( edges )))
+            for j, cycle in enumerate( cycles ):
+                self.assertTrue( all( e[ 1 ] == f[ 0 ] for e, f in zip( cycle, cycle[ 1: ] + cycle[ :1 ] )))
+                self.assertEqual( len( set( e[ 0 ] for e in cycle )), len( cycle ))
+                for e in cycle:
+                    vectors[ j, index[ e ]] += 1
+
+            if cycles:
+                self.assertEqual( np.linalg.matrix_rank( vectors ), len( cycles ))
+
+    def test_large(self):
+        random.seed( 3 )
+        n = 20000
+        g = nx.DiGraph()
+        nx.add_cycle( g, range( n ))
+        g.add_edges_from( (random.randrange( n ), random.randrange( n )) for _ in range( 2 * n ))
+
+        # cycles are generated lazily
+        basis = circuit_basis( g )
+        cycle = next( basis )
+        self.assertEqual( cycle[ 0 ][ 0 ], cycle[ -1 ][ 1 ] )
+        self.assertEqual( 1 + sum( 1 for _ in basis ), g.number_of_edges() - n + 1 )
 
 if __name__ == '__main__':
     unittest.main()
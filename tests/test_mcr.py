@@ -1,4 +1,5 @@
 import unittest
+import random
 import networkx as nx
 import sdfpy.mcr as mcr
 from fractions import Fraction
@@ -11,6 +12,20 @@ def canonicalform( ls ):
 
     return ls
 
+def random_marked_graph( n, ring_tokens = (1, 2), extra_tokens = (1, 1, 2, 3) ):
+    g = nx.MultiDiGraph()
+    for v in range( n ):
+        g.add_edge( v, (v + 1) % n, weight = random.randint( 0, 20 ), tokens = random.randint( *ring_tokens ))
+    for _ in range( random.randint( 0, 4 * n )):
+        g.add_edge( random.randint( 0, n - 1 ), random.randint( 0, n - 1 ), weight = random.randint( 0, 20 ), tokens = random.choice( extra_tokens ))
+    return g
+
+def has_positive_cycle( g, ratio ):
+    h = nx.MultiDiGraph()
+    for v, w, key, data in g.edges( keys = True, data = True ):
+        h.add_edge( v, w, key, weight = ratio * data['tokens'] - data['weight'] )
+    return nx.negative_edge_cycle( h )
+
 class TestMaxCycleRatioMultiComponent(unittest.TestCase):
     def test_two_components(self):
         g = nx.MultiDiGraph()
@@ -33,6 +48,75 @@ class TestMaxCycleRatioMultiComponent(unittest.TestCase):
         except mcr.InfeasibleException as c:
             self.fail()
 
+class TestMaxCycleRatioParallel(unittest.TestCase):
+    def test_many_components(self):
+        g = nx.MultiDiGraph()
+        for i in range( 12 ):
+            a, b = 2 * i, 2 * i + 1
+            g.add_edge( a, b, weight = i + 1, tokens = 1 )
+            g.add_edge( b, a, weight = 3, tokens = 1 )
+            g.add_edge( b, a, weight = 1, tokens = 0 )
+            g.add_edge( b, a + 2, weight = 7, tokens = 0 )
+
+        expected = mcr.max_cycle_ratio( g )
+        self.assertEqual( expected[ 0 ], 13 )
+        for engine in mcr.ENGINES:
+            ratio, cycle, forest = mcr.max_cycle_ratio( g, engine = engine, processes = 2 )
+            self.assertEqual( ratio, expected[ 0 ] )
+            self.assertListEqual( canonicalform(cycle), [(22, 23, 0), (23, 22, 1)] )
+            self.assertListEqual( [ forest.parent( v ) for v in g if v in forest ], [ expected[ 2 ].parent( v ) for v in g if v in expected[ 2 ] ] )
+
+class TestIncrementalMCR(unittest.TestCase):
+    def test_update_tokens(self):
+        g = nx.MultiDiGraph()
+        g.add_edge( 1, 2, weight = 15, tokens = 4 )
+        g.add_edge( 1, 2, weight = 5, tokens = 2 )
+        g.add_edge( 2, 1, weight = 5, tokens = 1 )
+        g.add_edge( 2, 1, weight = 15, tokens = 3 )
+
+        inc = mcr.IncrementalMCR( g, 1 )
+        ratio, cycle = inc.solve()
+        self.assertEqual( ratio, Fraction( 30, 7 ))
+        self.assertListEqual( canonicalform(cycle), [(1, 2, 0), (2, 1, 1)] )
+
+        # more tokens on the critical cycle
+        inc.update_edge( (2, 1, 1), tokens = 5 )
+        ratio, cycle = inc.solve()
+        self.assertEqual( ratio, Fraction( 20, 5 ))
+
+        # the ratio increases again
+        inc.update_edge( (2, 1, 1), tokens = 1 )
+        ratio, cycle = inc.solve()
+        self.assertEqual( ratio, Fraction( 20, 3 ))
+        self.assertListEqual( canonicalform(cycle), [(1, 2, 1), (2, 1, 1)] )
+
+        # no tokens on a cycle with positive weight
+        inc.update_edge( (1, 2, 1), tokens = 0 )
+        inc.update_edge( (2, 1, 0), tokens = 0 )
+        self.assertRaises( mcr.InfeasibleException, inc.solve )
+
+    def test_random_updates(self):
+        random.seed( 3 )
+        for _ in range( 50 ):
+            n = random.randint( 2, 7 )
+            g = nx.MultiDiGraph()
+            for v in range( n ):
+                g.add_edge( v, (v + 1) % n, weight = random.randint( 0, 9 ), tokens = random.randint( 1, 3 ))
+            for _ in range( 2 * n ):
+                g.add_edge( random.randrange( n ), random.randrange( n ), weight = random.randint( 0, 9 ), tokens = random.randint( 1, 3 ))
+
+            inc = mcr.IncrementalMCR( g, 0 )
+            inc.solve()
+            for _ in range( 10 ):
+                edge = random.choice( list( g.edges( keys = True )))
+                weight, tokens = random.randint( 0, 9 ), random.randint( 1, 3 )
+                g.edges[ edge ].update( weight = weight, tokens = tokens )
+                inc.update_edge( edge, weight = weight, tokens = tokens )
+
+                ratio, cycle = inc.solve()
+                self.assertEqual( ratio, mcr.compute_mcr_component( g, 0 )[ 0 ] )
+                self.assertEqual( Fraction( sum( g.edges[ e ]['weight'] for e in cycle ), sum( g.edges[ e ]['tokens'] for e in cycle )), ratio )
+
 class TestMaxCycleRatioSingleComponent(unittest.TestCase):
     def test_deadlocked_self_loop(self):
         g = nx.MultiDiGraph()
@@ -206,5 +290,98 @@ class TestMaxCycleRatioSingleComponent(unittest.TestCase):
         self.assertEqual( cycle_ratio, cr )
         self.assertListEqual( canonicalform(cycle),  cc )
 
+class TestHoward(unittest.TestCase):
+    def test_two_components(self):
+        g = nx.MultiDiGraph()
+        g.add_edge( 1, 2, weight = 5, tokens = 1 )
+        g.add_edge( 2, 1, weight = 1, tokens = 1 )
+        g.add_edge( 3, 4, weight = 2, tokens = 2 )
+        g.add_edge( 4, 5, weight = 3, tokens = 0 )
+        g.add_edge( 5, 3, weight = 4, tokens = 0 )
+        g.add_edge( 2, 3, weight = 100, tokens = 0 )
+
+        ratio, cycle, forest = mcr.max_cycle_ratio( g, engine = 'howard' )
+        self.assertEqual( ratio, Fraction( 9, 2 ))
+        self.assertListEqual( canonicalform(cycle), [(3, 4, 0), (4, 5, 0), (5, 3, 0)] )
+
+    def test_six_nodes(self):
+        g = nx.MultiDiGraph()
+        for v, w in [(1, 60), (2, 105), (3, 160), (4, 202), (5, 253)]:
+            g.add_edge( v, v + 1, weight = 5, tokens = 0 )
+            g.add_edge( v, v + 1, weight = w, tokens = v )
+        g.add_edge( 6, 1, weight = 5, tokens = 1 )
+
+        cycle_ratio, cycle = mcr.compute_mcr_component_howard( g )
+        self.assertEqual( cycle_ratio, Fraction( 785, 16 ))
+        self.assertListEqual( canonicalform(cycle), [(1, 2, 1), (2, 3, 1), (3, 4, 1), (4, 5, 1), (5, 6, 1), (6, 1, 0)] )
+
+    def test_digraph(self):
+        g = nx.DiGraph()
+        g.add_edge(1, 2, weight = 5, tokens = 0 )
+        g.add_edge(2, 1, weight = 5, tokens = 1 )
+        g.add_edge(2, 3, weight = 15, tokens = 1 )
+        g.add_edge(3, 2, weight = 16, tokens = 2 )
+        g.add_edge(3, 4, weight = 15, tokens = 2 )
+        g.add_edge(4, 3, weight = 16, tokens = 2 )
+
+        cycle_ratio, cycle = mcr.compute_mcr_component_howard( g )
+        self.assertEqual( cycle_ratio, Fraction(31, 3) )
+        self.assertListEqual( canonicalform(cycle), [(2, 3), (3, 2)] )
+
+    def test_deadlock(self):
+        g = nx.MultiDiGraph()
+        g.add_edge( 1, 2, weight = 5, tokens = 1 )
+        g.add_edge( 2, 1, weight = 1, tokens = 1 )
+        g.add_edge( 2, 3, weight = 4, tokens = 1 )
+        g.add_edge( 3, 2, weight = 4, tokens = 1 )
+        g.add_edge( 2, 3, weight = 1, tokens = 0 )
+        g.add_edge( 3, 2, weight = 1, tokens = 0 )
+
+        with self.assertRaises( mcr.InfeasibleException ) as c:
+            mcr.compute_mcr_component_howard( g )
+        self.assertListEqual( canonicalform(c.exception.cycle), [(2, 3, 1), (3, 2, 1)] )
+
+    def test_terminates(self):
+        # a graph on which the policies used to cycle, because potentials were relative to changing nodes
+        random.seed( 11 )
+        for _ in range( 51 ):
+            g = random_marked_graph( random.randint( 5, 80 ))
+        self.assertEqual( (g.number_of_nodes(), g.number_of_edges()), (54, 164) )
+
+        ratio, cycle = mcr.compute_mcr_component_howard( g )
+        self.assertEqual( Fraction( sum( g.edges[ e ]['weight'] for e in cycle ), sum( g.edges[ e ]['tokens'] for e in cycle )), ratio )
+        self.assertFalse( has_positive_cycle( g, ratio ))
+
+    def test_unknown_engine(self):
+        self.assertRaises( ValueError, mcr.max_cycle_ratio, nx.MultiDiGraph(), engine = 'simplex' )
+
+class TestEngines(unittest.TestCase):
+    def check( self, g ):
+        # a graph is infeasible iff it has a cycle of positive weight without tokens
+        zero_tokens = nx.MultiDiGraph( (v, w, key, data) for v, w, key, data in g.edges( keys = True, data = True ) if data['tokens'] == 0 )
+        infeasible = has_positive_cycle( zero_tokens, 0 )
+        for name, engine in mcr.ENGINES.items():
+            if infeasible:
+                with self.assertRaises( mcr.InfeasibleException, msg = name ) as c:
+                    engine( g, 0 )
+                self.assertEqual( sum( g.edges[ e ]['tokens'] for e in c.exception.cycle ), 0 )
+                self.assertGreater( sum( g.edges[ e ]['weight'] for e in c.exception.cycle ), 0 )
+                continue
+
+            # the ratio is that of the cycle, and no cycle has a higher ratio
+            ratio, cycle = engine( g, 0 )
+            self.assertEqual( Fraction( sum( g.edges[ e ]['weight'] for e in cycle ), sum( g.edges[ e ]['tokens'] for e in cycle )), ratio, name )
+            self.assertFalse( has_positive_cycle( g, ratio ), name )
+
+    def test_random(self):
+        random.seed( 11 )
+        for _ in range( 30 ):
+            self.check( random_marked_graph( random.randint( 5, 80 )))
+
+    def test_random_without_tokens(self):
+        random.seed( 4 )
+        for _ in range( 50 ):
+            self.check( random_marked_graph( random.randint( 3, 30 ), (0, 2), (0, 0, 1, 2) ))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 import random
-from sdfpy.priorityq import PriorityQueue
+from sdfpy.priorityq import PriorityQueue, IndexedPriorityQueue
 
 class TestPriorityQueue(unittest.TestCase):
 
@@ -50,6 +50,76 @@ class TestPriorityQueue(unittest.TestCase):
 
         self.assertListEqual( list( iter( q )), [(i, i - 50) for i in range(6, 50, 6) ] + [(i, i) for i in range(1, 50) if i % 6 != 0] )
 
+    def test_custom_order(self):
+        # ratios num / den, highest first
+        q = PriorityQueue( less = lambda x, y: x[0] * y[1] > y[0] * x[1] )
+        ratios = [ (1, 3), (5, 2), (7, 7), (9, 4), (2, 5) ]
+        for i, r in enumerate( ratios ):
+            q[ i ] = r
+
+        q[ 4 ] = (10, 3)
+        self.assertListEqual( [ i for i, _ in iter( q ) ], [4, 1, 3, 2, 0] )
+class TestIndexedPriorityQueue(unittest.TestCase):
+
+    def test_heap_sort(self):
+        random.seed( 42 )
+        ls = list( range( 100 ))
+        random.shuffle( ls )
+
+        q = IndexedPriorityQueue()
+        for i in ls:
+            q[ i ] = -i
+        self.assertListEqual( list( iter( q )), [(i, -i) for i in range( 99, -1, -1 )] )
+        self.assertEqual( len( q ), 0 )
+
+    def test_heapify(self):
+        random.seed( 255 )
+        keys = { i : random.randint( 0, 1000 ) for i in range( 0, 200, 2 ) }
+        q = IndexedPriorityQueue( 10, keys = keys )
+
+        self.assertEqual( len( q ), len( keys ))
+        self.assertNotIn( 1, q )
+        self.assertNotIn( 500, q )
+        self.assertEqual( q[ 4 ], keys[ 4 ] )
+        self.assertListEqual( [ key for _, key in iter( q ) ], sorted( keys.values() ))
+
+    def test_update(self):
+        q = IndexedPriorityQueue( 50 )
+        for i in range( 1, 50 ):
+            q[ i ] = i
+
+        # lower the priority of the multiples of 7, and raise that of the multiples of 6
+        for i in range( 7, 50, 7 ):
+            q[ i ] = i + 50
+        q.decrease_keys( (i, i - 50) for i in range( 6, 50, 6 ))
+        del q[ 1 ]
+        self.assertIsNone( q.get( 1 ))
+
+        expected = sorted( [(i, i) for i in range( 2, 50 ) if i % 7 != 0 and i % 6 != 0]
+                         + [(i, i + 50) for i in range( 7, 50, 7 ) if i % 6 != 0]
+                         + [(i, i - 50) for i in range( 6, 50, 6 )], key = lambda item: item[ 1 ] )
+        self.assertListEqual( list( iter( q )), expected )
+
+    def test_batched_decrease_keys(self):
+        random.seed( 101 )
+        for batch in [ 1, 10, 1000 ]:
+            keys = { i : random.randint( 0, 10000 ) for i in range( 1000 ) }
+            q = IndexedPriorityQueue( keys = keys )
+            for _ in range( 5 ):
+                changes = { i : keys[ i ] - random.randint( 0, 10000 ) for i in random.sample( range( 1100 ), batch ) if i in keys }
+                changes.update( (i, random.randint( 0, 10000 )) for i in range( 1000, 1000 + batch // 10 ) if i not in keys )
+                keys.update( changes )
+                q.decrease_keys( changes.items() )
+
+            self.assertListEqual( [ key for _, key in iter( q ) ], sorted( keys.values() ))
+
+    def test_custom_order(self):
+        q = IndexedPriorityQueue( less = lambda x, y: x[0] * y[1] > y[0] * x[1] )
+        q.heapify( enumerate( [ (1, 3), (5, 2), (7, 7), (9, 4), (2, 5) ] ))
+        q[ 4 ] = (10, 3)
+        self.assertEqual( q.peek(), (4, (10, 3)) )
+        self.assertListEqual( [ i for i, _ in iter( q ) ], [4, 1, 3, 2, 0] )
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -2,6 +2,7 @@ import unittest
 import networkx as nx
 import sdfpy.core as core
 import sdfpy.schedule as sched
+from sdfpy.compact import CompactSDFGraph
 
 class TestSchedule(unittest.TestCase):
 
@@ -17,6 +18,13 @@ class TestSchedule(unittest.TestCase):
         # derive strictly periodic feasible schedule
         
 
+    def test_compact( self ):
+        for filename in [ 'tests/graphs/csdfg-tiny.json', 'tests/graphs/csdfg-small.json' ]:
+            sdfg = core.load_sdf( filename )
+            for admissible in [ True, False ]:
+                expected = sched.strictly_periodic_schedule( sdfg, admissible )
+                self.assertEqual( sched.strictly_periodic_schedule( CompactSDFGraph( sdfg ), admissible ), expected )
+
 if __name__ == '__main__':
     unittest.main()
 
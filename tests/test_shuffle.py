@@ -0,0 +1,93 @@
+import unittest
+import io
+import os
+import random
+import tempfile
+import networkx as nx
+import sdfpy.shuffle as shuffle
+from sdfpy.graphs import NegativeCycle, PositiveCycle
+
+class TestShortestPaths(unittest.TestCase):
+
+    def random_graph( self, rng, multigraph = True ):
+        n = rng.randint( 1, 30 )
+        g = nx.MultiDiGraph() if multigraph else nx.DiGraph()
+        g.add_nodes_from( range( n ))
+        for _ in range( rng.randint( 0, 4 * n )):
+            g.add_edge( rng.randrange( n ), rng.randrange( n ), weight = rng.randint( -3, 10 ))
+        return g
+
+    def test_random( self ):
+        rng = random.Random( 5 )
+        cycles = 0
+        for i in range( 500 ):
+            g = self.random_graph( rng, i % 3 != 0 )
+            reachable = g.subgraph( nx.descendants( g, 0 ) | { 0 }).copy()
+            if nx.negative_edge_cycle( reachable ):
+                cycles += 1
+                with self.assertRaises( NegativeCycle ) as context:
+                    shuffle.shortest_paths( g, 0 )
+                cycle = context.exception.cycle
+                self.assertLess( sum( g.edges[ e ][ 'weight' ] for e in cycle ), 0 )
+                self.assertTrue( all( e[ 1 ] == f[ 0 ] for e, f in zip( cycle, cycle[ 1: ] + cycle[ :1 ] )))
+                continue
+
+            parents, distances, _ = shuffle.shortest_paths( g, 0 )
+            self.assertEqual( distances, nx.single_source_bellman_ford_path_length( g, 0 ))
+            self.assertIsNone( parents[ 0 ] )
+            for v, e in parents.items():
+                if e is not None:
+                    self.assertEqual( distances[ e[ 0 ]] + g.edges[ e ][ 'weight' ], distances[ v ] )
+
+        self.assertGreater( cycles, 0 )
+
+    def test_longest_paths( self ):
+        rng = random.Random( 6 )
+        for i in range( 300 ):
+            h = self.random_graph( rng )
+            g = h.copy()
+            for _, _, data in g.edges( data = True ):
+                data[ 'weight' ] = -data[ 'weight' ]
+
+            try:
+                _, distances, _ = shuffle.longest_paths( g, 0 )
+            except PositiveCycle as ex:
+                self.assertGreater( sum( g.edges[ e ][ 'weight' ] for e in ex.cycle ), 0 )
+                continue
+
+            expected = nx.single_source_bellman_ford_path_length( h, 0 )
+            self.assertEqual( distances, { v : -d for v, d in expected.items() })
+
+    def test_acyclic( self ):
+        # a DFS that builds the first policy solves a chain in a single visit per node
+        g = nx.DiGraph()
+        nx.add_path( g, range( 100 ), weight = 1 )
+        _, distances, previsits = shuffle.shortest_paths( g, 0 )
+        self.assertEqual( distances, { v : v for v in range( 100 ) })
+        self.assertEqual( previsits, 100 )
+
+    def test_load_dimacs( self ):
+        contents = "c a small graph\np sp 3 3\nn 1\na 1 2 4\na 2 3 -1\na 1 3 5\n"
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join( directory, 'small.gr' )
+            with open( filename, 'w' ) as f:
+                f.write( contents )
+
+            g, root = shuffle.load_dimacs( filename )
+
+        self.assertEqual( root, 1 )
+        self.assertEqual( sorted( g.nodes() ), [ 1, 2, 3 ] )
+        self.assertEqual( g.number_of_edges(), 3 )
+        _, distances, _ = shuffle.shortest_paths( g, root )
+        self.assertEqual( distances, { 1 : 0, 2 : 4, 3 : 3 })
+
+    def test_benchmark( self ):
+        rng = random.Random( 1 )
+        instances = [ ("grid", *shuffle.grid_instance( 4, 10, rng = rng )),
+                      ("random", *shuffle.random_instance( 50, 200, rng = rng )) ]
+        out = io.StringIO()
+        shuffle.benchmark( instances, out )
+        self.assertEqual( len( out.getvalue().splitlines() ), 5 )
+
+if __name__ == '__main__':
+    unittest.main()
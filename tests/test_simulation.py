@@ -0,0 +1,152 @@
+import unittest
+import random
+import heapq
+import itertools
+import networkx as nx
+import sdfpy.core as core
+import sdfpy.simulation as simulation
+from fractions import Fraction
+from sdfpy.compact import CompactSDFGraph
+
+class TestEventQueue(unittest.TestCase):
+    def test_order(self):
+        # events are popped in the same order as from a heap of tuples
+        random.seed( 3 )
+        actors = [ 'a', 'b', 'c', 'd' ]
+        queue = simulation.EventQueue( actors )
+        heap = []
+        for _ in range( 20 ):
+            for _ in range( random.randint( 0, 5 )):
+                event = (random.randint( 0, 10 ), random.choice( actors ), random.randint( 1, 3 ))
+                queue.push( *event )
+                heapq.heappush( heap, event )
+
+            self.assertListEqual( sorted( queue ), sorted( heap ))
+            for _ in range( random.randint( 0, len( heap ))):
+                self.assertEqual( queue.peek(), heap[ 0 ] )
+                self.assertEqual( queue.pop(), heapq.heappop( heap ))
+
+        self.assertEqual( len( queue ), len( heap ))
+
+class TestThroughput(unittest.TestCase):
+    def test_csdfg_small(self):
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        self.assertEqual( simulation.find_throughput( g ), Fraction( 1, 10 ))
+
+    def test_bounded_memory(self):
+        for filename in [ 'examples/csdfg-small.yaml', 'examples/simple.yaml', 'examples/neardeadlock.yaml' ]:
+            g = core.load_sdf_yaml( filename )
+            for v in g:
+                self.assertEqual( simulation.find_throughput( g, v, bounded_memory = True ), simulation.find_throughput( g, v ))
+
+    def test_deadlock(self):
+        g = nx.MultiDiGraph()
+        g.add_node( 'a', wcet = 1 )
+        g.add_node( 'b', wcet = 1 )
+        g.add_edge( 'a', 'b', tokens = 0 )
+        g.add_edge( 'b', 'a', tokens = 0 )
+        for bounded_memory in [ False, True ]:
+            with self.assertRaises( Exception ):
+                simulation.find_throughput( core.SDFGraph( g ), bounded_memory = bounded_memory )
+
+    def test_initial_state(self):
+        # executions from another initial state are not supported, and are not silently started from the initial marking
+        g = core.load_sdf('tests/graphs/csdfg-small.json')
+        marking = { (u, v, key) : tokens for u, v, key, tokens in g.edges( keys = True, data = 'tokens' ) }
+        self.assertRaises( ValueError, simulation.sse_states, g, marking )
+        self.assertRaises( ValueError, simulation.sse_states, g, None, dict() )
+        for bounded_memory in [ False, True ]:
+            self.assertRaises( ValueError, simulation.find_throughput, g, None, marking, None, bounded_memory )
+
+class TestEnabledFirings(unittest.TestCase):
+    def test_random(self):
+        # compare with consuming the rates one firing at a time
+        rng = random.Random( 4 )
+        for _ in range( 2000 ):
+            rates = core.Cyclic([ rng.choice([ 0, 1, 2, 5 ]) for _ in range( rng.randint( 1, 5 )) ])
+            if rates.sum() == 0:
+                continue
+
+            phase, tokens = rng.randrange( len( rates )), rng.randint( 0, 40 )
+            expected, remaining = 0, tokens
+            while remaining >= rates[ phase + expected ]:
+                remaining -= rates[ phase + expected ]
+                expected += 1
+
+            prefix_sums = ( 3, ) + rates.prefix_sums()
+            self.assertEqual( simulation.count_enabled_firings( prefix_sums, tokens, phase, 1, len( rates )), expected )
+
+    def test_many_tokens(self):
+        rates = core.Cyclic( 2, 3, 0 )
+        self.assertEqual( simulation.count_enabled_firings( rates.prefix_sums(), 5 * 10 ** 6 + 4 ), 3 * 10 ** 6 + 1 )
+
+    def test_simulation(self):
+        # a reverse channel with millions of tokens does not slow down the simulation
+        g = nx.MultiDiGraph()
+        g.add_node( 'a', wcet = 1 )
+        g.add_node( 'b', wcet = [ 2, 1 ] )
+        g.add_edge( 'a', 'b', production = 2, consumption = [ 1, 1 ], tokens = 0 )
+        g.add_edge( 'b', 'a', production = [ 1, 1 ], consumption = 2, tokens = 10 ** 7 )
+        g.add_edge( 'a', 'a', production = 1, consumption = 1, tokens = 1 )
+        states = [ simulation.state( s ) for s in itertools.islice( simulation.sse_states( core.SDFGraph( g )), 1000 ) ]
+        self.assertEqual( len( states ), 1000 )
+        self.assertEqual( states[ -1 ][ 0 ], 999 )
+
+class TestSelfTimedSimulation(unittest.TestCase):
+    def graph_states( self, sdfg ):
+        # the self-timed execution of the networkx simulation graph
+        g = simulation.build_simulation_graph( sdfg )
+        for v, data in g.nodes( data = True ):
+            if not data['blocked_on']:
+                simulation.start_self_timed( g, v )
+
+        yield g
+        while simulation.step( g ):
+            yield g
+
+    def assertSameStates( self, sdfg, steps ):
+        expected = itertools.islice( self.graph_states( sdfg ), steps )
+        states = itertools.islice( simulation.sse_states( sdfg ), steps )
+        for g, sim in itertools.zip_longest( expected, states ):
+            self.assertEqual( simulation.state( sim ), simulation.state( g ))
+            for v in sdfg:
+                self.assertEqual( sim.completed_firings( v ), g.nodes[ v ].get( 'completed_firings', 0 ))
+
+    def test_examples( self ):
+        for filename in [ 'examples/csdfg-small.yaml', 'examples/neardeadlock.yaml', 'examples/longtransient.yaml' ]:
+            self.assertSameStates( core.load_sdf_yaml( filename ), 100 )
+
+    def test_state_hash( self ):
+        # equal states have equal hashes, and the states of a long transient have distinct hashes
+        for filename in [ 'examples/csdfg-small.yaml', 'examples/longtransient.yaml' ]:
+            hashes = dict()
+            for sim in itertools.islice( simulation.sse_states( core.load_sdf_yaml( filename )), 2000 ):
+                t, marking, firings = sim.state()
+                key = (frozenset( marking.items() ), frozenset( (v, frozenset( f.items() )) for v, f in firings.items() ))
+                self.assertEqual( hashes.setdefault( key, sim.state_hash() ), sim.state_hash() )
+
+            self.assertEqual( len( set( hashes.values() )), len( hashes ))
+
+    def test_lazy_marking( self ):
+        # markings that are only taken every few events equal the full markings
+        for filename in [ 'examples/csdfg-small.yaml', 'examples/neardeadlock.yaml' ]:
+            sdfg = core.load_sdf_yaml( filename )
+            expected = itertools.islice( self.graph_states( sdfg ), 200 )
+            states = itertools.islice( simulation.sse_states( sdfg ), 200 )
+            for i, (g, sim) in enumerate( zip( expected, states )):
+                self.assertLessEqual( len( sim._changed ), sdfg.number_of_edges() )
+                if i % 7 == 0:
+                    _, marking, firings = simulation.state( g )
+                    self.assertEqual( sim.marking(), marking )
+                    self.assertEqual( sim.remaining_firings(), firings )
+                    self.assertEqual( sim._changed, [] )
+
+    def test_compact( self ):
+        sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+        sim = simulation.build_simulation_graph( CompactSDFGraph( sdfg ))
+        self.assertIsInstance( sim, simulation.SelfTimedSimulation )
+        states = lambda graph : [ simulation.state( g ) for g in itertools.islice( simulation.sse_states( graph ), 50 ) ]
+        self.assertEqual( states( CompactSDFGraph( sdfg )), states( sdfg ))
+
+if __name__ == '__main__':
+    unittest.main()
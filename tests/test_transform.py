@@ -1,7 +1,13 @@
 import unittest
+import random
 import networkx as nx
+from fractions import Fraction
 import sdfpy.core as core
-from sdfpy.transform import single_rate_apx, single_rate_equivalent
+import sdfpy.mcr as mcr
+from sdfpy.transform import single_rate_apx, single_rate_equivalent, single_rate_as_marked_graph
+from sdfpy.transform import reduce_marked_graph, reduce_single_rate, expand_cycle, remove_dominated_channels
+from sdfpy.transform import unfold, compact_unfold
+from sdfpy.compact import CompactSDFGraph
 
 class TestTransformations(unittest.TestCase):
 
@@ -110,6 +116,100 @@ class TestTransformations(unittest.TestCase):
         self.assertEqual( toks( 1, 2 ), -2 )
         self.assertEqual( toks( 2, 1 ), 4 )
 
+class TestUnfold(unittest.TestCase):
+
+    def setUp( self ):
+        self.sdfg = core.load_sdf('tests/graphs/csdfg-small.json')
+
+    def cycle_time( self, sdfg ):
+        return mcr.max_cycle_ratio( single_rate_as_marked_graph( single_rate_equivalent( sdfg )))[ 0 ]
+
+    def test_unfold( self ):
+        q = self.sdfg.repetition_vector()
+        cycle_time = self.cycle_time( self.sdfg )
+        for periods in [ dict( a = 2 ), dict( a = 2, b = 3, c = 3 ), dict( b = 2, c = 4 ), dict( a = 4, b = 6, c = 6 ) ]:
+            unfolded = unfold( self.sdfg, periods )
+            self.assertEqual( unfolded.number_of_nodes(), sum( periods.get( v, 1 ) for v in self.sdfg ))
+
+            # an iteration of the unfolded graph spans a whole number of iterations of the original graph
+            iterations = Fraction( unfolded.repetition_vector()[ ('a', 1) if 'a' in periods else 'a' ] * periods.get( 'a', 1 ), q[ 'a' ] )
+            self.assertEqual( self.cycle_time( unfolded ), cycle_time * iterations )
+
+    def test_compact_unfold( self ):
+        for periods in [ dict( a = 2 ), dict( a = 2, b = 3, c = 3 ), dict( b = 2, c = 4 ), dict( a = 7, b = 5, c = 12 ) ]:
+            expected = CompactSDFGraph( unfold( self.sdfg, periods ))
+            for cg in [ compact_unfold( self.sdfg, periods ), compact_unfold( CompactSDFGraph( self.sdfg ), periods ) ]:
+                for name in CompactSDFGraph.__slots__:
+                    value, expected_value = getattr( cg, name ), getattr( expected, name )
+                    if hasattr( value, 'tolist' ):
+                        value, expected_value = value.tolist(), expected_value.tolist()
+                    self.assertEqual( value, expected_value, name )
+
+class TestReductions(unittest.TestCase):
+
+    def random_marked_graph( self, rng ):
+        n = rng.randint( 2, 30 )
+        g = nx.MultiDiGraph()
+        for v in range( n ):
+            g.add_edge( v, (v + 1) % n, weight = rng.choice([ 0, rng.randint( 0, 20 ) ]), tokens = rng.randint( 0, 2 ))
+        for _ in range( rng.randint( 0, 2 * n )):
+            g.add_edge( rng.randrange( n ), rng.randrange( n ), weight = rng.choice([ 0, rng.randint( 0, 20 ) ]),
+                tokens = rng.choice([ 0, 1, 2, 3 ]))
+        return g
+
+    def test_reduce_marked_graph( self ):
+        rng = random.Random( 1 )
+        for _ in range( 300 ):
+            g = self.random_marked_graph( rng )
+            h = reduce_marked_graph( g )
+            self.assertLessEqual( h.number_of_edges(), g.number_of_edges() )
+            try:
+                ratio, _, _ = mcr.max_cycle_ratio( g )
+            except mcr.InfeasibleException:
+                with self.assertRaises( mcr.InfeasibleException ):
+                    mcr.max_cycle_ratio( h )
+                continue
+
+            reduced_ratio, cycle, _ = mcr.max_cycle_ratio( h )
+            self.assertEqual( reduced_ratio, ratio )
+            if cycle:
+                # the expanded cycle is a critical cycle of g
+                cycle = expand_cycle( h, cycle )
+                self.assertTrue( all( e[ 1 ] == f[ 0 ] for e, f in zip( cycle, cycle[ 1: ] + cycle[ :1 ] )))
+                weight = sum( g.edges[ e ][ 'weight' ] for e in cycle )
+                tokens = sum( g.edges[ e ][ 'tokens' ] for e in cycle )
+                self.assertEqual( Fraction( weight, tokens ), ratio )
+
+    def test_reduce_chain( self ):
+        # a chain of firings without execution time is contracted into a single edge
+        g = nx.MultiDiGraph()
+        nx.add_cycle( g, range( 100 ), weight = 0, tokens = 0 )
+        g.add_edge( 0, 0, weight = 1, tokens = 1 )
+        g.edges[ 99, 0, 0 ].update( weight = 5, tokens = 2 )
+        h = reduce_marked_graph( g )
+        self.assertEqual( h.number_of_nodes(), 1 )
+        self.assertEqual( h.number_of_edges(), 2 )
+        self.assertEqual( mcr.max_cycle_ratio( h )[ 0 ], Fraction( 5, 2 ))
+
+    def test_reduce_single_rate( self ):
+        hsdfg = single_rate_equivalent( core.load_sdf('tests/graphs/csdfg-small.json') )
+        mg = single_rate_as_marked_graph( hsdfg )
+        h = reduce_single_rate( hsdfg )
+        self.assertLess( h.number_of_edges(), mg.number_of_edges() )
+        self.assertEqual( mcr.max_cycle_ratio( h )[ 0 ], mcr.max_cycle_ratio( mg )[ 0 ] )
+
+    def test_remove_dominated_channels( self ):
+        g = nx.MultiDiGraph()
+        g.add_node( 1, wcet = 2 )
+        g.add_node( 2, wcet = 3 )
+        g.add_edge( 1, 2, production = 2, consumption = 3 )
+        g.add_edge( 2, 1, production = 3, consumption = 2, tokens = 4 )
+        g.add_edge( 2, 1, production = 3, consumption = 2, tokens = 6 )
+        g.add_edge( 2, 1, production = 6, consumption = 4, tokens = 6 )
+        sdfg = remove_dominated_channels( core.SDFGraph( g ))
+        self.assertEqual( sdfg.number_of_edges(), 3 )
+        self.assertEqual( sorted( tokens for _, _, tokens in sdfg.edges( data = 'tokens' ) if tokens ), [ 4, 6 ] )
+
 if __name__ == '__main__':
     unittest.main()
 
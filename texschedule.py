@@ -21,7 +21,7 @@ def max_parallelism( sdfg, time_table ):
     table = dict()
     for v in sorted( time_table ):
         table[ v ] = (0, list())
-        w = sdfg.node[ v ]['wcet'][0]
+        w = sdfg.nodes[ v ]['wcet'][0]
         starts = time_table[ v ]
         for s in starts:
             ls.append( (s, 1, v) )
@@ -96,16 +96,17 @@ def tex_schedule( sdfg, time_table, t_from, t_until ):
 def compute_schedule( sdfg, stype, t_from = 0, t_until = 100 ):
     timetable = dict()
     if stype == "self-timed":
-        # self-timed execution
+        # self-timed execution; only the active firings are needed, so that no marking snapshots are taken
         state_space = sse.sse_states( sdfg )
         for g in state_space:
-            t, _, remaining = sse.state( g )
+            t = g.time
             if t > t_until:
                 break
 
             if t >= t_from:
+                remaining = g.remaining_firings()
                 for v in remaining:
-                    wcet = sdfg.node[v]['wcet'][0]
+                    wcet = sdfg.nodes[v]['wcet'][0]
                     bag = remaining[ v ]
                     parallel = bag.get( wcet )
                     if parallel is not None: